@@ -0,0 +1,91 @@
+"""
+Chart rendering benchmark: throughput and event-loop lag while charts render.
+
+Usage:
+    python -m benchmarks.bench_charts [--charts 40] [--workers 2]
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from modules.utils.charts import render_daily_bars, render_lines
+
+
+def _sample_args(index):
+    rng = random.Random(index)
+    labels = [f"10-{day:02d}" for day in range(1, 31)]
+    if index % 2:
+        return render_daily_bars, (f"bench #{index}", labels, [rng.randint(0, 50 * 1024 ** 3) for _ in labels])
+    series = {f"node-{n}": [rng.randint(0, 200 * 1024 ** 2) for _ in labels] for n in range(5)}
+    return render_lines, (f"bench #{index}", labels, series)
+
+
+def _flatten(item):
+    renderer, args = item
+    return (renderer, *args)
+
+
+async def _measure_lag(stop, interval=0.005):
+    """Record how late a periodic ticker wakes up — that delay is what handlers feel"""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+    return lags
+
+
+async def _run(mode, charts, workers):
+    loop = asyncio.get_running_loop()
+    executor = None
+    if mode == "thread":
+        executor = ThreadPoolExecutor(max_workers=workers)
+    elif mode == "process":
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # Прогреваем процессы, чтобы не мерить импорт matplotlib
+        await asyncio.gather(*(loop.run_in_executor(executor, *_flatten(_sample_args(i))) for i in range(workers)))
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(_measure_lag(stop))
+    started = time.perf_counter()
+
+    if executor is None:
+        for index in range(charts):
+            renderer, args = _sample_args(index)
+            renderer(*args)
+            await asyncio.sleep(0)
+    else:
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, *_flatten(_sample_args(index)))
+            for index in range(charts)
+        ))
+
+    elapsed = time.perf_counter() - started
+    stop.set()
+    lags = await lag_task
+    if executor is not None:
+        executor.shutdown()
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p95 = lags_ms[int(len(lags_ms) * 0.95) - 1] if len(lags_ms) > 1 else lags_ms[0]
+    print(
+        f"{mode:>8}: {charts / elapsed:6.1f} charts/s | "
+        f"loop lag mean {statistics.mean(lags_ms):7.2f} ms, p95 {p95:7.2f} ms, max {lags_ms[-1]:7.2f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--charts", type=int, default=40)
+    parser.add_argument("--workers", type=int, default=2)
+    options = parser.parse_args()
+
+    for mode in ("inline", "thread", "process"):
+        asyncio.run(_run(mode, options.charts, options.workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Response compression benchmark: get_all_users against a local stand-in panel
+that serves /api/users pages over a bandwidth-limited link.
+
+Usage:
+    python -m benchmarks.bench_compression [--users 5000] [--bandwidth 20] [--rtt 40]
+
+Bodies are compressed once up front, so the numbers show the link-time gain
+rather than the stand-in server's compression speed.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import random
+import time
+import uuid
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _sample_user(index, rng):
+    created = f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00.000Z"
+    return {
+        "uuid": str(uuid.UUID(int=rng.getrandbits(128))),
+        "shortUuid": uuid.UUID(int=rng.getrandbits(128)).hex[:16],
+        "username": f"user_{index:06d}",
+        "status": rng.choice(["ACTIVE", "ACTIVE", "ACTIVE", "DISABLED", "LIMITED", "EXPIRED"]),
+        "trafficLimitBytes": rng.choice([0, 50 * 1024 ** 3, 100 * 1024 ** 3]),
+        "trafficLimitStrategy": rng.choice(["NO_RESET", "MONTH"]),
+        "expireAt": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T23:59:59.000Z",
+        "telegramId": rng.choice([None, rng.randint(10 ** 8, 10 ** 10)]),
+        "email": rng.choice([None, f"user{index}@example.com"]),
+        "description": rng.choice([None, "trial", "paid via bot"]),
+        "tag": rng.choice([None, "VIP", "TRIAL"]),
+        "hwidDeviceLimit": rng.choice([None, 3, 5]),
+        "subscriptionUrl": f"https://sub.example.com/{uuid.UUID(int=rng.getrandbits(128)).hex}",
+        "activeInternalSquads": [{"uuid": str(uuid.UUID(int=rng.getrandbits(128))), "name": "Default-Squad"}],
+        "userTraffic": {
+            "usedTrafficBytes": rng.randint(0, 80 * 1024 ** 3),
+            "lifetimeUsedTrafficBytes": rng.randint(0, 500 * 1024 ** 3),
+            "onlineAt": created,
+            "firstConnectedAt": created,
+        },
+        "createdAt": created,
+        "updatedAt": created,
+    }
+
+
+class StandInPanel:
+    """Minimal HTTP/1.1 server answering GET /api/users with pre-encoded pages"""
+
+    def __init__(self, users, bandwidth_mbit, rtt_ms):
+        self.bytes_per_second = bandwidth_mbit * 1024 * 1024 / 8
+        self.rtt = rtt_ms / 1000
+        self.pages = {}
+        rng = random.Random(42)
+        records = [_sample_user(index, rng) for index in range(users)]
+        for start in range(0, users + 1, 500):
+            body = json.dumps({"response": {"users": records[start:start + 500], "total": users}}).encode()
+            encoded = {"identity": body, "gzip": gzip.compress(body, 6)}
+            if brotli is not None:
+                encoded["br"] = brotli.compress(body, quality=5)
+            self.pages[start] = encoded
+
+    def _choose(self, accept_encoding):
+        offered = [item.split(";")[0].strip() for item in accept_encoding.split(",")]
+        for encoding in ("br", "gzip"):
+            if encoding in offered and encoding in self.pages[0]:
+                return encoding
+        return "identity"
+
+    async def handle(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        target = lines[0].split(" ")[1]
+        headers = {line.split(":", 1)[0].lower(): line.split(":", 1)[1].strip() for line in lines[1:] if ":" in line}
+        query = parse_qs(urlsplit(target).query)
+        start = int(query.get("start", ["0"])[0])
+
+        encoding = self._choose(headers.get("accept-encoding", ""))
+        body = self.pages.get(start, self.pages[max(self.pages)])[encoding]
+        response = (
+            "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n"
+            + (f"Content-Encoding: {encoding}\r\n" if encoding != "identity" else "")
+            + "\r\n"
+        ).encode() + body
+
+        await asyncio.sleep(self.rtt)
+        # Отдаём кусками с паузами, имитируя канал ограниченной ширины
+        chunk = 16 * 1024
+        for offset in range(0, len(response), chunk):
+            writer.write(response[offset:offset + chunk])
+            await writer.drain()
+            await asyncio.sleep(min(chunk, len(response) - offset) / self.bytes_per_second)
+        writer.close()
+
+
+async def _run(options):
+    panel = StandInPanel(options.users, options.bandwidth, options.rtt)
+    server = await asyncio.start_server(panel.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{port}/api"
+    os.environ.setdefault("API_TOKEN", "bench")
+
+    from modules.api import client
+    from modules.api.users import UserAPI
+
+    modes = [("identity", "identity"), ("gzip", "gzip, deflate")]
+    if brotli is not None:
+        modes.append(("br", "br, gzip, deflate"))
+
+    print(f"{options.users} users, {options.bandwidth} Mbit/s, RTT {options.rtt} ms")
+    for name, accept in modes:
+        client.ACCEPT_ENCODING = accept
+        client.transfer_stats.clear()
+        started = time.perf_counter()
+        result = await UserAPI.get_all_users()
+        elapsed = time.perf_counter() - started
+        stats = client.transfer_stats["GET users"]
+        print(
+            f"{name:>8}: {elapsed:6.2f} s | {len(result['users'])} users | "
+            f"wire {stats['wire_bytes'] / 1024:8.0f} KB, decoded {stats['decoded_bytes'] / 1024:8.0f} KB "
+            f"(x{stats['decoded_bytes'] / stats['wire_bytes']:.1f})"
+        )
+
+    server.close()
+    await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--bandwidth", type=float, default=20, help="link bandwidth, Mbit/s")
+    parser.add_argument("--rtt", type=float, default=40, help="round trip time, ms")
+    options = parser.parse_args()
+    asyncio.run(_run(options))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+JSON decoding benchmark: event-loop lag while all users are read from a local stand-in
+panel, inline or in a worker thread. Whole pages (get_users_page) are decoded with stdlib
+json or orjson; the streamed path (stream_users, behind get_all_users) always uses the
+incremental stdlib parser, so only the thread switch applies to it.
+
+Usage:
+    python -m benchmarks.bench_json [--users 20000]
+"""
+import argparse
+import asyncio
+import gc
+import os
+import time
+
+from benchmarks.bench_compression import StandInPanel
+
+
+async def _measure_lag(stop, interval=0.001):
+    """Record how late a periodic ticker wakes up — that delay is what handlers feel"""
+    lags = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+    return lags
+
+
+async def _run(options):
+    # Широкий канал без задержки, без сжатия — измеряем только разбор JSON
+    panel = StandInPanel(options.users, bandwidth_mbit=100000, rtt_ms=0)
+    server = await asyncio.start_server(panel.handle, "127.0.0.1", 0)
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/api"
+    os.environ.setdefault("API_TOKEN", "bench")
+
+    from modules.api import client
+    from modules.api.users import UserAPI
+    from modules.utils import json_codec
+
+    client.ACCEPT_ENCODING = "identity"
+    fast_decoder = json_codec.orjson
+    default_threshold = json_codec.JSON_OFFLOAD_THRESHOLD
+    modes = [("json", None), ("orjson", fast_decoder)] if fast_decoder is not None else [("json", None)]
+
+    async def pages():
+        count, start, total = 0, 0, None
+        while total is None or start < total:
+            users, total = await UserAPI.get_users_page(start, 500)
+            count += len(users)
+            start += len(users)
+            del users
+        return count
+
+    async def stream():
+        count = 0
+        async for _ in UserAPI.stream_users():
+            count += 1
+        return count
+
+    runs = [
+        (f"pages {name}", workload, decoder, threshold)
+        for name, decoder in modes for workload in (pages,) for threshold in (float("inf"), default_threshold)
+    ] + [("stream", stream, fast_decoder, threshold) for threshold in (float("inf"), default_threshold)]
+
+    print(f"{options.users} users, offload threshold {default_threshold} bytes")
+    for name, workload, decoder, threshold in runs:
+        json_codec.orjson = decoder
+        json_codec.JSON_OFFLOAD_THRESHOLD = threshold
+        await UserAPI.get_users_page(0, 500)
+        # Мусор предыдущего прогона не должен попасть в замер следующего
+        gc.collect()
+
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(_measure_lag(stop))
+        started = time.perf_counter()
+        count = await workload()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        lags_ms = sorted(lag * 1000 for lag in await lag_task) or [0.0]
+
+        where = "inline" if threshold == float("inf") else "thread"
+        print(
+            f"{name:>12} {where:>6}: {elapsed:6.2f} s, {count} users | loop lag "
+            f"p50 {lags_ms[len(lags_ms) // 2]:6.2f} ms, p95 {lags_ms[int(len(lags_ms) * 0.95)]:6.2f} ms, "
+            f"max {lags_ms[-1]:6.2f} ms"
+        )
+
+    server.close()
+    await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20000)
+    options = parser.parse_args()
+    asyncio.run(_run(options))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Per-user lookup benchmark: a loop of get_user_by_uuid / get_user_hwid_devices calls
+versus the same lookups through the batching loaders against a local stand-in panel
+with a fixed round trip time.
+
+Usage:
+    python -m benchmarks.bench_loader [--users 100] [--rtt 40] [--rate 0]
+
+--rate sets API_RATE_LIMIT; the default 0 (the bot's default too) shows the batching
+itself, with a limit such as 20 requests/s the concurrent per-user requests are paced
+by the token bucket instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.bench_compression import _sample_user
+
+
+class StandInPanel:
+    """Minimal HTTP/1.1 server answering users/{uuid}, hwid/devices/{uuid} and the paged hwid/devices list"""
+
+    def __init__(self, users, rtt_ms):
+        self.rtt = rtt_ms / 1000
+        rng = random.Random(42)
+        self.users = {user["uuid"]: user for user in (_sample_user(index, rng) for index in range(users))}
+        self.devices = [
+            {"hwid": f"hwid-{index}-{slot}", "userUuid": uuid, "platform": "Android", "osVersion": "14",
+             "deviceModel": None, "userAgent": None, "createdAt": "2025-01-01T00:00:00.000Z",
+             "updatedAt": "2025-01-01T00:00:00.000Z"}
+            for index, uuid in enumerate(self.users) for slot in range(rng.randint(0, 3))
+        ]
+        self.requests = 0
+
+    def _route(self, target):
+        parts = urlsplit(target)
+        path = parts.path.removeprefix("/api/")
+        if path.startswith("users/"):
+            user = self.users.get(path.split("/", 1)[1])
+            return (200, user) if user else (404, {"message": "User not found"})
+        if path == "hwid/devices":
+            query = parse_qs(parts.query)
+            start, size = int(query.get("start", ["0"])[0]), int(query.get("size", ["500"])[0])
+            return 200, {"devices": self.devices[start:start + size], "total": len(self.devices)}
+        if path.startswith("hwid/devices/"):
+            uuid = path.split("/", 2)[2]
+            devices = [device for device in self.devices if device["userUuid"] == uuid]
+            return 200, {"devices": devices, "total": len(devices)}
+        return 404, {"message": "Not found"}
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            # Клиент закрыл соединение, не отправив запрос (отменённый дубль)
+            return
+        self.requests += 1
+        status, payload = self._route(head.decode("latin-1").split(" ")[1])
+        body = json.dumps({"response": payload} if status == 200 else payload).encode()
+        await asyncio.sleep(self.rtt)
+        writer.write((
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+        ).encode() + body)
+        await writer.drain()
+        writer.close()
+
+
+async def _measure(panel, name, lookups):
+    panel.requests = 0
+    started = time.perf_counter()
+    results = await lookups()
+    elapsed = time.perf_counter() - started
+    found = sum(1 for result in results if result is not None)
+    print(f"{name:>30}: {elapsed * 1000:7.0f} ms | {panel.requests:4d} panel requests | {found} found")
+
+
+async def _run(options):
+    panel = StandInPanel(options.users, options.rtt)
+    server = await asyncio.start_server(panel.handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    os.environ["API_BASE_URL"] = f"http://127.0.0.1:{port}/api"
+    os.environ.setdefault("API_TOKEN", "bench")
+    os.environ["API_RATE_LIMIT"] = str(options.rate)
+
+    from modules.api.users import UserAPI
+    from modules.config import API_MAX_CONCURRENCY
+    from modules.utils.loader import load_hwid_devices, load_user, loader_scope
+
+    uuids = list(panel.users)
+    print(f"{len(uuids)} users, {len(panel.devices)} devices, RTT {options.rtt} ms, "
+          f"rate limit {options.rate or 'off'}, concurrency {API_MAX_CONCURRENCY}")
+
+    async def loop(fetch):
+        return [await fetch(uuid) for uuid in uuids]
+
+    async def batched(load):
+        with loader_scope():
+            # Повторные ключи отвечаются из той же пачки
+            results = await asyncio.gather(*(load(uuid) for uuid in uuids + uuids[:10]))
+        return results[:len(uuids)]
+
+    await _measure(panel, "loop get_user_by_uuid", lambda: loop(UserAPI.get_user_by_uuid))
+    await _measure(panel, "loader load_user", lambda: batched(load_user))
+    await _measure(panel, "loop get_user_hwid_devices", lambda: loop(UserAPI.get_user_hwid_devices))
+    await _measure(panel, "loader load_hwid_devices", lambda: batched(load_hwid_devices))
+
+    server.close()
+    await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--rtt", type=float, default=40, help="round trip time, ms")
+    parser.add_argument("--rate", type=int, default=0, help="API_RATE_LIMIT, requests/s (0 disables)")
+    options = parser.parse_args()
+    asyncio.run(_run(options))
+
+
+if __name__ == "__main__":
+    main()
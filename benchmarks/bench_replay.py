@@ -0,0 +1,135 @@
+"""
+Handler data benchmark over a recorded cassette: the panel calls behind the main menu,
+the users list, user details, node metrics and the hosts/inbounds topology, timed without a panel.
+
+Usage:
+    # once, against a real panel (API_BASE_URL / REMNAWAVE_API_TOKEN from .env):
+    python -m benchmarks.bench_replay --record [--cassette data/cassettes/panel.jsonl]
+    # then offline, as often as needed:
+    python -m benchmarks.bench_replay [--iterations 50] [--latency 40] [--jitter 10] [--error-rate 0.02] [--seed 1]
+
+Each scenario drops the bot's caches before every iteration, so all of its requests reach
+the transport. --seed fixes the injected latency and errors and the retry backoff jitter,
+so runs differ only by scheduling noise.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+async def _scenarios():
+    from modules.api.users import UserAPI
+    from modules.handlers.core import start
+    from modules.utils.node_metrics import get_node_metrics_dashboard
+    from modules.utils.topology import get_topology
+
+    first_page = [user async for user in UserAPI.iter_users(limit=10)]
+    uuid = first_page[0]["uuid"] if first_page else None
+
+    async def main_menu():
+        start.invalidate_panel_stats()
+        return await start.get_system_stats()
+
+    async def users_page():
+        return [user async for user in UserAPI.iter_users(limit=10)]
+
+    async def user_details():
+        return await asyncio.gather(UserAPI.get_user_by_uuid(uuid), UserAPI.get_user_hwid_devices(uuid))
+
+    return [
+        ("main menu", main_menu),
+        ("users page", users_page),
+        ("user details", user_details),
+        ("node metrics", lambda: get_node_metrics_dashboard(force=True)),
+        ("topology", lambda: get_topology(force=True)),
+    ]
+
+
+def _check_cassette(path):
+    """Verify that no recorded exchange, /users pages included, kept credentials or personal data"""
+    from modules.api.transport import unmasked_fields
+
+    leaks = []
+    user_pages = 0
+    with open(path, encoding="utf-8") as cassette:
+        for number, line in enumerate(cassette, start=1):
+            entry = json.loads(line)
+            if entry["path"] == "users":
+                user_pages += 1
+            leaks += [f"line {number} {entry['method']} {entry['path']}: {field}"
+                      for part in ("request", "response") for field in unmasked_fields(entry[part], part)]
+    if leaks:
+        print(f"Unmasked sensitive fields in the cassette ({len(leaks)}):", *leaks[:20], sep="\n  ")
+        return False
+    print(f"Cassette checked: {user_pages} /users pages, no unmasked credentials or personal data")
+    return True
+
+
+async def _run(options):
+    from modules.api.transport import get_transport
+
+    transport = get_transport()
+    iterations = 1 if options.record else options.iterations
+    print(f"{os.environ['API_TRANSPORT']} {options.cassette}, {iterations} iterations per scenario")
+
+    for name, scenario in await _scenarios():
+        timings = []
+        failures = 0
+        started = time.perf_counter()
+        for _ in range(iterations):
+            began = time.perf_counter()
+            try:
+                await scenario()
+            except Exception:
+                failures += 1
+            timings.append(time.perf_counter() - began)
+        elapsed = time.perf_counter() - started
+        print(
+            f"{name:>14}: p50 {_percentile(timings, 50) * 1000:7.1f} ms | p95 {_percentile(timings, 95) * 1000:7.1f} ms | "
+            f"max {max(timings) * 1000:7.1f} ms | {iterations / elapsed:6.1f}/s | {failures} failed"
+        )
+
+    if options.record:
+        print(f"Recorded to {options.cassette}")
+        if not _check_cassette(options.cassette):
+            sys.exit(1)
+    elif transport.misses:
+        print(f"{transport.misses} requests had no recorded response; record the cassette again")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", action="store_true", help="run once against the panel and record the cassette")
+    parser.add_argument("--cassette", default="data/cassettes/panel.jsonl")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=40, help="injected latency per request, ms")
+    parser.add_argument("--jitter", type=float, default=0, help="± latency jitter, ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests failing with a connection error or 503")
+    parser.add_argument("--seed", type=int, default=1)
+    options = parser.parse_args()
+
+    # Настройки транспорта читаются при импорте modules.config, поэтому задаём их до него
+    os.environ["API_TRANSPORT"] = "record" if options.record else "replay"
+    os.environ["API_CASSETTE"] = options.cassette
+    os.environ["REPLAY_LATENCY"] = str(options.latency / 1000)
+    os.environ["REPLAY_JITTER"] = str(options.jitter / 1000)
+    os.environ["REPLAY_ERROR_RATE"] = str(options.error_rate)
+    os.environ["REPLAY_SEED"] = str(options.seed)
+    # Задержки повторов в resilience берутся из общего генератора
+    random.seed(options.seed)
+    if options.record and os.path.exists(options.cassette):
+        os.remove(options.cassette)
+    asyncio.run(_run(options))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Streaming users benchmark: peak memory of a full-base aggregation with get_all_users
+versus UserAPI.stream_users against a local stand-in panel.
+
+Usage:
+    python -m benchmarks.bench_stream [--users 5000 20000 50000]
+
+Peak memory is measured with tracemalloc above the baseline taken after the
+stand-in panel has pre-encoded its pages, so it covers only the client side;
+timings include tracemalloc overhead.
+"""
+import argparse
+import asyncio
+import gc
+import os
+import time
+import tracemalloc
+
+from benchmarks.bench_compression import StandInPanel
+
+
+def _aggregate(users, stats):
+    for user in users:
+        stats[user.get("status")] = stats.get(user.get("status"), 0) + 1
+
+
+async def _full_list():
+    from modules.api.users import UserAPI
+
+    stats = {}
+    response = await UserAPI.get_all_users()
+    _aggregate(response["users"], stats)
+    return stats
+
+
+async def _streamed():
+    from modules.api.users import UserAPI
+
+    stats = {}
+    async for user in UserAPI.stream_users():
+        _aggregate((user,), stats)
+    return stats
+
+
+async def _measure(name, aggregate, users):
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    stats = await aggregate()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    assert sum(stats.values()) == users, stats
+    print(f"{users:>7} users {name:>9}: {elapsed:6.2f} s, peak {peak / 1024 / 1024:7.1f} MB")
+
+
+async def _run(options):
+    os.environ.setdefault("API_TOKEN", "bench")
+    from modules.api import client
+
+    client.ACCEPT_ENCODING = "gzip, deflate"
+    for users in options.users:
+        panel = StandInPanel(users, bandwidth_mbit=100000, rtt_ms=0)
+        server = await asyncio.start_server(panel.handle, "127.0.0.1", 0)
+        client.API_BASE_URL = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/api"
+
+        tracemalloc.start()
+        await _measure("full list", _full_list, users)
+        await _measure("streamed", _streamed, users)
+        tracemalloc.stop()
+
+        server.close()
+        await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, nargs="+", default=[5000, 20000, 50000])
+    options = parser.parse_args()
+    asyncio.run(_run(options))
+
+
+if __name__ == "__main__":
+    main()
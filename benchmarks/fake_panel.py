@@ -0,0 +1,651 @@
+"""
+Local stand-in for a Remnawave panel built from remnawave-api-v2113.json: every path of the
+spec is routed, entities are shaped by the spec's response schemas, and users, nodes, hosts,
+config profiles, squads, HWID devices, usage ranges and bulk operations are served from a
+synthetic dataset of configurable size. Operations without their own handler answer with a
+response synthesized from the schema.
+
+Usage:
+    python -m benchmarks.fake_panel [--users 100000] [--nodes 200] [--latency 20] [--jitter 5]
+                                    [--max-page-size 1000] [--port 3000]
+
+then point the bot or a benchmark at it:
+    API_BASE_URL=http://127.0.0.1:3000/api python main.py
+    API_BASE_URL=http://127.0.0.1:3000/api python -m benchmarks.bench_replay --record
+
+Inside a benchmark: `server = await FakePanel(users=...).start()`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+SPEC_PATH = Path(__file__).resolve().parent.parent / "remnawave-api-v2113.json"
+USER_STATUSES = ["ACTIVE"] * 7 + ["DISABLED", "LIMITED", "EXPIRED"]
+COUNTRIES = ["DE", "NL", "FI", "US", "GB", "FR", "PL", "SE", "JP", "SG"]
+INBOUND_TYPES = [("vless", "tcp", "reality"), ("vless", "xhttp", "tls"), ("trojan", "tcp", "tls"), ("shadowsocks", "tcp", None)]
+GB = 1024 ** 3
+
+
+def _iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def _parse_date(value, default):
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return default
+
+
+class SpecSynthesizer:
+    """Build JSON values that satisfy the schemas of an OpenAPI 3.1 document"""
+
+    def __init__(self, spec, rng):
+        self.spec = spec
+        self.rng = rng
+
+    def resolve(self, schema):
+        while "$ref" in schema:
+            node = self.spec
+            for part in schema["$ref"].lstrip("#/").split("/"):
+                node = node[part]
+            schema = node
+        return schema
+
+    def value(self, schema):
+        schema = self.resolve(schema or {})
+        if "examples" in schema:
+            return schema["examples"][0]
+        if "enum" in schema:
+            return self.rng.choice(schema["enum"])
+        kind = schema.get("type")
+        if isinstance(kind, list):
+            kind = next((item for item in kind if item != "null"), None)
+        if kind == "object" or "properties" in schema:
+            return {name: self.value(prop) for name, prop in schema.get("properties", {}).items()}
+        if kind == "array":
+            return [self.value(schema.get("items"))]
+        if kind == "string":
+            fmt = schema.get("format")
+            if fmt == "uuid":
+                return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+            if fmt == "date-time":
+                return _iso(datetime.now(timezone.utc))
+            if fmt == "email":
+                return "user@example.com"
+            if fmt == "uri":
+                return "https://example.com"
+            return "string"
+        if kind in ("number", "integer"):
+            return self.rng.randint(0, 100)
+        if kind == "boolean":
+            return False
+        # Поля без схемы (rawInbound, config и т. п.) панель отдаёт как произвольный JSON
+        return None
+
+    def entity(self, dto):
+        """The `response` object of a response DTO from components.schemas"""
+        return self.value(self.spec["components"]["schemas"][dto])["response"]
+
+    def response(self, operation):
+        """Success body of an operation, including the `response` envelope"""
+        for status in ("200", "201", "default"):
+            content = operation.get("responses", {}).get(status, {}).get("content", {})
+            if "application/json" in content:
+                return int(status) if status != "default" else 200, self.value(content["application/json"]["schema"])
+        return 200, {}
+
+
+def _compile_routes(spec, prefix):
+    routes = []
+    for template, operations in spec["paths"].items():
+        path = template[len(prefix):] if template.startswith(prefix) else template
+        pattern = re.compile("^" + re.sub(r"\\{(\w+)\\}", r"(?P<\1>[^/]+)", re.escape(path)) + "$")
+        for method, operation in operations.items():
+            routes.append((method.upper(), path, pattern, operation))
+    # Шаблоны без параметров раньше: users/tags не должен попасть в users/{uuid}
+    routes.sort(key=lambda route: route[1].count("{"))
+    return routes
+
+
+class NotFound(Exception):
+    pass
+
+
+class FakePanel:
+    """
+    Synthetic panel state plus an HTTP/1.1 server answering like the real API. `latency`
+    and `jitter` are seconds added to every response; GET /users and /hwid/devices return
+    at most `max_page_size` items whatever `size` asks for.
+    """
+
+    def __init__(self, users=1000, nodes=20, hosts=None, profiles=3, squads=3, latency=0.0, jitter=0.0,
+                 max_page_size=1000, seed=42, spec_path=SPEC_PATH):
+        self.spec = json.loads(Path(spec_path).read_text(encoding="utf-8"))
+        self.rng = random.Random(seed)
+        self.synth = SpecSynthesizer(self.spec, random.Random(seed))
+        self.routes = _compile_routes(self.spec, "/api")
+        self.latency = latency
+        self.jitter = jitter
+        self.max_page_size = max_page_size
+        self.requests = 0
+        self.now = datetime.now(timezone.utc).replace(microsecond=0)
+
+        self._build_profiles(profiles)
+        self._build_squads(squads)
+        self._build_nodes(nodes)
+        self._build_hosts(nodes * 2 if hosts is None else hosts)
+        self._build_users(users)
+        self.handlers = self._handlers()
+
+    # --- синтетические данные ---
+
+    def _uuid(self):
+        return str(uuid.UUID(int=self.rng.getrandbits(128), version=4))
+
+    def _build_profiles(self, count):
+        template = self.synth.entity("GetConfigProfileByUuidResponseDto")
+        self.profiles = {}
+        self.inbounds = {}
+        for index in range(count):
+            profile = dict(template, uuid=self._uuid(), name=f"Profile-{index + 1}", config={}, nodes=[],
+                           createdAt=_iso(self.now), updatedAt=_iso(self.now))
+            profile["inbounds"] = []
+            for slot, (kind, network, security) in enumerate(INBOUND_TYPES[:2 + index % 3]):
+                inbound = {"uuid": self._uuid(), "profileUuid": profile["uuid"], "tag": f"{kind.upper()}_{index + 1}_{slot + 1}",
+                           "type": kind, "network": network, "security": security, "port": 443 + slot, "rawInbound": None}
+                profile["inbounds"].append(inbound)
+                self.inbounds[inbound["uuid"]] = inbound
+            self.profiles[profile["uuid"]] = profile
+
+    def _build_squads(self, count):
+        template = self.synth.entity("GetInternalSquadByUuidResponseDto")
+        inbounds = list(self.inbounds.values())
+        self.squads = {}
+        for index in range(count):
+            squad = dict(template, uuid=self._uuid(), name=f"Squad-{index + 1}",
+                         inbounds=self.rng.sample(inbounds, k=min(len(inbounds), 2 + index)),
+                         createdAt=_iso(self.now), updatedAt=_iso(self.now))
+            self.squads[squad["uuid"]] = squad
+
+    def _build_nodes(self, count):
+        template = self.synth.entity("GetOneNodeResponseDto")
+        profiles = list(self.profiles.values())
+        self.nodes = {}
+        for index in range(count):
+            profile = profiles[index % len(profiles)]
+            connected = self.rng.random() < 0.95
+            node = dict(
+                template, uuid=self._uuid(), name=f"node-{index + 1:03d}", address=f"10.{index // 250}.{index % 250}.1",
+                port=2222, isConnected=connected, isDisabled=False, isConnecting=False, isNodeOnline=connected,
+                isXrayRunning=connected, xrayVersion="25.6.8", nodeVersion="2.1.13", xrayUptime=str(self.rng.randint(0, 10 ** 6)),
+                usersOnline=self.rng.randint(0, 500) if connected else 0, viewPosition=index,
+                countryCode=COUNTRIES[index % len(COUNTRIES)], trafficUsedBytes=self.rng.randint(0, 5000) * GB,
+                providerUuid=None, provider=None, createdAt=_iso(self.now), updatedAt=_iso(self.now),
+                configProfile={"activeConfigProfileUuid": profile["uuid"], "activeInbounds": profile["inbounds"]},
+            )
+            self.nodes[node["uuid"]] = node
+            profile["nodes"].append({"uuid": node["uuid"], "name": node["name"], "countryCode": node["countryCode"]})
+
+    def _build_hosts(self, count):
+        template = self.synth.entity("GetOneHostResponseDto")
+        inbounds = list(self.inbounds.values())
+        self.hosts = {}
+        for index in range(count):
+            inbound = inbounds[index % len(inbounds)]
+            host = dict(
+                template, uuid=self._uuid(), viewPosition=index, remark=f"Host {index + 1}",
+                address=f"h{index + 1}.example.com", port=443, path=None, sni=None, host=None, alpn=None,
+                fingerprint=None, isDisabled=False, securityLayer="DEFAULT", tag=None, isHidden=False,
+                inbound={"configProfileUuid": inbound["profileUuid"], "configProfileInboundUuid": inbound["uuid"]},
+            )
+            self.hosts[host["uuid"]] = host
+
+    def _build_users(self, count):
+        template = self.synth.entity("GetUserByUuidResponseDto")
+        squads = [{"uuid": squad["uuid"], "name": squad["name"]} for squad in self.squads.values()]
+        device_template = self.synth.value(self.synth.resolve(
+            self.spec["components"]["schemas"]["GetAllHwidDevicesResponseDto"]
+        )["properties"]["response"]["properties"]["devices"]["items"])
+        rng = self.rng
+        self.users = {}
+        self.usernames = {}
+        self.devices = {}
+        for index in range(count):
+            user_uuid = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+            short_uuid = user_uuid.replace("-", "")[:16]
+            created = self.now - timedelta(days=rng.randint(0, 720))
+            used = rng.randint(0, 80 * GB)
+            user = dict(
+                template, uuid=user_uuid, shortUuid=short_uuid, username=f"user_{index:06d}",
+                status=rng.choice(USER_STATUSES), usedTrafficBytes=used, lifetimeUsedTrafficBytes=used + rng.randint(0, 400 * GB),
+                trafficLimitBytes=rng.choice([0, 50 * GB, 100 * GB]), trafficLimitStrategy=rng.choice(["NO_RESET", "MONTH"]),
+                expireAt=_iso(created + timedelta(days=rng.randint(30, 1000))), onlineAt=_iso(self.now - timedelta(minutes=rng.randint(0, 10 ** 5))),
+                subRevokedAt=None, lastTrafficResetAt=None, subLastUserAgent=None, subLastOpenedAt=None,
+                vlessUuid=str(uuid.UUID(int=rng.getrandbits(128), version=4)), trojanPassword=short_uuid, ssPassword=short_uuid,
+                description=rng.choice([None, None, "trial", "paid via bot"]), tag=rng.choice([None, None, "VIP", "TRIAL"]),
+                telegramId=rng.choice([None, rng.randint(10 ** 8, 10 ** 10)]), email=rng.choice([None, f"user{index}@example.com"]),
+                hwidDeviceLimit=rng.choice([None, 3, 5]), createdAt=_iso(created), updatedAt=_iso(created),
+                activeInternalSquads=[rng.choice(squads)] if squads else [],
+                subscriptionUrl=f"https://sub.example.com/{short_uuid}",
+            )
+            self.users[user_uuid] = user
+            self.usernames[user["username"]] = user_uuid
+            if rng.random() < 0.5:
+                self.devices[user_uuid] = [
+                    dict(device_template, hwid=f"{short_uuid}-{slot}", userUuid=user_uuid,
+                         platform=rng.choice(["Android", "iOS", "Windows"]), createdAt=user["createdAt"], updatedAt=user["createdAt"])
+                    for slot in range(rng.randint(1, 3))
+                ]
+
+    # --- обработчики ---
+
+    def _handlers(self):
+        return {
+            ("GET", "/users"): self.list_users,
+            ("POST", "/users"): self.create_user,
+            ("PATCH", "/users"): self.update_user,
+            ("GET", "/users/{uuid}"): lambda p, q, b: self._user(p["uuid"]),
+            ("DELETE", "/users/{uuid}"): self.delete_user,
+            ("GET", "/users/by-username/{username}"): lambda p, q, b: self._user(self.usernames.get(p["username"])),
+            ("GET", "/users/by-short-uuid/{shortUuid}"): lambda p, q, b: self._find_user("shortUuid", p["shortUuid"]),
+            ("GET", "/users/by-telegram-id/{telegramId}"): lambda p, q, b: self._filter_users("telegramId", int(p["telegramId"])),
+            ("GET", "/users/by-email/{email}"): lambda p, q, b: self._filter_users("email", p["email"]),
+            ("GET", "/users/by-tag/{tag}"): lambda p, q, b: self._filter_users("tag", p["tag"]),
+            ("GET", "/users/tags"): lambda p, q, b: {"tags": sorted({u["tag"] for u in self.users.values() if u["tag"]})},
+            ("POST", "/users/{uuid}/actions/enable"): lambda p, q, b: self._set_users([p["uuid"]], status="ACTIVE", one=True),
+            ("POST", "/users/{uuid}/actions/disable"): lambda p, q, b: self._set_users([p["uuid"]], status="DISABLED", one=True),
+            ("POST", "/users/{uuid}/actions/reset-traffic"): lambda p, q, b: self._set_users([p["uuid"]], usedTrafficBytes=0, one=True),
+            ("POST", "/users/{uuid}/actions/revoke"): lambda p, q, b: self._set_users([p["uuid"]], subRevokedAt=_iso(self.now), one=True),
+            ("GET", "/users/stats/usage/{uuid}/range"): self.user_usage,
+            ("POST", "/users/bulk/delete"): self.bulk_delete_users,
+            ("POST", "/users/bulk/delete-by-status"): self.bulk_delete_by_status,
+            ("POST", "/users/bulk/revoke-subscription"): lambda p, q, b: self._bulk(b["uuids"], subRevokedAt=_iso(self.now)),
+            ("POST", "/users/bulk/reset-traffic"): lambda p, q, b: self._bulk(b["uuids"], usedTrafficBytes=0),
+            ("POST", "/users/bulk/update"): lambda p, q, b: self._bulk(b["uuids"], **b.get("fields", {})),
+            ("POST", "/users/bulk/update-squads"): self.bulk_update_squads,
+            ("POST", "/users/bulk/all/update"): lambda p, q, b: self._bulk_all(**b),
+            ("POST", "/users/bulk/all/reset-traffic"): lambda p, q, b: self._bulk_all(usedTrafficBytes=0),
+            ("GET", "/hwid/devices"): self.list_devices,
+            ("GET", "/hwid/devices/{userUuid}"): lambda p, q, b: self._user_devices(p["userUuid"]),
+            ("POST", "/hwid/devices"): self.add_device,
+            ("POST", "/hwid/devices/delete"): self.delete_device,
+            ("GET", "/nodes"): lambda p, q, b: list(self.nodes.values()),
+            ("POST", "/nodes"): self.create_node,
+            ("PATCH", "/nodes"): lambda p, q, b: self._update(self.nodes, b),
+            ("GET", "/nodes/{uuid}"): lambda p, q, b: self._get(self.nodes, p["uuid"]),
+            ("DELETE", "/nodes/{uuid}"): lambda p, q, b: self._delete(self.nodes, p["uuid"]),
+            ("POST", "/nodes/{uuid}/actions/enable"): lambda p, q, b: self._update(self.nodes, {"uuid": p["uuid"], "isDisabled": False}),
+            ("POST", "/nodes/{uuid}/actions/disable"): lambda p, q, b: self._update(self.nodes, {"uuid": p["uuid"], "isDisabled": True, "isConnected": False}),
+            ("GET", "/nodes/usage/range"): self.nodes_usage,
+            ("GET", "/nodes/usage/{uuid}/users/range"): self.node_users_usage,
+            ("GET", "/nodes/usage/realtime"): self.realtime_usage,
+            ("GET", "/hosts"): lambda p, q, b: list(self.hosts.values()),
+            ("POST", "/hosts"): self.create_host,
+            ("PATCH", "/hosts"): lambda p, q, b: self._update(self.hosts, b),
+            ("GET", "/hosts/{uuid}"): lambda p, q, b: self._get(self.hosts, p["uuid"]),
+            ("DELETE", "/hosts/{uuid}"): lambda p, q, b: self._delete(self.hosts, p["uuid"]),
+            ("GET", "/hosts/tags"): lambda p, q, b: {"tags": sorted({h["tag"] for h in self.hosts.values() if h["tag"]})},
+            ("POST", "/hosts/bulk/delete"): lambda p, q, b: self._bulk_hosts(b["uuids"], delete=True),
+            ("POST", "/hosts/bulk/disable"): lambda p, q, b: self._bulk_hosts(b["uuids"], isDisabled=True),
+            ("POST", "/hosts/bulk/enable"): lambda p, q, b: self._bulk_hosts(b["uuids"], isDisabled=False),
+            ("POST", "/hosts/bulk/set-port"): lambda p, q, b: self._bulk_hosts(b["uuids"], port=b["port"]),
+            ("POST", "/hosts/bulk/set-inbound"): lambda p, q, b: self._bulk_hosts(b["uuids"], inbound={
+                "configProfileUuid": b["configProfileUuid"], "configProfileInboundUuid": b["configProfileInboundUuid"]}),
+            ("GET", "/config-profiles"): lambda p, q, b: {"total": len(self.profiles), "configProfiles": list(self.profiles.values())},
+            ("GET", "/config-profiles/{uuid}"): lambda p, q, b: self._get(self.profiles, p["uuid"]),
+            ("GET", "/config-profiles/inbounds"): lambda p, q, b: {"total": len(self.inbounds), "inbounds": list(self.inbounds.values())},
+            ("GET", "/config-profiles/{uuid}/inbounds"): self.profile_inbounds,
+            ("GET", "/internal-squads"): lambda p, q, b: {"total": len(self.squads), "internalSquads": list(self.squads.values())},
+            ("GET", "/internal-squads/{uuid}"): lambda p, q, b: self._get(self.squads, p["uuid"]),
+            ("GET", "/internal-squads/{uuid}/accessible-nodes"): self.squad_nodes,
+            ("POST", "/internal-squads/{uuid}/bulk-actions/add-users"): lambda p, q, b: {"eventSent": True},
+            ("DELETE", "/internal-squads/{uuid}/bulk-actions/remove-users"): lambda p, q, b: {"eventSent": True},
+            ("GET", "/system/stats"): self.system_stats,
+            ("GET", "/system/nodes/metrics"): self.nodes_metrics,
+        }
+
+    def _get(self, items, key):
+        if key not in items:
+            raise NotFound(key)
+        return items[key]
+
+    def _delete(self, items, key):
+        self._get(items, key)
+        del items[key]
+        return {"isDeleted": True}
+
+    def _update(self, items, body):
+        item = self._get(items, body.get("uuid"))
+        item.update({key: value for key, value in body.items() if key != "uuid"}, updatedAt=_iso(self.now))
+        return item
+
+    def _user(self, user_uuid):
+        return self._get(self.users, user_uuid)
+
+    def _find_user(self, field, value):
+        for user in self.users.values():
+            if user[field] == value:
+                return user
+        raise NotFound(value)
+
+    def _filter_users(self, field, value):
+        return [user for user in self.users.values() if user[field] == value]
+
+    def _page(self, items, query):
+        start = int(query.get("start", 0))
+        size = min(int(query.get("size", 25)), self.max_page_size)
+        return items[start:start + size]
+
+    def list_users(self, params, query, body):
+        users = list(self.users.values())
+        return {"users": self._page(users, query), "total": len(users)}
+
+    def create_user(self, params, query, body):
+        if body.get("username") in self.usernames:
+            return 400, {"message": "User username already exists", "errorCode": "A019"}
+        user = dict(next(iter(self.users.values()), {}) or self.synth.entity("GetUserByUuidResponseDto"))
+        user.update(body, uuid=self._uuid(), usedTrafficBytes=0, lifetimeUsedTrafficBytes=0,
+                    createdAt=_iso(self.now), updatedAt=_iso(self.now))
+        user["shortUuid"] = user["uuid"].replace("-", "")[:16]
+        user.setdefault("status", "ACTIVE")
+        user["activeInternalSquads"] = [
+            {"uuid": squad, "name": self.squads[squad]["name"]} for squad in body.get("activeInternalSquads", []) if squad in self.squads
+        ]
+        self.users[user["uuid"]] = user
+        self.usernames[user["username"]] = user["uuid"]
+        return 201, user
+
+    def update_user(self, params, query, body):
+        user_uuid = body.get("uuid") or self.usernames.get(body.get("username"))
+        return self._set_users([user_uuid], one=True, **{k: v for k, v in body.items() if k not in ("uuid", "username")})
+
+    def delete_user(self, params, query, body):
+        user = self._user(params["uuid"])
+        self.usernames.pop(user["username"], None)
+        self.devices.pop(user["uuid"], None)
+        return self._delete(self.users, params["uuid"])
+
+    def _set_users(self, uuids, one=False, **fields):
+        changed = 0
+        for user_uuid in uuids:
+            user = self.users.get(user_uuid)
+            if user is None:
+                if one:
+                    raise NotFound(user_uuid)
+                continue
+            user.update(fields, updatedAt=_iso(self.now))
+            changed += 1
+        return self.users[uuids[0]] if one else changed
+
+    def _bulk(self, uuids, **fields):
+        return {"affectedRows": self._set_users(uuids, **fields)}
+
+    def _bulk_all(self, **fields):
+        self._set_users(list(self.users), **fields)
+        return {"eventSent": True}
+
+    def bulk_delete_users(self, params, query, body):
+        deleted = 0
+        for user_uuid in body["uuids"]:
+            user = self.users.pop(user_uuid, None)
+            if user is not None:
+                self.usernames.pop(user["username"], None)
+                self.devices.pop(user_uuid, None)
+                deleted += 1
+        return {"affectedRows": deleted}
+
+    def bulk_delete_by_status(self, params, query, body):
+        uuids = [user["uuid"] for user in self.users.values() if user["status"] == body["status"]]
+        return self.bulk_delete_users(params, query, {"uuids": uuids})
+
+    def bulk_update_squads(self, params, query, body):
+        squads = [{"uuid": squad, "name": self.squads[squad]["name"]} for squad in body["activeInternalSquads"] if squad in self.squads]
+        return self._bulk(body["uuids"], activeInternalSquads=squads)
+
+    def list_devices(self, params, query, body):
+        devices = [device for devices in self.devices.values() for device in devices]
+        return {"devices": self._page(devices, query), "total": len(devices)}
+
+    def _user_devices(self, user_uuid):
+        devices = self.devices.get(user_uuid, [])
+        return {"total": len(devices), "devices": devices}
+
+    def add_device(self, params, query, body):
+        self._user(body["userUuid"])
+        device = {"hwid": body["hwid"], "userUuid": body["userUuid"], "platform": body.get("platform"),
+                  "osVersion": body.get("osVersion"), "deviceModel": body.get("deviceModel"),
+                  "userAgent": body.get("userAgent"), "createdAt": _iso(self.now), "updatedAt": _iso(self.now)}
+        self.devices.setdefault(body["userUuid"], []).append(device)
+        return self._user_devices(body["userUuid"])
+
+    def delete_device(self, params, query, body):
+        devices = self.devices.get(body["userUuid"], [])
+        self.devices[body["userUuid"]] = [device for device in devices if device["hwid"] != body["hwid"]]
+        return self._user_devices(body["userUuid"])
+
+    def create_node(self, params, query, body):
+        node = dict(next(iter(self.nodes.values()), None) or self.synth.entity("GetOneNodeResponseDto"))
+        node.update(body, uuid=self._uuid(), isConnected=False, usersOnline=0, createdAt=_iso(self.now), updatedAt=_iso(self.now))
+        self.nodes[node["uuid"]] = node
+        return 201, node
+
+    def create_host(self, params, query, body):
+        host = dict(next(iter(self.hosts.values()), None) or self.synth.entity("GetOneHostResponseDto"))
+        host.update(body, uuid=self._uuid(), viewPosition=len(self.hosts), isDisabled=False)
+        self.hosts[host["uuid"]] = host
+        return 201, host
+
+    def _bulk_hosts(self, uuids, delete=False, **fields):
+        for host_uuid in uuids:
+            if delete:
+                self.hosts.pop(host_uuid, None)
+            elif host_uuid in self.hosts:
+                self.hosts[host_uuid].update(fields)
+        return list(self.hosts.values())
+
+    def profile_inbounds(self, params, query, body):
+        inbounds = self._get(self.profiles, params["uuid"])["inbounds"]
+        return {"total": len(inbounds), "inbounds": inbounds}
+
+    def squad_nodes(self, params, query, body):
+        squad = self._get(self.squads, params["uuid"])
+        profiles = {inbound["profileUuid"] for inbound in squad["inbounds"]}
+        nodes = [node for node in self.nodes.values() if node["configProfile"]["activeConfigProfileUuid"] in profiles]
+        return {"squadUuid": squad["uuid"], "nodes": [
+            {"uuid": node["uuid"], "nodeName": node["name"], "countryCode": node["countryCode"],
+             "configProfileUuid": node["configProfile"]["activeConfigProfileUuid"], "configProfileName": "",
+             "activeSquads": [{"squadName": squad["name"], "activeInbounds": [i["tag"] for i in squad["inbounds"]]}]}
+            for node in nodes
+        ]}
+
+    # --- статистика ---
+
+    def _days(self, query):
+        end = _parse_date(query.get("end"), self.now)
+        start = max(_parse_date(query.get("start"), end - timedelta(days=7)), end - timedelta(days=366))
+        return [(start + timedelta(days=offset)).date().isoformat() for offset in range((end - start).days + 1)]
+
+    @staticmethod
+    def _amount(*parts):
+        # Детерминированное значение: один и тот же день и объект дают одно и то же число
+        return random.Random("|".join(map(str, parts))).randint(0, 20 * GB)
+
+    def user_usage(self, params, query, body):
+        user = self._user(params["uuid"])
+        nodes = list(self.nodes.values())[:3]
+        return [
+            {"userUuid": user["uuid"], "nodeUuid": node["uuid"], "nodeName": node["name"],
+             "countryCode": node["countryCode"], "total": self._amount(user["uuid"], node["uuid"], day), "date": day}
+            for day in self._days(query) for node in nodes
+        ]
+
+    def nodes_usage(self, params, query, body):
+        usage = []
+        for day in self._days(query):
+            for node in self.nodes.values():
+                download = self._amount(node["uuid"], day, "down") * 50
+                upload = self._amount(node["uuid"], day, "up") * 5
+                usage.append({"nodeUuid": node["uuid"], "nodeName": node["name"], "nodeCountryCode": node["countryCode"],
+                              "total": download + upload, "totalDownload": download, "totalUpload": upload,
+                              "humanReadableTotal": f"{(download + upload) / GB:.2f} GiB",
+                              "humanReadableTotalDownload": f"{download / GB:.2f} GiB",
+                              "humanReadableTotalUpload": f"{upload / GB:.2f} GiB", "date": day})
+        return usage
+
+    def node_users_usage(self, params, query, body):
+        node = self._get(self.nodes, params["uuid"])
+        users = list(self.users.values())[:50]
+        return [
+            {"userUuid": user["uuid"], "username": user["username"], "nodeUuid": node["uuid"],
+             "total": self._amount(user["uuid"], node["uuid"], day), "date": day}
+            for day in self._days(query) for user in users
+        ]
+
+    def realtime_usage(self, params, query, body):
+        usage = []
+        for node in self.nodes.values():
+            if not node["isConnected"]:
+                continue
+            download, upload = self.rng.randint(0, 10 ** 8), self.rng.randint(0, 10 ** 7)
+            usage.append({"nodeUuid": node["uuid"], "nodeName": node["name"], "countryCode": node["countryCode"],
+                          "downloadBytes": download * 3600, "uploadBytes": upload * 3600, "totalBytes": (download + upload) * 3600,
+                          "downloadSpeedBps": download, "uploadSpeedBps": upload, "totalSpeedBps": download + upload})
+        return usage
+
+    def system_stats(self, params, query, body):
+        counts = {}
+        for user in self.users.values():
+            counts[user["status"]] = counts.get(user["status"], 0) + 1
+        return {
+            "cpu": {"cores": 8, "physicalCores": 4},
+            "memory": {"total": 16 * GB, "free": 6 * GB, "used": 10 * GB, "active": 8 * GB, "available": 6 * GB},
+            "uptime": int(time.monotonic()), "timestamp": int(time.time() * 1000),
+            "users": {"statusCounts": counts, "totalUsers": len(self.users),
+                      "totalTrafficBytes": str(sum(user["usedTrafficBytes"] for user in self.users.values()))},
+            "onlineStats": {"lastDay": len(self.users) // 3, "lastWeek": len(self.users) // 2, "neverOnline": 0, "onlineNow": len(self.users) // 20},
+            "nodes": {"totalOnline": sum(1 for node in self.nodes.values() if node["isConnected"])},
+        }
+
+    def nodes_metrics(self, params, query, body):
+        nodes = []
+        for node in self.nodes.values():
+            inbounds = node["configProfile"]["activeInbounds"]
+            nodes.append({
+                "nodeUuid": node["uuid"], "nodeName": node["name"], "countryEmoji": node["countryCode"],
+                "providerName": "", "usersOnline": node["usersOnline"] or 0,
+                "inboundsStats": [{"tag": inbound["tag"], "upload": str(self._amount(node["uuid"], inbound["tag"], "up")),
+                                   "download": str(self._amount(node["uuid"], inbound["tag"], "down"))} for inbound in inbounds],
+                "outboundsStats": [{"tag": "DIRECT", "upload": str(self._amount(node["uuid"], "out", "up")),
+                                    "download": str(self._amount(node["uuid"], "out", "down"))}],
+            })
+        return {"nodes": nodes}
+
+    # --- HTTP ---
+
+    def dispatch(self, method, target, body):
+        """Answer one request: returns (status, JSON document)"""
+        parts = urlsplit(target)
+        path = unquote(parts.path)
+        if path.startswith("/api/"):
+            path = path[4:]
+        query = dict(parse_qsl(parts.query))
+        for route_method, template, pattern, operation in self.routes:
+            match = pattern.match(path) if route_method == method else None
+            if match is None:
+                continue
+            handler = self.handlers.get((method, template))
+            if handler is None:
+                return self.synth.response(operation)
+            try:
+                result = handler(match.groupdict(), query, body or {})
+            except NotFound as e:
+                return 404, {"statusCode": 404, "message": f"Not found: {e}", "error": "Not Found"}
+            except (KeyError, TypeError, ValueError) as e:
+                return 400, {"statusCode": 400, "message": f"Bad request: {e}", "error": "Bad Request"}
+            status, payload = result if isinstance(result, tuple) else (200, result)
+            return status, {"response": payload} if status < 400 else payload
+        return 404, {"statusCode": 404, "message": f"Cannot {method} {parts.path}", "error": "Not Found"}
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode("latin-1").split("\r\n")
+            method, target = lines[0].split(" ")[:2]
+            headers = {line.split(":", 1)[0].lower(): line.split(":", 1)[1].strip() for line in lines[1:] if ":" in line}
+            raw = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+        except (asyncio.IncompleteReadError, ValueError):
+            writer.close()
+            return
+        self.requests += 1
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            body = None
+
+        delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        status, document = self.dispatch(method, target, body)
+        payload = json.dumps(document).encode()
+        writer.write((
+            f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\nContent-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n"
+        ).encode() + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        """Start serving; the API base URL is http://host:port/api"""
+        return await asyncio.start_server(self.handle, host, port)
+
+
+async def _serve(options):
+    started = time.perf_counter()
+    panel = FakePanel(
+        users=options.users, nodes=options.nodes, hosts=options.hosts, profiles=options.profiles,
+        latency=options.latency / 1000, jitter=options.jitter / 1000, max_page_size=options.max_page_size, seed=options.seed,
+    )
+    server = await panel.start(options.host, options.port)
+    port = server.sockets[0].getsockname()[1]
+    print(
+        f"Fake panel on http://{options.host}:{port}/api: {len(panel.users)} users, {len(panel.nodes)} nodes, "
+        f"{len(panel.hosts)} hosts, {len(panel.profiles)} profiles, {sum(map(len, panel.devices.values()))} HWID devices "
+        f"(built in {time.perf_counter() - started:.1f} s); latency {options.latency}±{options.jitter} ms, "
+        f"page limit {options.max_page_size}"
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--nodes", type=int, default=200)
+    parser.add_argument("--hosts", type=int, default=None, help="default: two per node")
+    parser.add_argument("--profiles", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=20, help="added to every response, ms")
+    parser.add_argument("--jitter", type=float, default=5, help="± latency jitter, ms")
+    parser.add_argument("--max-page-size", type=int, default=1000, help="most items one page of users or devices returns")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3000)
+    options = parser.parse_args()
+    try:
+        asyncio.run(_serve(options))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ from telegram.ext import Application, MessageHandler, CallbackQueryHandler, filt
 
 # Import modules
 from modules.handlers.core.conversation import create_conversation_handler
+from modules.handlers.core.jobs import handle_job_callback
+from modules.utils.jobs import job_manager
 
 def setup_logging():
     """Setup logging configuration from environment variables"""
@@ -50,6 +52,14 @@ def setup_logging():
 current_log_level = setup_logging()
 logger = logging.getLogger(__name__)
 
+async def post_init(application):
+    """Start background job workers once the bot is initialized"""
+    await job_manager.start(application.bot)
+
+async def post_shutdown(application):
+    """Stop background job workers; unfinished jobs are resumable after restart"""
+    await job_manager.stop()
+
 def main():
     # Load environment variables
     load_dotenv()
@@ -71,7 +81,16 @@ def main():
         logger.error("ADMIN_USER_IDS environment variable is not set. No users will be able to use the bot.")
         return
       # Create the Application
-    application = Application.builder().token(bot_token).build()
+    application = (
+        Application.builder()
+        .token(bot_token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    
+    # Cancel/resume buttons of background jobs are handled before the conversation
+    application.add_handler(CallbackQueryHandler(handle_job_callback, pattern="^job_(cancel|resume)_"), group=-1)
     
     # Create and add conversation handler
     conv_handler = create_conversation_handler()
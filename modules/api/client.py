@@ -2,24 +2,90 @@ import httpx
 import logging
 import json
 import asyncio
-from modules.config import API_BASE_URL, API_TOKEN
+import re
+import time
+from collections import deque
+from modules.config import (
+    API_BASE_URL, API_TOKEN, API_COMPRESSION, API_HEDGING, HEDGE_BUDGET_RATIO, HEDGE_BUDGET_MAX,
+    HEDGE_MIN_SAMPLES, HEDGE_MIN_DELAY
+)
+from modules.api.transport import get_transport
+from modules.utils.json_codec import decode_json, feed_stream
+from modules.utils.json_stream import JsonArrayStream
+from modules.utils.resilience import OPEN, RetryBudget, breaker_for, retry_budget, retry_delay
+from modules.utils.scheduler import request_scheduler
+from modules.utils.deadline import current_deadline, remaining
 
 logger = logging.getLogger(__name__)
 
+# httpx распаковывает br только при установленном пакете brotli, поэтому предлагаем его лишь тогда
+try:
+    import brotli  # noqa: F401
+    SUPPORTED_ENCODINGS = "br, gzip, deflate"
+except ImportError:
+    SUPPORTED_ENCODINGS = "gzip, deflate"
+
+ACCEPT_ENCODING = SUPPORTED_ENCODINGS if API_COMPRESSION else "identity"
+
+UUID_SEGMENT = re.compile(r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}")
+
+# "METHOD endpoint" -> {"requests", "wire_bytes", "decoded_bytes"}
+transfer_stats = {}
+
+def endpoint_key(method, endpoint):
+    """Statistics key of a request: method and endpoint with UUIDs replaced by {uuid}"""
+    return f"{method.upper()} {UUID_SEGMENT.sub('{uuid}', endpoint.lstrip('/'))}"
+
+def record_transfer(method, endpoint, response, decoded_bytes=None):
+    """Count bytes received on the wire versus after decompression, per endpoint template"""
+    key = endpoint_key(method, endpoint)
+    stats = transfer_stats.setdefault(key, {"requests": 0, "wire_bytes": 0, "decoded_bytes": 0})
+    stats["requests"] += 1
+    stats["wire_bytes"] += response.num_bytes_downloaded
+    # У потоковых ответов тела целиком нет — размер считает вызывающий
+    stats["decoded_bytes"] += len(response.content) if decoded_bytes is None else decoded_bytes
+
+# "GET endpoint" -> задержки последних ответов (секунды); по их p95 выбирается момент дублирующего запроса
+_latencies = {}
+# "GET endpoint" -> {"requests", "hedged", "hedge_won"}
+hedge_stats = {}
+# Каждый запрос с хеджированием даёт HEDGE_BUDGET_RATIO дубля — суммарная нагрузка растёт не больше чем на эту долю
+hedge_budget = RetryBudget(HEDGE_BUDGET_RATIO, HEDGE_BUDGET_MAX)
+
+def record_latency(key, seconds):
+    _latencies.setdefault(key, deque(maxlen=200)).append(seconds)
+
+def hedge_delay(key):
+    """p95 of recent response times for an endpoint, or None until HEDGE_MIN_SAMPLES are collected"""
+    samples = _latencies.get(key)
+    if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return max(HEDGE_MIN_DELAY, ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))])
+
 def get_headers():
     """Get headers for API requests"""
     return {
         "Authorization": f"Bearer {API_TOKEN}",
         "Content-Type": "application/json",
         "Accept": "application/json",
+        "Accept-Encoding": ACCEPT_ENCODING,
         "User-Agent": "RemnaBot/1.0",
         "Connection": "close"
     }
 
+REQUEST_TIMEOUT = 60.0
+# Потоковое тело разбирается кусками такого размера; крупные куски уходят в рабочий поток
+STREAM_CHUNK_SIZE = 65536
+
 def get_client_kwargs():
-    """Get httpx client configuration"""
-    return {
-        "timeout": 60.0,
+    """Get httpx client configuration; the timeout is trimmed to the current handler deadline"""
+    timeout = REQUEST_TIMEOUT
+    left = remaining()
+    if left is not None:
+        timeout = max(0.1, min(timeout, left))
+    kwargs = {
+        "timeout": timeout,
         "verify": False if API_BASE_URL.startswith('http://') else True,
         "headers": get_headers(),
         # Нормальные лимиты соединений
@@ -27,117 +93,317 @@ def get_client_kwargs():
         # Форсируем HTTP/1.1
         "http2": False
     }
+    transport = get_transport()
+    if transport is not None:
+        # Запись или воспроизведение кассеты вместо прямого соединения с панелью
+        kwargs["transport"] = transport
+    return kwargs
+
+class APIStreamError(Exception):
+    """Raised when a streamed response fails or cannot be read completely"""
+
 
 class RemnaAPI:
     """API client for Remnawave API using httpx"""
     
+    # (префиксы эндпоинтов, callback) — вызываются после изменяющих запросов, например для сброса кэшей
+    _mutation_listeners = []
+    
+    @staticmethod
+    def on_mutation(prefixes, callback):
+        """Call `callback(method, endpoint)` after every non-GET request to an endpoint starting with one of `prefixes`"""
+        RemnaAPI._mutation_listeners.append((tuple(prefixes), callback))
+    
+    @staticmethod
+    def _notify_mutation(method, endpoint):
+        path = endpoint.lstrip('/')
+        for prefixes, callback in RemnaAPI._mutation_listeners:
+            if path.startswith(prefixes):
+                try:
+                    callback(method, path)
+                except Exception as e:
+                    logger.error(f"Mutation listener failed for {method} {path}: {e}")
+    
     @staticmethod
     async def _make_request(method, endpoint, data=None, params=None, retry_count=3):
-        """Make HTTP request with retry logic and proper error handling"""
+        """Make HTTP request and notify mutation listeners once a changing request has finished"""
+        try:
+            return await RemnaAPI._send_request(method, endpoint, data, params, retry_count)
+        finally:
+            if method.upper() != 'GET':
+                # Даже неудачный запрос мог частично примениться, поэтому кэши сбрасываем всегда
+                RemnaAPI._notify_mutation(method, endpoint)
+    
+    @staticmethod
+    async def _retry_wait(breaker, attempt, retry_count, retry_after=None):
+        """Sleep before the next attempt; returns False when the request must not be retried"""
+        if attempt >= retry_count - 1:
+            return False
+        if breaker.state == OPEN:
+            logger.warning(f"Circuit '{breaker.name}' is open, not retrying")
+            return False
+        wait_time = retry_delay(attempt, retry_after)
+        if wait_time is None:
+            logger.warning(f"Panel asked to retry after {retry_after}s, which is too long to wait")
+            return False
+        left = remaining()
+        if left is not None and wait_time >= left:
+            logger.warning(f"Only {max(left, 0):.1f}s left until the deadline, not retrying")
+            return False
+        if not retry_budget.withdraw():
+            logger.warning("Retry budget exhausted, not retrying")
+            return False
+        logger.info(f"Retrying in {wait_time:.1f} seconds...")
+        await asyncio.sleep(wait_time)
+        return True
+    
+    @staticmethod
+    async def _send_request(method, endpoint, data=None, params=None, retry_count=3):
+        """Make HTTP request with circuit breaker, jittered retries and proper error handling"""
         url = f"{API_BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
+        breaker = breaker_for(endpoint)
+        if not breaker.allow():
+            # Панель недоступна — отвечаем сразу, не дожидаясь таймаутов
+            logger.warning(f"Circuit '{breaker.name}' is open, failing fast: {method} {url}")
+            return None
+        retry_budget.deposit()
         
         logger.info(f"Making {method} request to: {url}")
         logger.debug(f"Request params: {params}")
         logger.debug(f"Request data: {data}")
         
         for attempt in range(retry_count):
+            left = remaining()
+            if left is not None and left <= 0:
+                logger.warning(f"Deadline exceeded before {method} {url}, giving up")
+                return None
             try:
                 client_kwargs = get_client_kwargs()
                 logger.debug(f"Client config: {client_kwargs}")
                 
-                async with httpx.AsyncClient(**client_kwargs) as client:
-                    request_kwargs = {
-                        'url': url,
-                        'params': params
-                    }
-                    
-                    if method.upper() in ['POST', 'PATCH', 'PUT'] and data is not None:
-                        request_kwargs['json'] = data
-                    
-                    response = await client.request(method, **request_kwargs)
-                    
-                    logger.debug(f"Response status: {response.status_code}")
-                    logger.debug(f"Response headers: {dict(response.headers)}")
-                    
-                    # Проверка статуса ответа
-                    if response.status_code >= 500:
-                        logger.warning(f"Server error {response.status_code}, retrying...")
-                        if attempt < retry_count - 1:
-                            await asyncio.sleep(2 ** attempt)
-                            continue
-                    
-                    response.raise_for_status()
-                    
-                    # Проверка Content-Type
-                    content_type = response.headers.get('content-type', '')
-                    if 'application/json' not in content_type.lower():
-                        logger.error(f"Expected JSON but got {content_type}. Response: {response.text[:500]}")
-                        return None
-                    
-                    # Парсинг JSON
-                    if not response.text.strip():
-                        logger.warning("Empty response received")
-                        return None
-                    
-                    json_response = response.json()
-                    
-                    # Обработка структуры ответа Remnawave API
-                    if isinstance(json_response, dict):
-                        if 'response' in json_response:
-                            return json_response['response']
-                        elif 'error' in json_response:
-                            logger.error(f"API returned error: {json_response['error']}")
-                            return None
-                        else:
-                            return json_response
-                    
-                    return json_response
-                        
-            except httpx.ConnectError as e:
-                logger.error(f"Connection error on attempt {attempt + 1}: {str(e)}")
-                if attempt < retry_count - 1:
-                    wait_time = 2 ** attempt
-                    logger.info(f"Retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"Failed to connect after {retry_count} attempts")
-                    return None
-                    
-            except httpx.TimeoutException as e:
-                logger.error(f"Timeout on attempt {attempt + 1}: {str(e)}")
-                if attempt < retry_count - 1:
-                    wait_time = min(2 ** attempt, 10)
-                    logger.info(f"Retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    logger.error(f"Timeout after {retry_count} attempts")
-                    return None
-                    
-            except httpx.HTTPStatusError as e:
-                status = e.response.status_code
-                if status == 404:
-                    logger.info(f"HTTP 404 for {url}: {e.response.text}")
-                    return None
-                logger.error(f"HTTP error {status}: {e.response.text}")
-                if status >= 500 and attempt < retry_count - 1:
-                    wait_time = 2 ** attempt
-                    logger.info(f"Server error, retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    return None
-                    
+                request_kwargs = {
+                    'url': url,
+                    'params': params
+                }
+                
+                if method.upper() in ['POST', 'PATCH', 'PUT'] and data is not None:
+                    request_kwargs['json'] = data
+                
+                # Ожидание в очереди тоже расходует время обработчика, поэтому дедлайн охватывает и его
+                async with asyncio.timeout_at(current_deadline()):
+                    # Слот берём на каждую попытку: пауза перед повтором не должна держать очередь
+                    async with request_scheduler.slot():
+                        async with httpx.AsyncClient(**client_kwargs) as client:
+                            # Тело распаковывается потоково по мере чтения, до JSON доходит уже декодированный текст
+                            response = await client.request(method, **request_kwargs)
+                            record_transfer(method, endpoint, response)
+            except TimeoutError:
+                # Время обработчика вышло: панель не виновата, автомат не трогаем
+                logger.warning(f"Deadline exceeded during {method} {url} (attempt {attempt + 1}), giving up")
+                return None
+            except httpx.TransportError as e:
+                # Ошибки соединения и таймауты
+                breaker.record_failure()
+                logger.error(f"{type(e).__name__} on attempt {attempt + 1}: {str(e)}")
+                if await RemnaAPI._retry_wait(breaker, attempt, retry_count):
+                    continue
+                logger.error(f"Request to {url} failed after {attempt + 1} attempts")
+                return None
             except Exception as e:
                 logger.error(f"Unexpected error on attempt {attempt + 1}: {str(e)}")
-                if attempt < retry_count - 1:
-                    await asyncio.sleep(1)
-                else:
-                    return None
+                return None
+            
+            logger.debug(f"Response status: {response.status_code}")
+            logger.debug(f"Response headers: {dict(response.headers)}")
+            
+            # Проверка статуса ответа
+            status = response.status_code
+            if status >= 500 or status == 429:
+                # 429 — панель жива, но просит подождать: автомат на неё не реагирует
+                if status >= 500:
+                    breaker.record_failure()
+                logger.warning(f"HTTP {status} from {url}: {response.text[:500]}")
+                if await RemnaAPI._retry_wait(breaker, attempt, retry_count, response.headers.get('retry-after')):
+                    continue
+                return None
+            
+            breaker.record_success()
+            if status == 404:
+                logger.info(f"HTTP 404 for {url}: {response.text}")
+                return None
+            if status >= 400:
+                logger.error(f"HTTP error {status}: {response.text}")
+                return None
+            
+            try:
+                return await RemnaAPI._parse_response(response)
+            except Exception as e:
+                logger.error(f"Failed to parse response from {url}: {str(e)}")
+                return None
         
         return None
     
     @staticmethod
-    async def get(endpoint, params=None):
-        """Make a GET request to the API"""
+    async def _parse_response(response):
+        """Decode a successful JSON response and unwrap the Remnawave `response` envelope"""
+        # Проверка Content-Type
+        content_type = response.headers.get('content-type', '')
+        if 'application/json' not in content_type.lower():
+            logger.error(f"Expected JSON but got {content_type}. Response: {response.text[:500]}")
+            return None
+        
+        # Парсинг JSON: тело читаем один раз как байты, без промежуточной строки
+        body = response.content
+        if not body or body.isspace():
+            logger.warning("Empty response received")
+            return None
+        
+        json_response = await decode_json(body)
+        
+        # Обработка структуры ответа Remnawave API
+        if isinstance(json_response, dict):
+            if 'response' in json_response:
+                return json_response['response']
+            elif 'error' in json_response:
+                logger.error(f"API returned error: {json_response['error']}")
+                return None
+        
+        return json_response
+    
+    @staticmethod
+    async def stream_items(endpoint, key, params=None, envelope=None, retry_count=3):
+        """
+        Yield the items of the `key` array of a GET response one by one. The body is
+        parsed incrementally as it arrives, chunks of JSON_OFFLOAD_THRESHOLD bytes in a
+        worker thread, so only the items and the unfinished tail of the text are held.
+        Items are handed out after the response is read and its scheduler slot released,
+        so a consumer may make its own panel requests between items. Connection errors,
+        5xx and 429 are retried; any other failure, or an open circuit breaker, raises
+        APIStreamError. `envelope`, if given, receives the unwrapped response without the array.
+        """
+        url = f"{API_BASE_URL.rstrip('/')}/{endpoint.lstrip('/')}"
+        breaker = breaker_for(endpoint)
+        if not breaker.allow():
+            raise APIStreamError(f"Circuit '{breaker.name}' is open, panel is degraded")
+        retry_budget.deposit()
+        logger.info(f"Streaming GET request to: {url}")
+        logger.debug(f"Request params: {params}")
+        
+        for attempt in range(retry_count):
+            parser = JsonArrayStream(key)
+            items = []
+            retry_after = None
+            try:
+                async with request_scheduler.slot(deadline=current_deadline()), \
+                        httpx.AsyncClient(**get_client_kwargs()) as client:
+                    async with client.stream('GET', url, params=params) as response:
+                        status = response.status_code
+                        if status >= 500 or status == 429:
+                            if status >= 500:
+                                breaker.record_failure()
+                            retry_after = response.headers.get('retry-after', '')
+                            logger.warning(f"HTTP {status} while streaming {url}")
+                        elif status >= 400:
+                            breaker.record_success()
+                            await response.aread()
+                            raise APIStreamError(f"HTTP error {status}: {response.text[:500]}")
+                        else:
+                            content_type = response.headers.get('content-type', '')
+                            if 'application/json' not in content_type.lower():
+                                raise APIStreamError(f"Expected JSON but got {content_type}")
+                            
+                            decoded_bytes = 0
+                            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                                left = remaining()
+                                if left is not None and left <= 0:
+                                    raise APIStreamError(f"Deadline exceeded while streaming {url}")
+                                decoded_bytes += len(chunk)
+                                items.extend(await feed_stream(parser, chunk))
+                            record_transfer('GET', endpoint, response, decoded_bytes)
+                            document = parser.close()
+                            breaker.record_success()
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if not await RemnaAPI._retry_wait(breaker, attempt, retry_count):
+                    raise APIStreamError(f"Stream of {url} failed: {e}") from e
+                continue
+            except TimeoutError as e:
+                raise APIStreamError(f"Deadline exceeded waiting to stream {url}") from e
+            except ValueError as e:
+                raise APIStreamError(f"Malformed JSON from {url}: {e}") from e
+            
+            if retry_after is not None:
+                if await RemnaAPI._retry_wait(breaker, attempt, retry_count, retry_after or None):
+                    continue
+                raise APIStreamError(f"Stream of {url} failed: panel keeps answering with errors")
+            
+            if isinstance(document, dict) and 'error' in document:
+                raise APIStreamError(f"API returned error: {document['error']}")
+            if envelope is not None and isinstance(document, dict):
+                envelope.update(document.get('response', document))
+            # Слот уже освобождён: потребитель может обращаться к панели между элементами
+            # Выданные элементы сразу отпускаем, чтобы страница не жила до конца перебора
+            items.reverse()
+            while items:
+                yield items.pop()
+            return
+        
+        raise APIStreamError(f"Stream of {url} failed after {retry_count} attempts")
+    
+    @staticmethod
+    async def _timed_get(key, endpoint, params):
+        started = time.monotonic()
+        result = await RemnaAPI._make_request('GET', endpoint, params=params)
+        record_latency(key, time.monotonic() - started)
+        return result
+    
+    @staticmethod
+    async def _hedged_get(endpoint, params=None):
+        """
+        Send an idempotent GET and, if it has not answered within the endpoint's p95
+        response time, a second identical one; the first successful answer wins and the other
+        is cancelled. A failed request (None) does not win while the other is still running.
+        """
+        key = endpoint_key('GET', endpoint)
+        stats = hedge_stats.setdefault(key, {"requests": 0, "hedged": 0, "hedge_won": 0})
+        stats["requests"] += 1
+        hedge_budget.deposit()
+        delay = hedge_delay(key)
+        
+        primary = asyncio.create_task(RemnaAPI._timed_get(key, endpoint, params))
+        tasks = {primary}
+        try:
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not hedge_budget.withdraw():
+                return await primary
+            
+            stats["hedged"] += 1
+            logger.debug(f"{key} slower than {delay * 1000:.0f} ms, sending a hedged request")
+            hedge = asyncio.create_task(RemnaAPI._timed_get(key, endpoint, params))
+            tasks.add(hedge)
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # При одновременном ответе предпочитаем основной запрос
+                for task in sorted(done, key=lambda task: task is not primary):
+                    if task.exception() is None and task.result() is not None:
+                        if task is hedge:
+                            stats["hedge_won"] += 1
+                        return task.result()
+                # Быстрая неудача (None) не побеждает: ждём ответа второго запроса
+            return primary.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    @staticmethod
+    async def get(endpoint, params=None, hedge=False):
+        """Make a GET request to the API; `hedge=True` allows a duplicate request for slow idempotent reads"""
+        if hedge and API_HEDGING:
+            return await RemnaAPI._hedged_get(endpoint, params)
         return await RemnaAPI._make_request('GET', endpoint, params=params)
     
     @staticmethod
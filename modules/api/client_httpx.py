@@ -5,6 +5,7 @@ import httpx
 import logging
 import asyncio
 from modules.config import API_BASE_URL, API_TOKEN
+from modules.api.transport import get_transport
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,9 @@ class RemnaAPIHttpx:
             "verify": False,  # Отключаем SSL для HTTP
             "headers": headers
         }
+        transport = get_transport()
+        if transport is not None:
+            client_kwargs["transport"] = transport
         
         logger.info(f"HTTPX: Making {method} request to {url}")
         
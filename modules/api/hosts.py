@@ -13,6 +13,14 @@ class HostAPI:
         """Get host by UUID"""
         return await RemnaAPI.get(f"hosts/{uuid}")
     
+    @staticmethod
+    async def get_host_tags():
+        """Get all distinct host tags"""
+        result = await RemnaAPI.get("hosts/tags")
+        if isinstance(result, dict) and 'tags' in result:
+            return result['tags']
+        return result
+    
     @staticmethod
     async def create_host(data):
         """Create a new host"""
@@ -75,11 +83,11 @@ class HostAPI:
         return await RemnaAPI.post("hosts/bulk/delete", data)
     
     @staticmethod
-    async def bulk_set_inbound_to_hosts(uuids, inbound_uuid):
+    async def bulk_set_inbound_to_hosts(uuids, inbound_uuid, config_profile_uuid=None):
         """Set inbound to hosts by UUIDs (v208 requires configProfile mapping)"""
         data = {
             "uuids": uuids,
-            "configProfileUuid": None,
+            "configProfileUuid": config_profile_uuid,
             "configProfileInboundUuid": inbound_uuid
         }
         return await RemnaAPI.post("hosts/bulk/set-inbound", data)
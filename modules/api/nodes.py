@@ -14,7 +14,7 @@ class NodeAPI:
     @staticmethod
     async def get_node_by_uuid(uuid):
         """Get node by UUID"""
-        return await RemnaAPI.get(f"nodes/{uuid}")
+        return await RemnaAPI.get(f"nodes/{uuid}", hedge=True)
     
     @staticmethod
     async def create_node(data):
@@ -72,7 +72,7 @@ class NodeAPI:
         logger.info("Requesting nodes realtime usage from API")
         
         # Try the primary endpoint first
-        result = await RemnaAPI.get("nodes/usage/realtime")
+        result = await RemnaAPI.get("nodes/usage/realtime", hedge=True)
         logger.info(f"Nodes realtime usage API response: {result}")
         
         # If empty, try alternative endpoints or fallback to all nodes info
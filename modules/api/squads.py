@@ -0,0 +1,44 @@
+from modules.api.client import RemnaAPI
+
+class SquadAPI:
+    """API methods for internal squad management"""
+    
+    @staticmethod
+    async def get_squads():
+        """Get all internal squads"""
+        result = await RemnaAPI.get("internal-squads")
+        if isinstance(result, dict) and 'internalSquads' in result:
+            return result['internalSquads']
+        return result
+    
+    @staticmethod
+    async def get_squad(uuid):
+        """Get internal squad by UUID"""
+        return await RemnaAPI.get(f"internal-squads/{uuid}")
+    
+    @staticmethod
+    async def get_accessible_nodes(uuid):
+        """Get nodes reachable through the squad's inbounds"""
+        result = await RemnaAPI.get(f"internal-squads/{uuid}/accessible-nodes")
+        if isinstance(result, dict) and 'accessibleNodes' in result:
+            return result['accessibleNodes']
+        return result
+    
+    @staticmethod
+    async def add_all_users(uuid):
+        """Add every user to the squad (processed by the panel in background)"""
+        return await RemnaAPI.post(f"internal-squads/{uuid}/bulk-actions/add-users")
+    
+    @staticmethod
+    async def remove_all_users(uuid):
+        """Remove every user from the squad (processed by the panel in background)"""
+        return await RemnaAPI.delete(f"internal-squads/{uuid}/bulk-actions/remove-users")
+    
+    @staticmethod
+    async def bulk_update_users_squads(uuids, squad_uuids):
+        """Replace active internal squads for users by UUIDs"""
+        data = {
+            "uuids": uuids,
+            "activeInternalSquads": squad_uuids
+        }
+        return await RemnaAPI.post("users/bulk/update-squads", data)
@@ -0,0 +1,190 @@
+"""
+Transports under the panel API clients: the live panel, a recorder that saves sanitized
+request/response pairs to a cassette, and a replay of a cassette with injected latency and errors
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+from urllib.parse import parse_qsl, urlsplit
+
+import httpx
+
+from modules.config import (
+    API_BASE_URL, API_TRANSPORT, API_CASSETTE, REPLAY_LATENCY, REPLAY_JITTER, REPLAY_ERROR_RATE, REPLAY_SEED
+)
+
+logger = logging.getLogger(__name__)
+
+# Значения этих полей в кассету не попадают: секреты по шаблону имени...
+SENSITIVE_KEY = re.compile(r"token|password|secret|private.?key|cookie|authorization", re.IGNORECASE)
+# ...клиентские учётные данные, ссылки подписки и персональные данные пользователей
+SENSITIVE_FIELDS = frozenset({
+    "vlessUuid", "shortUuid", "shortId", "subscriptionUrl", "links", "ssConfLinks", "cryptoLink",
+    "telegramId", "email", "requestIp", "first_name", "last_name", "photo_url",
+})
+# ...и те же значения в путях поиска пользователя
+SENSITIVE_PATH = re.compile(r"(by-(?:short-uuid|telegram-id|email)/)[^/]+")
+MASK = "***"
+# Из заголовков ответа сохраняются только влияющие на разбор и повторы
+KEPT_HEADERS = ("content-type", "retry-after")
+
+
+def _sensitive(key):
+    return key in SENSITIVE_FIELDS or bool(SENSITIVE_KEY.search(key))
+
+
+def sanitize(value):
+    """Copy of a JSON value with secrets, client credentials and personal data masked"""
+    if isinstance(value, dict):
+        return {
+            key: MASK if _sensitive(key) and item is not None else sanitize(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [sanitize(item) for item in value]
+    return value
+
+
+def unmasked_fields(value, path=""):
+    """Paths of sensitive fields that still hold a value, e.g. ["response.users[0].vlessUuid"]"""
+    found = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if _sensitive(key) and item not in (None, MASK):
+                found.append(f"{path}.{key}".lstrip("."))
+            else:
+                found.extend(unmasked_fields(item, f"{path}.{key}"))
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            found.extend(unmasked_fields(item, f"{path}[{index}]"))
+    return found
+
+
+def _relative_path(url):
+    """
+    Request path without the API base, so a cassette does not depend on the panel address;
+    lookups by short UUID, Telegram ID or email are masked when recorded and when replayed
+    """
+    base = urlsplit(API_BASE_URL).path.rstrip("/")
+    path = url.path
+    if base and path.startswith(base + "/"):
+        path = path[len(base):]
+    return SENSITIVE_PATH.sub(rf"\g<1>{MASK}", path.lstrip("/"))
+
+
+def _match_key(method, path, query):
+    return f"{method} {path}?{'&'.join(f'{key}={value}' for key, value in sorted(query))}"
+
+
+def _decode_body(content):
+    if not content:
+        return None
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode("utf-8", errors="replace")
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Forward requests to the panel and append each exchange to a JSON Lines cassette"""
+
+    def __init__(self, path, inner=None):
+        self.path = path
+        self.inner = inner or httpx.AsyncHTTPTransport(verify=not API_BASE_URL.startswith("http://"))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    async def handle_async_request(self, request):
+        # Тело пишем в кассету читаемым, поэтому у панели просим его без сжатия
+        request.headers["Accept-Encoding"] = "identity"
+        response = await self.inner.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+
+        entry = {
+            "method": request.method,
+            "path": _relative_path(request.url),
+            "query": sorted(parse_qsl(request.url.query.decode())),
+            "request": sanitize(_decode_body(request.content)),
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers},
+            "response": sanitize(_decode_body(content)),
+        }
+        with open(self.path, "a", encoding="utf-8") as cassette:
+            cassette.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+        return httpx.Response(response.status_code, headers=response.headers, content=content, request=request)
+
+    async def aclose(self):
+        # Транспорт общий для всех клиентов: закрытие клиента после запроса его не закрывает
+        pass
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Answer requests from a cassette without a panel. Requests match on method, path and
+    query; repeated matches cycle through the recorded responses. Each answer waits
+    `latency` ± `jitter` seconds, and a share `error_rate` of requests fails with a
+    connection error or HTTP 503 instead. Unknown requests get 404.
+    """
+
+    def __init__(self, path, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.entries = {}
+        self.positions = {}
+        self.misses = 0
+        with open(path, encoding="utf-8") as cassette:
+            for line in cassette:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = _match_key(entry["method"], entry["path"], [tuple(pair) for pair in entry["query"]])
+                    self.entries.setdefault(key, []).append(entry)
+        logger.info(f"Loaded {sum(map(len, self.entries.values()))} recorded responses from {path}")
+
+    async def handle_async_request(self, request):
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.random.random() < self.error_rate:
+            if self.random.random() < 0.5:
+                raise httpx.ConnectError("Injected connection error", request=request)
+            return httpx.Response(503, json={"message": "Injected error"}, request=request)
+
+        key = _match_key(request.method, _relative_path(request.url), parse_qsl(request.url.query.decode()))
+        recorded = self.entries.get(key)
+        if not recorded:
+            self.misses += 1
+            logger.warning(f"No recorded response for {key}")
+            return httpx.Response(404, json={"message": "No recorded response"}, request=request)
+
+        position = self.positions.get(key, 0)
+        self.positions[key] = position + 1
+        entry = recorded[position % len(recorded)]
+        body = entry["response"]
+        content = b"" if body is None else (body if isinstance(body, str) else json.dumps(body)).encode()
+        return httpx.Response(entry["status"], headers=entry["headers"], content=content, request=request)
+
+
+_transport = None
+
+
+def get_transport():
+    """Transport selected by API_TRANSPORT, shared by all clients; None means httpx's own (live panel)"""
+    global _transport
+    if _transport is None and API_TRANSPORT != "live":
+        if API_TRANSPORT == "record":
+            _transport = RecordingTransport(API_CASSETTE)
+        elif API_TRANSPORT == "replay":
+            _transport = ReplayTransport(
+                API_CASSETTE, REPLAY_LATENCY, REPLAY_JITTER, REPLAY_ERROR_RATE,
+                int(REPLAY_SEED) if REPLAY_SEED else None
+            )
+        else:
+            raise ValueError(f"Unknown API_TRANSPORT '{API_TRANSPORT}', expected live, record or replay")
+        logger.warning(f"Panel requests go through the {API_TRANSPORT} transport ({API_CASSETTE})")
+    return _transport
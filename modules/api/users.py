@@ -1,60 +1,97 @@
+import asyncio
 import logging
-from modules.api.client import RemnaAPI
+from contextlib import aclosing
+from modules.api.client import RemnaAPI, APIStreamError
+from modules.config import HWID_LIST_THRESHOLD
 import re
 
 logger = logging.getLogger(__name__)
 
+USERNAME_PATTERN = re.compile(r"^[a-zA-Z0-9_-]{6,34}$")
+TAG_PATTERN = re.compile(r"^[A-Z0-9_]{1,16}$")
+EMAIL_PATTERN = re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+REQUIRED_USER_FIELDS = ("username", "trafficLimitStrategy", "expireAt")
+TRAFFIC_LIMIT_STRATEGIES = ("NO_RESET", "DAY", "WEEK", "MONTH")
+
 class UserAPI:
     """API client for user operations"""
     
     @staticmethod
     async def get_all_users():
-        """Get all users with pagination support"""
+        """Get all users as one list; prefer iter_users() where the full list is not needed"""
         all_users = []
-        start = 0
-        size = 500  # Maximum allowed by API
-        
-        while True:
-            # Get batch of users
-            params = {
-                'size': size,
-                'start': start
-            }
-            
-            try:
-                response = await RemnaAPI.get("users", params=params)
-                
-                if not response:
-                    break
-                
-                # Handle different response structures
-                users = []
-                if isinstance(response, dict):
-                    if 'users' in response:
-                        users = response['users']
-                    elif 'response' in response and 'users' in response['response']:
-                        users = response['response']['users']
-                elif isinstance(response, list):
-                    users = response
-                
-                if not users:
-                    break
-                
-                all_users.extend(users)
-                
-                # If we got less than requested size, we've reached the end
-                if len(users) < size:
-                    break
-                
-                start += size
-                
-            except Exception as e:
-                logger.error(f"Error fetching users batch (start={start}, size={size}): {e}")
-                break
+        try:
+            async for user in UserAPI.iter_users():
+                all_users.append(user)
+        except APIStreamError as e:
+            logger.error(f"Error fetching users after {len(all_users)} records: {e}")
         
         logger.info(f"Retrieved {len(all_users)} users total")
         return {'users': all_users} if all_users else []
     
+    @staticmethod
+    async def iter_users(fields=None, where=None, limit=None, start=0, envelope=None, page_size=500):
+        """
+        Iterate over users without building the full list.
+        Pages are requested only as the consumer advances, so a slow consumer
+        pauses the download instead of buffering it. `where(user)` filters users,
+        `limit` stops after that many matches and closes the stream, `fields`
+        keeps only the listed keys of each user, and `start` skips users on the
+        panel side. `envelope` receives page fields such as `total`.
+        Raises APIStreamError if the panel cannot be read.
+        """
+        # Без фильтра просим у панели ровно limit записей: последняя страница дочитывается
+        # целиком, поэтому её total попадает в envelope
+        count = limit if where is None else None
+        matched = 0
+        async with aclosing(UserAPI.stream_users(page_size, envelope=envelope, start=start, count=count)) as users:
+            async for user in users:
+                if where is not None and not where(user):
+                    continue
+                yield user if fields is None else {field: user.get(field) for field in fields}
+                matched += 1
+                if count is None and limit is not None and matched >= limit:
+                    return
+    
+    @staticmethod
+    async def stream_users(page_size=500, envelope=None, start=0, count=None):
+        """
+        Yield users one by one from `start`, at most `count` of them; each page is parsed
+        incrementally from the response stream and only one page is held in memory, never
+        the full list. `envelope`, if given, is updated with each page's response fields such as `total`.
+        Raises APIStreamError if a page cannot be read.
+        """
+        if envelope is None:
+            envelope = {}
+        while count is None or count > 0:
+            size = page_size if count is None else min(page_size, count)
+            received = 0
+            params = {'size': size, 'start': start}
+            async with aclosing(RemnaAPI.stream_items("users", "users", params=params, envelope=envelope)) as users:
+                async for user in users:
+                    received += 1
+                    yield user
+            
+            total = envelope.get('total')
+            # Панель может отдать меньше запрошенного (свой предел размера страницы), поэтому
+            # конец списка определяем по total, а по короткой странице — только без него
+            if not received or (total is not None and start + received >= total) or (total is None and received < size):
+                return
+            start += received
+            if count is not None:
+                count -= received
+    
+    @staticmethod
+    async def get_users_page(start=0, size=500):
+        """Get one page of users: returns (users, total) or (None, None) on error"""
+        response = await RemnaAPI.get("users", params={'size': size, 'start': start})
+        if isinstance(response, dict):
+            users = response.get('users') or []
+            return users, response.get('total', len(users))
+        if isinstance(response, list):
+            return response, len(response)
+        return None, None
+
     @staticmethod
     async def get_users_count():
         """Get total number of users efficiently"""
@@ -70,17 +107,11 @@ class UserAPI:
                 elif 'count' in response:
                     return response['count']
             
-            # Fallback: get all users and count them
-            all_users_response = await UserAPI.get_all_users()
-            if all_users_response:
-                users = []
-                if isinstance(all_users_response, dict) and 'users' in all_users_response:
-                    users = all_users_response['users']
-                elif isinstance(all_users_response, list):
-                    users = all_users_response
-                return len(users)
-            
-            return 0
+            # Fallback: count users from the stream without keeping them
+            count = 0
+            async for _ in UserAPI.iter_users(fields=()):
+                count += 1
+            return count
         except Exception as e:
             logger.error(f"Error getting users count: {e}")
             return 0
@@ -88,7 +119,7 @@ class UserAPI:
     @staticmethod
     async def get_user_by_uuid(uuid):
         """Get user by UUID"""
-        return await RemnaAPI.get(f"users/{uuid}")
+        return await RemnaAPI.get(f"users/{uuid}", hedge=True)
     
     @staticmethod
     async def get_user_by_short_uuid(short_uuid):
@@ -125,52 +156,45 @@ class UserAPI:
         return result if result else []
     
     @staticmethod
-    async def create_user(user_data):
-        """Create a new user"""
-        # Validate required fields
-        required_fields = ["username", "trafficLimitStrategy", "expireAt"]
-        for field in required_fields:
+    def validate_user_data(user_data):
+        """Validate user creation data; returns an error message or None.
+        Forces NO_RESET strategy when a device limit is set, as the panel requires."""
+        for field in REQUIRED_USER_FIELDS:
             if field not in user_data:
-                logger.error(f"Missing required field: {field}")
-                return None
+                return f"Missing required field: {field}"
         
-        # Validate username format
-        if not re.match(r"^[a-zA-Z0-9_-]{6,34}$", user_data["username"]):
-            logger.error(f"Invalid username format: {user_data['username']}")
-            return None
+        if not USERNAME_PATTERN.match(str(user_data["username"])):
+            return f"Invalid username format: {user_data['username']}"
             
-        # Validate tag format if provided
-        if "tag" in user_data and user_data["tag"] and not re.match(r"^[A-Z0-9_]{1,16}$", user_data["tag"]):
-            logger.error(f"Invalid tag format: {user_data['tag']}")
-            return None
+        if user_data.get("tag") and not TAG_PATTERN.match(str(user_data["tag"])):
+            return f"Invalid tag format: {user_data['tag']}"
             
         # Если установлен лимит устройств, убедимся что стратегия трафика корректная (NO_RESET)
-        if "hwidDeviceLimit" in user_data and user_data.get("hwidDeviceLimit", 0) > 0:
-            if user_data.get("trafficLimitStrategy") != "NO_RESET":
-                logger.warning(f"Changing trafficLimitStrategy to NO_RESET because hwidDeviceLimit is set to {user_data['hwidDeviceLimit']}")
-                user_data["trafficLimitStrategy"] = "NO_RESET"
+        if (user_data.get("hwidDeviceLimit") or 0) > 0 and user_data.get("trafficLimitStrategy") != "NO_RESET":
+            logger.warning(f"Changing trafficLimitStrategy to NO_RESET because hwidDeviceLimit is set to {user_data['hwidDeviceLimit']}")
+            user_data["trafficLimitStrategy"] = "NO_RESET"
         
-        # Validate traffic limit strategy
-        valid_strategies = ["NO_RESET", "DAY", "WEEK", "MONTH"]
-        logger.info(f"Traffic limit strategy value: '{user_data.get('trafficLimitStrategy')}'")
-        if user_data["trafficLimitStrategy"] not in valid_strategies:
-            logger.error(f"Invalid traffic limit strategy: '{user_data['trafficLimitStrategy']}'")
-            return None
+        if user_data["trafficLimitStrategy"] not in TRAFFIC_LIMIT_STRATEGIES:
+            return f"Invalid traffic limit strategy: '{user_data['trafficLimitStrategy']}'"
         
-        # Validate numeric fields
         if "trafficLimitBytes" in user_data and user_data["trafficLimitBytes"] < 0:
-            logger.error(f"Invalid traffic limit: {user_data['trafficLimitBytes']}")
-            return None
+            return f"Invalid traffic limit: {user_data['trafficLimitBytes']}"
             
         if "hwidDeviceLimit" in user_data and user_data["hwidDeviceLimit"] < 0:
-            logger.error(f"Invalid HWID device limit: {user_data['hwidDeviceLimit']}")
-            return None
+            return f"Invalid HWID device limit: {user_data['hwidDeviceLimit']}"
         
-        # Validate email format if provided
-        if "email" in user_data and user_data["email"]:
-            if not re.match(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$", user_data["email"]):
-                logger.error(f"Invalid email format: {user_data['email']}")
-                return None
+        if user_data.get("email") and not EMAIL_PATTERN.match(str(user_data["email"])):
+            return f"Invalid email format: {user_data['email']}"
+        
+        return None
+    
+    @staticmethod
+    async def create_user(user_data):
+        """Create a new user"""
+        error = UserAPI.validate_user_data(user_data)
+        if error:
+            logger.error(error)
+            return None
         
         # Log data for debugging
         logger.debug(f"Creating user with data: {user_data}")
@@ -238,6 +262,50 @@ class UserAPI:
         """Get user HWID devices"""
         return await RemnaAPI.get(f"hwid/devices/{uuid}")
     
+    @staticmethod
+    async def get_users_by_uuids(uuids):
+        """
+        Get several users concurrently: returns {uuid: user or None}. The panel has no
+        list endpoint filtered by UUID, so each user is one request.
+        """
+        users = await asyncio.gather(*(UserAPI.get_user_by_uuid(uuid) for uuid in uuids))
+        return dict(zip(uuids, users))
+    
+    @staticmethod
+    async def get_hwid_devices_by_users(uuids, page_size=500):
+        """
+        Get HWID devices of several users: returns {uuid: [devices] or None}. Batches of
+        at least HWID_LIST_THRESHOLD users are answered from the paged list of all devices,
+        smaller ones with one request per user.
+        """
+        if len(uuids) < HWID_LIST_THRESHOLD:
+            responses = await asyncio.gather(*(UserAPI.get_user_hwid_devices(uuid) for uuid in uuids))
+            return {
+                uuid: response.get('devices', []) if isinstance(response, dict) else response
+                for uuid, response in zip(uuids, responses)
+            }
+        
+        wanted = set(uuids)
+        devices = {uuid: [] for uuid in uuids}
+        envelope = {}
+        start = 0
+        try:
+            while True:
+                received = 0
+                params = {'size': page_size, 'start': start}
+                async with aclosing(RemnaAPI.stream_items("hwid/devices", "devices", params=params, envelope=envelope)) as page:
+                    async for device in page:
+                        received += 1
+                        if device.get('userUuid') in wanted:
+                            devices[device['userUuid']].append(device)
+                total = envelope.get('total')
+                if not received or (total is not None and start + received >= total) or (total is None and received < page_size):
+                    return devices
+                start += received
+        except APIStreamError as e:
+            logger.error(f"Error listing HWID devices: {e}")
+            return {uuid: None for uuid in uuids}
+    
     @staticmethod
     async def add_user_hwid_device(uuid, hwid, platform=None, os_version=None, device_model=None, user_agent=None):
         """Add a HWID device to a user"""
@@ -271,102 +339,55 @@ class UserAPI:
         return await RemnaAPI.post("hwid/devices/delete", data)
     
     @staticmethod
-    async def search_users_by_partial_name(partial_name):
-        """Search users by partial name match"""
+    async def search_users_by_partial_name(partial_name, limit=None):
+        """Search users by partial name match, stopping after `limit` matches"""
+        partial_name_lower = partial_name.lower()
         try:
-            response = await UserAPI.get_all_users()
-            if not response:
-                return []
-            
-            # Обрабатываем разные структуры ответа
-            users = []
-            if isinstance(response, dict):
-                if 'users' in response:
-                    users = response['users']
-                elif 'response' in response and 'users' in response['response']:
-                    users = response['response']['users']
-            elif isinstance(response, list):
-                users = response
-            
-            if not users:
-                return []
-            
-            partial_name_lower = partial_name.lower()
-            matching_users = []
-            
-            for user in users:
-                if partial_name_lower in user.get("username", "").lower():
-                    matching_users.append(user)
-            
-            return matching_users
+            return [
+                user async for user in UserAPI.iter_users(
+                    where=lambda user: partial_name_lower in (user.get("username") or "").lower(),
+                    limit=limit
+                )
+            ]
         except Exception as e:
             logger.error(f"Error searching users by partial name: {e}")
             return []
     
     @staticmethod
-    async def search_users_by_description(description_keyword):
-        """Search users by description keyword"""
+    async def search_users_by_description(description_keyword, limit=None):
+        """Search users by description keyword, stopping after `limit` matches"""
+        keyword_lower = description_keyword.lower()
         try:
-            response = await UserAPI.get_all_users()
-            if not response:
-                return []
-            
-            # Обрабатываем разные структуры ответа
-            users = []
-            if isinstance(response, dict):
-                if 'users' in response:
-                    users = response['users']
-                elif 'response' in response and 'users' in response['response']:
-                    users = response['response']['users']
-            elif isinstance(response, list):
-                users = response
-            
-            if not users:
-                return []
-            
-            keyword_lower = description_keyword.lower()
-            matching_users = []
-            
-            for user in users:
-                user_description = user.get("description", "")
-                if user_description and keyword_lower in user_description.lower():
-                    matching_users.append(user)
-            
-            return matching_users
+            return [
+                user async for user in UserAPI.iter_users(
+                    where=lambda user: keyword_lower in (user.get("description") or "").lower(),
+                    limit=limit
+                )
+            ]
         except Exception as e:
             logger.error(f"Error searching users by description: {e}")
             return []
     
     @staticmethod
     async def get_users_stats():
-        """Get user statistics efficiently"""
+        """Get user statistics, aggregated over the user stream in constant memory"""
+        stats = {'ACTIVE': 0, 'DISABLED': 0, 'LIMITED': 0, 'EXPIRED': 0}
+        count = 0
+        total_traffic = 0
         try:
-            # For now, we need to get all users to calculate stats
-            # TODO: Optimize when API provides stats endpoint
-            response = await UserAPI.get_all_users()
-            
-            stats = {'ACTIVE': 0, 'DISABLED': 0, 'LIMITED': 0, 'EXPIRED': 0}
-            total_traffic = 0
-            
-            if response:
-                users = []
-                if isinstance(response, dict) and 'users' in response:
-                    users = response['users']
-                elif isinstance(response, list):
-                    users = response
+            async for user in UserAPI.iter_users(fields=('status', 'usedTrafficBytes', 'userTraffic')):
+                count += 1
+                status = user.get('status', 'UNKNOWN')
+                if status in stats:
+                    stats[status] += 1
                 
-                for user in users:
-                    status = user.get('status', 'UNKNOWN')
-                    if status in stats:
-                        stats[status] += 1
-                    
-                    # Calculate traffic
-                    traffic_used = user.get('trafficUsed', 0)
-                    if isinstance(traffic_used, (int, float)):
-                        total_traffic += traffic_used
+                # В v2 трафик приходит во вложенном объекте userTraffic
+                traffic_used = (user.get('userTraffic') or {}).get('usedTrafficBytes', user.get('usedTrafficBytes', 0))
+                if isinstance(traffic_used, (int, float)):
+                    total_traffic += traffic_used
             
             return {
-                'count': len(users) if 'users' in locals() else 0,
+                'count': count,
                 'stats': stats,
                 'total_traffic': total_traffic
             }
@@ -39,6 +39,10 @@ EDIT_HOST, EDIT_HOST_FIELD = range(19, 21)
 # Steps for host creation wizard
 CREATE_HOST, HOST_PROFILE, HOST_INBOUND, HOST_PARAMS = range(27, 31)
 CREATE_NODE, NODE_NAME, NODE_ADDRESS, NODE_PORT, NODE_TLS, SELECT_INBOUNDS = range(21, 27)
+BULK_IMPORT = 31
+BULK_GENERATE = 32
+BULK_FILTER = 33
+HOST_BULK_PORT = 34
 
 # User creation fields
 USER_FIELDS = {
@@ -62,4 +66,86 @@ DASHBOARD_SHOW_UPTIME = os.getenv("DASHBOARD_SHOW_UPTIME", "true").lower() == "t
 
 # Настройки поиска пользователей
 ENABLE_PARTIAL_SEARCH = os.getenv("ENABLE_PARTIAL_SEARCH", "true").lower() == "true"
-SEARCH_MIN_LENGTH = int(os.getenv("SEARCH_MIN_LENGTH", "2"))
\ No newline at end of file
+SEARCH_MIN_LENGTH = int(os.getenv("SEARCH_MIN_LENGTH", "2"))
+
+# Сжатие ответов панели (gzip, а при установленном brotli — br)
+API_COMPRESSION = os.getenv("API_COMPRESSION", "true").lower() == "true"
+# Ответы больше этого размера (в байтах) разбираются в отдельном потоке
+JSON_OFFLOAD_THRESHOLD = int(os.getenv("JSON_OFFLOAD_THRESHOLD", "65536"))
+
+# Время (в секундах), за которое обработчик нажатия должен получить ответы панели; 0 — без ограничения
+HANDLER_DEADLINE = float(os.getenv("HANDLER_DEADLINE", "8"))
+
+# Устойчивость к сбоям панели: автомат отключения по группам эндпоинтов и бюджет повторов
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "5"))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MAX = int(os.getenv("RETRY_BUDGET_MAX", "10"))
+
+# Планировщик запросов к панели: одновременные запросы, частота (запросов в секунду, 0 — без ограничения) и всплеск
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "8"))
+API_RATE_LIMIT = float(os.getenv("API_RATE_LIMIT", "0"))
+API_RATE_BURST = int(os.getenv("API_RATE_BURST", "20"))
+
+# Дублирующие запросы для медленных идемпотентных чтений: доля от числа запросов, запас,
+# сколько замеров нужно для p95 и минимальная задержка перед дублем (в секундах)
+API_HEDGING = os.getenv("API_HEDGING", "true").lower() == "true"
+HEDGE_BUDGET_RATIO = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_BUDGET_MAX = int(os.getenv("HEDGE_BUDGET_MAX", "5"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+
+# Группировка поштучных запросов пользователей: окно сбора ключей (в секундах) и размер пачки,
+# начиная с которого устройства HWID берутся одним списком, а не запросом на каждого пользователя
+LOADER_WINDOW = float(os.getenv("LOADER_WINDOW", "0.005"))
+HWID_LIST_THRESHOLD = int(os.getenv("HWID_LIST_THRESHOLD", "20"))
+
+# Транспорт запросов к панели: live — панель, record — панель с записью обменов в кассету,
+# replay — ответы из кассеты без панели с добавленной задержкой (в секундах) и долей ошибок
+API_TRANSPORT = os.getenv("API_TRANSPORT", "live").lower()
+API_CASSETTE = os.getenv("API_CASSETTE", "data/cassettes/panel.jsonl")
+REPLAY_LATENCY = float(os.getenv("REPLAY_LATENCY", "0"))
+REPLAY_JITTER = float(os.getenv("REPLAY_JITTER", "0"))
+REPLAY_ERROR_RATE = float(os.getenv("REPLAY_ERROR_RATE", "0"))
+REPLAY_SEED = os.getenv("REPLAY_SEED")
+
+# Кэширование данных панели (в секундах)
+NODE_METRICS_CACHE_TTL = int(os.getenv("NODE_METRICS_CACHE_TTL", "15"))
+TOPOLOGY_CACHE_TTL = int(os.getenv("TOPOLOGY_CACHE_TTL", "300"))
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", "30"))
+# Сколько секунд после истечения срока ещё показывать старые данные, обновляя их в фоне (0 — ждать загрузки)
+CACHE_MAX_STALE = int(os.getenv("CACHE_MAX_STALE", "300"))
+
+# Графики трафика (рендерятся в пуле процессов/потоков, не блокируя event loop)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_EXECUTOR = os.getenv("CHART_EXECUTOR", "process").lower()  # process или thread
+CHART_CACHE_TTL = int(os.getenv("CHART_CACHE_TTL", "600"))
+
+# Экспорт данных (размер страницы пользователей при потоковой выгрузке)
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+
+# Импорт пользователей из CSV/JSON
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "8"))
+IMPORT_RETRIES = int(os.getenv("IMPORT_RETRIES", "3"))
+IMPORT_CHECKPOINT_DIR = os.getenv("IMPORT_CHECKPOINT_DIR", "data/imports")
+
+# Массовые операции по фильтру
+USER_INDEX_TTL = int(os.getenv("USER_INDEX_TTL", "60"))
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+# Внутренние сквады: кэш списка и доступных серверов, лимит тела запроса со списком UUID (в байтах)
+SQUAD_CACHE_TTL = int(os.getenv("SQUAD_CACHE_TTL", "300"))
+BULK_PAYLOAD_LIMIT = int(os.getenv("BULK_PAYLOAD_LIMIT", "131072"))
+
+# Проверка доступности хостов (TCP/TLS)
+HOST_PROBE_CONCURRENCY = int(os.getenv("HOST_PROBE_CONCURRENCY", "200"))
+HOST_PROBE_TIMEOUT = float(os.getenv("HOST_PROBE_TIMEOUT", "2"))
+HOST_PROBE_TTL = int(os.getenv("HOST_PROBE_TTL", "120"))
+
+# Фоновые задачи (массовые операции, импорт, экспорт, перезапуск серверов)
+JOBS_DIR = os.getenv("JOBS_DIR", "data/jobs")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_PROGRESS_INTERVAL = float(os.getenv("JOB_PROGRESS_INTERVAL", "3"))
+ROLLING_RESTART_TIMEOUT = int(os.getenv("ROLLING_RESTART_TIMEOUT", "180"))
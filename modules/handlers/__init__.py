@@ -1,4 +1,4 @@
-from . import core, users, nodes, hosts, inbounds, bulk, stats
+from . import core, users, nodes, hosts, inbounds, bulk, stats, export
 
 __all__ = [
     "core",
@@ -8,4 +8,5 @@ __all__ = [
     "inbounds",
     "bulk",
     "stats",
+    "export",
 ]
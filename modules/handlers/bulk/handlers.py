@@ -1,22 +1,52 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+import asyncio
 import logging
+import os
+import tempfile
 
-from modules.config import MAIN_MENU, BULK_MENU, BULK_ACTION, BULK_CONFIRM
+from modules.config import (
+    MAIN_MENU, BULK_MENU, BULK_ACTION, BULK_CONFIRM, BULK_IMPORT, BULK_GENERATE, BULK_FILTER, JOBS_DIR
+)
 from modules.api.bulk import BulkAPI
 from modules.api.users import UserAPI
 from modules.utils.selection_helpers import SelectionHelper
+from modules.utils.importer import detect_format, run_import
+from modules.utils.generator import (
+    GenerateError, parse_generate_args, build_generation_base, plan_generation, generate_accounts
+)
+from modules.utils.presets import get_template_names, format_template_info
+from modules.utils.user_index import get_user_index, invalidate_user_index
+from modules.utils.user_filters import FILTER_HELP, FilterError, UserFilter
+from modules.utils.bulk_actions import (
+    BULK_ACTIONS, EXTEND_TITLE, UPDATE_FIELDS_HELP, BulkActionError, parse_update_fields, run_bulk_action,
+    plan_expiry_extension, run_expiry_extension
+)
+from modules.utils.squads import (
+    get_squads, get_accessible_nodes, invalidate_squads, plan_squad_change, run_squad_change
+)
+from modules.api.squads import SquadAPI
+from modules.utils.formatters import escape_markdown
+from modules.utils.jobs import job_manager
 from modules.handlers.core.start import show_main_menu
+from modules.handlers.export import show_export_menu, handle_export_button
 
 logger = logging.getLogger(__name__)
 
+# Загруженные файлы импорта хранятся рядом с задачами, чтобы пережить перезапуск
+IMPORT_FILES_DIR = os.path.join(JOBS_DIR, "files")
+
 async def show_bulk_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show bulk operations menu"""
     keyboard = [
         [InlineKeyboardButton("🔄 Сбросить трафик всем", callback_data="bulk_reset_all_traffic")],
         [InlineKeyboardButton("❌ Удалить неактивных", callback_data="bulk_delete_inactive")],
         [InlineKeyboardButton("❌ Удалить истекших", callback_data="bulk_delete_expired")],
-        [InlineKeyboardButton("🔄 Массовое обновление", callback_data="bulk_update_all")],
+        [InlineKeyboardButton("🎯 Действия по фильтру", callback_data="bulk_filter")],
+        [InlineKeyboardButton("👥 Внутренние сквады", callback_data="bulk_squads")],
+        [InlineKeyboardButton("📥 Импорт пользователей", callback_data="bulk_import")],
+        [InlineKeyboardButton("🧬 Генерация по шаблону", callback_data="bulk_generate")],
+        [InlineKeyboardButton("📤 Экспорт данных", callback_data="bulk_export")],
         [InlineKeyboardButton("🔙 Назад в главное меню", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -90,14 +120,153 @@ async def handle_bulk_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return BULK_CONFIRM
 
-    elif data == "bulk_update_all":
-        # TODO: Implement bulk update all
+    elif data == "bulk_filter" or data == "bulk_update_all":
+        context.user_data["bulk_filter_step"] = "filter"
+        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")]]
+        await query.edit_message_text(
+            "🎯 *Действия по фильтру*\n\n"
+            "Отправьте условия через пробел, все должны выполняться одновременно:\n\n"
+            f"{FILTER_HELP}\n\n"
+            "Пример: `status=ACTIVE traffic>=90% telegram=yes`",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown"
+        )
+        return BULK_FILTER
+
+    elif data == "bulkf_update":
+        context.user_data["bulk_filter_step"] = "fields"
+        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")]]
+        await query.edit_message_text(
+            "✏️ *Изменение полей*\n\nОтправьте новые значения:\n\n" + UPDATE_FIELDS_HELP,
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown"
+        )
+        return BULK_FILTER
+
+    elif data == "bulkf_extend":
+        context.user_data["bulk_filter_step"] = "extend_days"
+        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")]]
+        await query.edit_message_text(
+            "📅 *Продление подписки*\n\n"
+            "Отправьте количество дней. Срок продлевается от текущей даты истечения, "
+            "а для уже истекших — от сегодняшнего дня.",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown"
+        )
+        return BULK_FILTER
+
+    elif data == "bulkf_squads":
+        if not context.user_data.get("bulk_filter_uuids"):
+            return BULK_MENU
+        keyboard = [
+            [
+                InlineKeyboardButton("➕ Добавить в сквад", callback_data="bulksq_op_add"),
+                InlineKeyboardButton("➖ Убрать из сквада", callback_data="bulksq_op_remove")
+            ],
+            [InlineKeyboardButton("🔀 Переместить между сквадами", callback_data="bulksq_op_move")],
+            [InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]
+        ]
+        await query.edit_message_text(
+            f"👥 *Сквады для {len(context.user_data['bulk_filter_uuids'])} пользователей*\n\nВыберите действие:",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown"
+        )
+        return BULK_FILTER
+
+    elif data.startswith("bulksq_op_"):
+        context.user_data["bulk_squad_op"] = data[len("bulksq_op_"):]
+        context.user_data.pop("bulk_squad_source", None)
+        prompt = "Выберите сквад, из которого переместить:" if data == "bulksq_op_move" else "Выберите сквад:"
+        return await _show_squad_picker(query, context, prompt, "bulksq_pick_")
+
+    elif data.startswith("bulksq_pick_"):
+        return await _handle_squad_pick(query, context, int(data[len("bulksq_pick_"):]))
+
+    elif data == "bulk_squads":
+        return await show_squads_list(query, context)
+
+    elif data.startswith("bulksq_view_"):
+        return await show_squad_details(query, context, int(data[len("bulksq_view_"):]))
+
+    elif data.startswith("bulksq_all_"):
+        _, _, operation, index = data.split("_")
+        squads = context.user_data.get("bulk_squads") or []
+        if int(index) >= len(squads):
+            return BULK_MENU
+        name = squads[int(index)][1]
+        question = f"добавить ВСЕХ пользователей в сквад «{name}»" if operation == "add" else \
+            f"убрать ВСЕХ пользователей из сквада «{name}»"
+        keyboard = [[
+            InlineKeyboardButton("✅ Да", callback_data=f"confirm_squad_{operation}_{index}"),
+            InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")
+        ]]
+        await query.edit_message_text(f"⚠️ Вы уверены, что хотите {question}?", reply_markup=InlineKeyboardMarkup(keyboard))
+        return BULK_CONFIRM
+
+    elif data.startswith("bulkf_"):
+        action = data[len("bulkf_"):]
+        if action not in BULK_ACTIONS or not context.user_data.get("bulk_filter_uuids"):
+            return BULK_MENU
+        context.user_data["bulk_filter_action"] = action
+        context.user_data.pop("bulk_filter_fields", None)
+        await query.edit_message_text(
+            _bulk_filter_confirmation_text(context),
+            reply_markup=_bulk_filter_confirmation_keyboard(),
+            parse_mode="Markdown"
+        )
+        return BULK_CONFIRM
+
+    elif data == "bulk_import":
+        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")]]
+        await query.edit_message_text(
+            "📥 *Импорт пользователей*\n\n"
+            "Отправьте файл CSV, JSON или JSONL. Колонки соответствуют полям API: "
+            "`username`, `expireAt`, `trafficLimitBytes`, `trafficLimitStrategy`, "
+            "`hwidDeviceLimit`, `telegramId`, `email`, `tag`, `activeInternalSquads`.\n\n"
+            "Если импорт был прерван, отправьте тот же файл ещё раз — он продолжится с места остановки.",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown"
+        )
+        return BULK_IMPORT
+
+    elif data == "bulk_generate":
+        templates = get_template_names()
+        keyboard = [
+            [InlineKeyboardButton(name, callback_data=f"gen_tpl_{index}")]
+            for index, name in enumerate(templates)
+        ]
+        keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")])
         await query.edit_message_text(
-            "🚧 Функция массового обновления находится в разработке.",
+            "🧬 *Генерация аккаунтов*\n\nВыберите шаблон:",
+            reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode="Markdown"
         )
         return BULK_MENU
 
+    elif data.startswith("gen_tpl_"):
+        templates = get_template_names()
+        index = int(data[len("gen_tpl_"):])
+        if index >= len(templates):
+            return BULK_MENU
+        context.user_data["generate_template"] = templates[index]
+        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")]]
+        await query.edit_message_text(
+            f"{format_template_info(templates[index])}\n\n"
+            "Отправьте количество, шаблон имени и, при необходимости, срок в днях:\n"
+            "`100 trial_{n} 7`\n\n"
+            "`{n}` — порядковый номер, `{rand}` — случайные символы. "
+            "Занятые имена пропускаются автоматически.",
+            reply_markup=InlineKeyboardMarkup(keyboard),
+            parse_mode="Markdown"
+        )
+        return BULK_GENERATE
+
+    elif data == "bulk_export":
+        return await show_export_menu(update, context)
+
+    elif data.startswith("export_"):
+        return await handle_export_button(update, context)
+
     elif data == "back_to_bulk":
         await show_bulk_menu(update, context)
         return BULK_MENU
@@ -116,69 +285,526 @@ async def handle_bulk_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE
     data = query.data
 
     if data == "confirm_reset_all_traffic":
-        # Reset all users traffic
+        await job_manager.submit("bulk_panel", {"operation": "reset_all_traffic"}, query.message.chat_id)
+        return await _show_job_queued(query)
+
+    elif data == "confirm_delete_inactive":
+        await job_manager.submit("bulk_panel", {"operation": "delete_by_status", "status": "DISABLED"}, query.message.chat_id)
+        return await _show_job_queued(query)
+
+    elif data == "confirm_delete_expired":
+        await job_manager.submit("bulk_panel", {"operation": "delete_by_status", "status": "EXPIRED"}, query.message.chat_id)
+        return await _show_job_queued(query)
+
+    elif data == "confirm_bulk_filter":
+        return await run_bulk_filter_action(update, context)
+
+    elif data.startswith("confirm_squad_"):
+        _, _, operation, index = data.split("_")
+        squads = context.user_data.get("bulk_squads") or []
+        if int(index) >= len(squads):
+            return BULK_MENU
+        uuid, name = squads[int(index)]
+        params = {"mode": "panel", "operation": operation, "squad": uuid, "name": name}
+        await job_manager.submit("bulk_squads", params, query.message.chat_id)
+        return await _show_job_queued(query)
+
+    elif data == "back_to_bulk":
+        await show_bulk_menu(update, context)
+        return BULK_MENU
+
+    return BULK_MENU
+
+async def _show_job_queued(query):
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]]
+    await query.edit_message_text(
+        "✅ Задача поставлена в очередь. Прогресс будет показываться отдельным сообщением.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return BULK_MENU
+
+@job_manager.register("bulk_panel", "🔄 Массовая операция")
+async def run_bulk_panel_job(job):
+    """Single panel-side bulk call: reset all traffic or delete by status"""
+    params = job.params
+    if params["operation"] == "reset_all_traffic":
         result = await BulkAPI.bulk_reset_all_users_traffic()
-        
-        if result:
-            message = "✅ Трафик успешно сброшен у всех пользователей."
+        if not result:
+            raise RuntimeError("панель не выполнила сброс трафика")
+        return {"text": "Трафик сброшен у всех пользователей."}
+
+    result = await BulkAPI.bulk_delete_users_by_status(params["status"])
+    if not result:
+        raise RuntimeError("панель не выполнила удаление")
+    invalidate_user_index()
+    deleted = result.get("affectedRows", result.get("deletedCount", 0))
+    return {"text": f"Удалено пользователей со статусом {params['status']}: {deleted}"}
+
+async def handle_import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Save an uploaded CSV/JSON document and queue an import job for it"""
+    document = update.message.document
+    os.makedirs(IMPORT_FILES_DIR, exist_ok=True)
+    handle, path = tempfile.mkstemp(
+        prefix="import_", suffix=os.path.splitext(document.file_name or "")[1], dir=IMPORT_FILES_DIR
+    )
+    os.close(handle)
+
+    try:
+        telegram_file = await document.get_file()
+        await telegram_file.download_to_drive(path)
+    except Exception as e:
+        os.unlink(path)
+        logger.error(f"Error downloading import file: {e}")
+        await update.message.reply_text("❌ Не удалось загрузить файл.")
+        return BULK_IMPORT
+
+    # Неподходящий документ отклоняем сразу, а не в фоновой задаче
+    try:
+        await asyncio.to_thread(detect_format, path)
+    except ValueError as e:
+        os.unlink(path)
+        logger.warning(f"Rejected import file {document.file_name}: {e}")
+        if isinstance(e, UnicodeDecodeError):
+            message = "❌ Файл должен быть в кодировке UTF-8."
         else:
-            message = "❌ Ошибка при сбросе трафика."
-        
-        # Add back button
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
+            message = "❌ JSON-файл должен содержать массив пользователей или по одному объекту на строку (JSONL)."
+        await update.message.reply_text(message)
+        return BULK_IMPORT
+
+    await job_manager.submit("import", {"path": path, "file_name": document.file_name}, update.effective_chat.id)
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]]
+    await update.message.reply_text(
+        "✅ Импорт поставлен в очередь. Прогресс будет показываться отдельным сообщением.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return BULK_MENU
+
+@job_manager.register("import", "📥 Импорт пользователей")
+async def run_import_job(job):
+    """Import users from the stored file; run_import keeps its own per-row checkpoint"""
+    path = job.params["path"]
+    report_path, counts, resumed = await run_import(path, progress=job.progress)
+    os.unlink(path)
+    invalidate_user_index()
+
+    message = "Продолжено с контрольной точки\n" if resumed else ""
+    message += f"➕ Создано: {counts.get('created', 0)}\n"
+    message += f"👤 Уже существуют: {counts.get('exists', 0)}\n"
+    message += f"🔁 Дубликаты в файле: {counts.get('duplicate', 0)}\n"
+    message += f"⚠️ Ошибки валидации: {counts.get('invalid', 0)}\n"
+    message += f"❌ Ошибки API: {counts.get('failed', 0)}"
+    return {"text": message, "document": report_path, "filename": "import_report.csv"}
+
+async def handle_generate_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Check the generation parameters and queue a job that sends back a CSV with subscription URLs"""
+    template_name = context.user_data.get("generate_template")
+    if not template_name:
+        await update.message.reply_text("❌ Шаблон не выбран.")
+        return BULK_MENU
+
+    try:
+        count, pattern, days = parse_generate_args(update.message.text)
+        build_generation_base(template_name, count, pattern, days)
+    except GenerateError as e:
+        await update.message.reply_text(f"❌ {e}", parse_mode="Markdown")
+        return BULK_GENERATE
+
+    params = {"template": template_name, "count": count, "pattern": pattern, "days": days}
+    await job_manager.submit("generate", params, update.effective_chat.id)
+    context.user_data.pop("generate_template", None)
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]]
+    await update.message.reply_text(
+        "✅ Генерация поставлена в очередь. Прогресс будет показываться отдельным сообщением.",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return BULK_MENU
+
+@job_manager.register("generate", "🧬 Генерация аккаунтов")
+async def run_generate_job(job):
+    """Create accounts from a template; the checkpoint keeps the chosen usernames and the created accounts"""
+    params = job.params
+    plan = job.checkpoint.get("plan")
+    if plan is None:
+        plan = await plan_generation(params["template"], params["count"], params["pattern"], params["days"])
+        # План сохраняем сразу: при продолжении имена не подбираются заново
+        job.save_checkpoint({"plan": plan, "created": {}})
+        job.manager.persist(job.record)
+    created = dict(job.checkpoint.get("created") or {})
+
+    async def progress(done, total):
+        job.save_checkpoint({"plan": plan, "created": created})
+        await job.progress(done, total)
+
+    report_path, created_count, failed = await generate_accounts(plan["base"], plan["usernames"], created, progress)
+    invalidate_user_index()
+    return {
+        "text": f"➕ Создано: {created_count}\n❌ Ошибки: {failed}",
+        "document": report_path,
+        "filename": "generated_users.csv",
+    }
+
+def _bulk_filter_confirmation_text(context):
+    action = context.user_data["bulk_filter_action"]
+    count = len(context.user_data["bulk_filter_uuids"])
+    fields = context.user_data.get("bulk_filter_fields")
+    if action == "extend":
+        groups, singles = context.user_data["bulk_filter_plan"]
+        message = f"⚠️ *{EXTEND_TITLE} на {fields['days']} дн.* для {count} пользователей?\n\n"
+        message += f"🎯 Фильтр: {escape_markdown(context.user_data.get('bulk_filter_description', ''))}\n"
+        message += f"📦 Групповых обновлений: {len(groups)} ({count - len(singles)} пользователей)\n"
+        message += f"✏️ Индивидуальных обновлений: {len(singles)}\n"
+        return message
+
+    if action == "squads":
+        groups = context.user_data["bulk_filter_plan"]
+        changed = sum(len(uuids) for _, uuids in groups)
+        message = f"⚠️ *{_squad_change_title(fields)}*?\n\n"
+        message += f"🎯 Фильтр: {escape_markdown(context.user_data.get('bulk_filter_description', ''))}\n"
+        message += f"👥 Изменится состав у {changed} из {count} пользователей\n"
+        message += f"📦 Групп с одинаковым набором сквадов: {len(groups)}\n"
+        return message
+
+    message = f"⚠️ *{BULK_ACTIONS[action][0]}* для {count} пользователей?\n\n"
+    message += f"🎯 Фильтр: {escape_markdown(context.user_data.get('bulk_filter_description', ''))}\n"
+    if fields:
+        message += "✏️ Поля: " + escape_markdown(", ".join(f"{key}={value}" for key, value in fields.items())) + "\n"
+    return message
+
+def _bulk_filter_confirmation_keyboard():
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("✅ Выполнить", callback_data="confirm_bulk_filter"),
+        InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")
+    ]])
+
+async def handle_bulk_filter_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle a filter expression (dry-run preview) or update fields for the filter action"""
+    text = update.message.text
+    cancel_keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")]])
+
+    if context.user_data.get("bulk_filter_step") == "extend_days":
+        if not text.strip().isdigit() or not 1 <= int(text.strip()) <= 3650:
+            await update.message.reply_text("❌ Укажите число дней от 1 до 3650.", reply_markup=cancel_keyboard)
+            return BULK_FILTER
+        days = int(text.strip())
+        context.user_data["bulk_filter_action"] = "extend"
+        context.user_data["bulk_filter_fields"] = {"days": days}
+        context.user_data["bulk_filter_plan"] = plan_expiry_extension(context.user_data["bulk_filter_users"], days)
+        await update.message.reply_text(
+            _bulk_filter_confirmation_text(context),
+            reply_markup=_bulk_filter_confirmation_keyboard(),
             parse_mode="Markdown"
         )
-        return BULK_MENU
+        return BULK_CONFIRM
 
-    elif data == "confirm_delete_inactive":
-        # Delete all inactive users
-        result = await BulkAPI.bulk_delete_users_by_status("DISABLED")
-        
-        if result:
-            message = f"✅ Успешно удалено {result.get('deletedCount', 0)} неактивных пользователей."
-        else:
-            message = "❌ Ошибка при удалении пользователей."
-        
-        # Add back button
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
+    if context.user_data.get("bulk_filter_step") == "fields":
+        try:
+            fields = parse_update_fields(text)
+        except BulkActionError as e:
+            await update.message.reply_text(f"❌ {e}", reply_markup=cancel_keyboard, parse_mode="Markdown")
+            return BULK_FILTER
+        context.user_data["bulk_filter_action"] = "update"
+        context.user_data["bulk_filter_fields"] = fields
+        await update.message.reply_text(
+            _bulk_filter_confirmation_text(context),
+            reply_markup=_bulk_filter_confirmation_keyboard(),
             parse_mode="Markdown"
         )
+        return BULK_CONFIRM
+
+    try:
+        user_filter = UserFilter(text)
+    except FilterError as e:
+        await update.message.reply_text(f"❌ {e}", reply_markup=cancel_keyboard)
+        return BULK_FILTER
+
+    index = await get_user_index()
+    if index is None:
+        await update.message.reply_text("❌ Не удалось загрузить список пользователей.", reply_markup=cancel_keyboard)
+        return BULK_FILTER
+
+    matched = user_filter.apply(index)
+    context.user_data["bulk_filter_uuids"] = [record["uuid"] for record in matched]
+    context.user_data["bulk_filter_users"] = [[record["uuid"], record.get("expireAt")] for record in matched]
+    context.user_data["bulk_filter_description"] = user_filter.describe()
+
+    message = "🔍 *Предпросмотр*\n\n"
+    message += f"🎯 Фильтр: {escape_markdown(user_filter.describe())}\n"
+    message += f"👥 Подходит: *{len(matched)}* из {len(index)}\n"
+    if matched:
+        message += "\nПримеры:\n"
+        for record in matched[:10]:
+            message += f"• {escape_markdown(record.get('username') or record['uuid'])} — {record.get('status', '?')}\n"
+        if len(matched) > 10:
+            message += f"... и еще {len(matched) - 10}\n"
+        message += "\nВыберите действие или отправьте новый фильтр:"
+
+    keyboard = []
+    if matched:
+        actions = list(BULK_ACTIONS.items())
+        actions.insert(len(actions) - 1, ("extend", (EXTEND_TITLE, None)))
+        for i in range(0, len(actions), 2):
+            keyboard.append([
+                InlineKeyboardButton(title, callback_data=f"bulkf_{action}")
+                for action, (title, _) in actions[i:i + 2]
+            ])
+        keyboard.append([InlineKeyboardButton("👥 Сквады", callback_data="bulkf_squads")])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")])
+
+    await update.message.reply_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
+    return BULK_FILTER
+
+async def run_bulk_filter_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue the confirmed action over the filtered users as a background job"""
+    query = update.callback_query
+    action = context.user_data.get("bulk_filter_action")
+    uuids = context.user_data.get("bulk_filter_uuids") or []
+    if action == "extend" and context.user_data.get("bulk_filter_plan"):
+        groups, singles = context.user_data["bulk_filter_plan"]
+        params = {"days": context.user_data["bulk_filter_fields"]["days"], "groups": groups, "singles": singles}
+        await job_manager.submit("bulk_extend", params, query.message.chat_id)
+    elif action == "squads" and context.user_data.get("bulk_filter_plan"):
+        params = {"mode": "users", "uuids": uuids, "fields": context.user_data["bulk_filter_fields"]}
+        await job_manager.submit("bulk_squads", params, query.message.chat_id)
+    elif action in BULK_ACTIONS and uuids:
+        params = {"action": action, "uuids": uuids, "fields": context.user_data.get("bulk_filter_fields")}
+        await job_manager.submit("bulk_filter", params, query.message.chat_id)
+    else:
+        await show_bulk_menu(update, context)
         return BULK_MENU
 
-    elif data == "confirm_delete_expired":
-        # Delete all expired users
-        result = await BulkAPI.bulk_delete_users_by_status("EXPIRED")
-        
-        if result:
-            message = f"✅ Успешно удалено {result.get('deletedCount', 0)} пользователей с истекшим сроком."
-        else:
-            message = "❌ Ошибка при удалении пользователей."
-        
-        # Add back button
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+    for key in (
+        "bulk_filter_uuids", "bulk_filter_users", "bulk_filter_plan",
+        "bulk_filter_action", "bulk_filter_fields", "bulk_filter_step", "bulk_squad_op", "bulk_squad_source"
+    ):
+        context.user_data.pop(key, None)
+    return await _show_job_queued(query)
+
+@job_manager.register("bulk_filter", "🎯 Действие по фильтру")
+async def run_bulk_filter_job(job):
+    """Run a filtered bulk action chunk by chunk, checkpointing the offset after every chunk"""
+    params = job.params
+    checkpoint = job.checkpoint
+    totals = {"affected": checkpoint.get("affected", 0), "failed": checkpoint.get("failed", 0)}
+
+    async def progress(processed, total, affected, failed):
+        job.save_checkpoint({
+            "processed": processed,
+            "affected": totals["affected"] + affected,
+            "failed": totals["failed"] + failed,
+        })
+        await job.progress(processed, total)
+
+    affected, failed = await run_bulk_action(
+        params["action"], params["uuids"], params.get("fields"),
+        progress=progress, start=checkpoint.get("processed", 0)
+    )
+    invalidate_user_index()
+
+    message = f"{BULK_ACTIONS[params['action']][0]}: обработано {totals['affected'] + affected} пользователей."
+    if totals["failed"] + failed:
+        message += f"\n❌ Не удалось обработать {totals['failed'] + failed} пользователей."
+    return {"text": message}
+
+@job_manager.register("bulk_extend", "📅 Продление подписок")
+async def run_bulk_extend_job(job):
+    """Apply a precomputed expiry plan; the checkpoint holds the number of processed users"""
+    params = job.params
+    checkpoint = job.checkpoint
+    totals = {"ok": checkpoint.get("ok", 0), "failed": checkpoint.get("failed", 0)}
+
+    async def progress(processed, total, ok, failed):
+        job.save_checkpoint({"processed": processed, "ok": totals["ok"] + ok, "failed": totals["failed"] + failed})
+        await job.progress(processed, total)
+
+    ok, failed = await run_expiry_extension(
+        params["groups"], params["singles"], progress=progress, start=checkpoint.get("processed", 0)
+    )
+    invalidate_user_index()
+
+    message = f"Продлено на {params['days']} дн.: {totals['ok'] + ok} пользователей"
+    message += f"\n📦 Групповых обновлений: {len(params['groups'])}, индивидуальных: {len(params['singles'])}"
+    if totals["failed"] + failed:
+        message += f"\n❌ Не удалось продлить: {totals['failed'] + failed}"
+    return {"text": message}
+
+async def _load_squads(context):
+    """Fetch squads (cached) and remember [uuid, name] pairs so buttons can refer to them by index"""
+    squads = await get_squads()
+    if squads is None:
+        return None
+    context.user_data["bulk_squads"] = [[squad["uuid"], squad.get("name", "")] for squad in squads]
+    return squads
+
+async def _show_squad_picker(query, context, prompt, prefix):
+    squads = await _load_squads(context)
+    if not squads:
         await query.edit_message_text(
-            message,
-            reply_markup=reply_markup,
-            parse_mode="Markdown"
+            "❌ Внутренние сквады не найдены.",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]])
         )
         return BULK_MENU
+    keyboard = [
+        [InlineKeyboardButton(squad.get("name", squad["uuid"]), callback_data=f"{prefix}{index}")]
+        for index, squad in enumerate(squads)
+    ]
+    keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="back_to_bulk")])
+    await query.edit_message_text(f"👥 {prompt}", reply_markup=InlineKeyboardMarkup(keyboard))
+    return BULK_FILTER
 
-    elif data == "back_to_bulk":
-        await show_bulk_menu(update, context)
+def _plan_squads(records, uuids, fields):
+    """Plan the squad change for the selected users from current index records"""
+    selected = set(uuids)
+    return plan_squad_change(
+        [record for record in records if record["uuid"] in selected],
+        add=[fields["add"]] if fields.get("add") else [],
+        remove=[fields["remove"]] if fields.get("remove") else []
+    )
+
+def _squad_change_title(fields):
+    if fields.get("add") and fields.get("remove"):
+        return f"🔀 Переместить из «{fields['remove_name']}» в «{fields['add_name']}»"
+    if fields.get("add"):
+        return f"➕ Добавить в сквад «{fields['add_name']}»"
+    return f"➖ Убрать из сквада «{fields['remove_name']}»"
+
+async def _handle_squad_pick(query, context, index):
+    """Pick source/target squads for the filtered users and show the planned change"""
+    squads = context.user_data.get("bulk_squads") or []
+    operation = context.user_data.get("bulk_squad_op")
+    if index >= len(squads) or not operation or not context.user_data.get("bulk_filter_uuids"):
         return BULK_MENU
+    uuid, name = squads[index]
+
+    if operation == "move" and "bulk_squad_source" not in context.user_data:
+        context.user_data["bulk_squad_source"] = [uuid, name]
+        return await _show_squad_picker(query, context, f"Переместить из «{name}» в:", "bulksq_pick_")
+
+    if operation == "add":
+        fields = {"add": uuid, "add_name": name}
+    elif operation == "remove":
+        fields = {"remove": uuid, "remove_name": name}
+    else:
+        source_uuid, source_name = context.user_data["bulk_squad_source"]
+        if source_uuid == uuid:
+            return await _show_squad_picker(query, context, "Выберите другой сквад назначения:", "bulksq_pick_")
+        fields = {"add": uuid, "add_name": name, "remove": source_uuid, "remove_name": source_name}
 
+    # План здесь только для подтверждения; задача строит его заново по свежему индексу
+    index_records = await get_user_index()
+    if index_records is None:
+        await query.edit_message_text("❌ Не удалось загрузить список пользователей.")
+        return BULK_MENU
+
+    context.user_data["bulk_filter_action"] = "squads"
+    context.user_data["bulk_filter_fields"] = fields
+    context.user_data["bulk_filter_plan"] = _plan_squads(index_records, context.user_data["bulk_filter_uuids"], fields)
+    await query.edit_message_text(
+        _bulk_filter_confirmation_text(context),
+        reply_markup=_bulk_filter_confirmation_keyboard(),
+        parse_mode="Markdown"
+    )
+    return BULK_CONFIRM
+
+async def show_squads_list(query, context):
+    """List internal squads with member and inbound counts"""
+    squads = await _load_squads(context)
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]]
+    if not squads:
+        await query.edit_message_text("❌ Внутренние сквады не найдены.", reply_markup=InlineKeyboardMarkup(keyboard))
+        return BULK_MENU
+
+    message = f"👥 *Внутренние сквады* ({len(squads)})\n\n"
+    for squad in squads:
+        info = squad.get("info") or {}
+        message += f"• *{escape_markdown(squad.get('name', ''))}* — "
+        message += f"👤 {info.get('membersCount', 0)}, 📡 {info.get('inboundsCount', 0)} входящих\n"
+    message += "\nЧтобы изменить состав для части пользователей, используйте «🎯 Действия по фильтру»."
+
+    buttons = [
+        InlineKeyboardButton(squad.get("name", squad["uuid"]), callback_data=f"bulksq_view_{index}")
+        for index, squad in enumerate(squads)
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)] + keyboard
+    await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
     return BULK_MENU
 
+async def show_squad_details(query, context, index):
+    """Show a squad's inbounds and accessible nodes"""
+    squads = context.user_data.get("bulk_squads") or []
+    if index >= len(squads):
+        return BULK_MENU
+    uuid, name = squads[index]
+    squad = next((item for item in await get_squads() or [] if item["uuid"] == uuid), {})
+    nodes = await get_accessible_nodes(uuid)
+
+    message = f"👥 *{escape_markdown(name)}*\n\n"
+    message += f"👤 Участников: {(squad.get('info') or {}).get('membersCount', 0)}\n"
+    inbounds = squad.get("inbounds") or []
+    if inbounds:
+        message += "📡 Входящие: " + escape_markdown(", ".join(inbound.get("tag", "") for inbound in inbounds)) + "\n"
+    if nodes is None:
+        message += "\n❌ Не удалось получить доступные серверы\n"
+    else:
+        message += f"\n🖥️ *Доступные серверы* ({len(nodes)}):\n"
+        for node in nodes[:30]:
+            message += f"• {escape_markdown(node.get('nodeName', ''))} ({node.get('countryCode', '')})"
+            message += f" — {escape_markdown(node.get('configProfileName', ''))}\n"
+        if len(nodes) > 30:
+            message += f"... и еще {len(nodes) - 30}\n"
+
+    keyboard = [
+        [
+            InlineKeyboardButton("➕ Добавить всех", callback_data=f"bulksq_all_add_{index}"),
+            InlineKeyboardButton("➖ Убрать всех", callback_data=f"bulksq_all_remove_{index}")
+        ],
+        [InlineKeyboardButton("🔙 Назад", callback_data="bulk_squads")]
+    ]
+    await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard), parse_mode="Markdown")
+    return BULK_MENU
+
+@job_manager.register("bulk_squads", "👥 Изменение сквадов")
+async def run_bulk_squads_job(job):
+    """
+    Change squad membership: panel-wide for all users, or planned groups for filtered users.
+    The plan is built from a fresh index when the job starts and kept in the checkpoint.
+    """
+    params = job.params
+    if params["mode"] == "panel":
+        call = SquadAPI.add_all_users if params["operation"] == "add" else SquadAPI.remove_all_users
+        result = await call(params["squad"])
+        if not result:
+            raise RuntimeError("панель не приняла операцию со сквадом")
+        invalidate_squads()
+        invalidate_user_index()
+        action = "добавление всех пользователей в" if params["operation"] == "add" else "удаление всех пользователей из"
+        return {"text": f"Панель приняла {action} сквад «{params['name']}», изменения применяются в фоне."}
+
+    checkpoint = job.checkpoint
+    groups = checkpoint.get("groups")
+    if groups is None:
+        # Наборы сквадов отправляются целиком, поэтому считаем их по текущему составу, а не по снимку из меню
+        records = await get_user_index(force=True)
+        if records is None:
+            raise RuntimeError("не удалось загрузить список пользователей")
+        groups = _plan_squads(records, params["uuids"], params["fields"])
+        job.save_checkpoint({"groups": groups, "completed": [], "ok": 0, "failed": 0})
+        job.manager.persist(job.record)
+    totals = {"ok": checkpoint.get("ok", 0), "failed": checkpoint.get("failed", 0)}
+
+    async def progress(completed, processed, total, ok, failed):
+        job.save_checkpoint({
+            "groups": groups,
+            "completed": completed,
+            "ok": totals["ok"] + ok,
+            "failed": totals["failed"] + failed,
+        })
+        await job.progress(processed, total)
+
+    ok, failed = await run_squad_change(groups, progress=progress, completed=checkpoint.get("completed", []))
+    invalidate_squads()
+    invalidate_user_index()
 
+    message = f"{_squad_change_title(params['fields'])}: обновлено {totals['ok'] + ok} пользователей."
+    if totals["failed"] + failed:
+        message += f"\n❌ Не удалось обновить {totals['failed'] + failed} пользователей."
+    return {"text": message}
@@ -17,9 +17,10 @@ from modules.config import (
     CREATE_USER, CREATE_USER_FIELD, BULK_CONFIRM, 
     EDIT_NODE, EDIT_NODE_FIELD, EDIT_HOST, EDIT_HOST_FIELD, NODE_PORT,
     CREATE_NODE, NODE_NAME, NODE_ADDRESS, SELECT_INBOUNDS, CREATE_HOST, HOST_PROFILE, HOST_INBOUND, HOST_PARAMS,
-    ADMIN_USER_IDS
+    BULK_IMPORT, BULK_GENERATE, BULK_FILTER, HOST_BULK_PORT, ADMIN_USER_IDS
 )
 from modules.utils.auth import check_authorization
+from modules.utils.deadline import with_deadline
 
 from modules.handlers.core.start import start
 from modules.handlers.core.menu import handle_menu_selection
@@ -36,10 +37,14 @@ from modules.handlers.nodes import (
 from modules.handlers.stats import handle_stats_menu
 from modules.handlers.hosts import (
     handle_hosts_menu, handle_host_edit_menu, handle_host_field_input, handle_cancel_host_edit,
-    handle_host_creation_text
+    handle_host_creation_text, handle_host_bulk_port_input
 )
 from modules.handlers.inbounds import handle_inbounds_menu
-from modules.handlers.bulk import handle_bulk_menu, handle_bulk_confirm
+from modules.handlers.bulk import (
+    handle_bulk_menu, handle_bulk_confirm, handle_import_document, handle_generate_input,
+    handle_bulk_filter_input
+)
+from modules.handlers.export import export_command
 
 logger = logging.getLogger(__name__)
 
@@ -63,9 +68,12 @@ async def unauthorized_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     return await start(update, context)
 
 def create_conversation_handler():
-    """Create the main conversation handler"""
-    return ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+    """Create the main conversation handler; every callback runs under HANDLER_DEADLINE"""
+    handler = ConversationHandler(
+        entry_points=[
+            CommandHandler("start", start),
+            CommandHandler("export", export_command)
+        ],
         states={
             MAIN_MENU: [
                 CallbackQueryHandler(handle_menu_selection)
@@ -90,6 +98,10 @@ def create_conversation_handler():
             HOST_INBOUND: [
                 CallbackQueryHandler(handle_hosts_menu)
             ],
+            HOST_BULK_PORT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_host_bulk_port_input),
+                CallbackQueryHandler(handle_hosts_menu)
+            ],
             HOST_PARAMS: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, handle_host_creation_text),
                 CallbackQueryHandler(handle_hosts_menu)
@@ -131,6 +143,18 @@ def create_conversation_handler():
             BULK_CONFIRM: [
                 CallbackQueryHandler(handle_bulk_confirm)
             ],
+            BULK_IMPORT: [
+                MessageHandler(filters.Document.ALL, handle_import_document),
+                CallbackQueryHandler(handle_bulk_menu)
+            ],
+            BULK_GENERATE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_generate_input),
+                CallbackQueryHandler(handle_bulk_menu)
+            ],
+            BULK_FILTER: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_bulk_filter_input),
+                CallbackQueryHandler(handle_bulk_menu)
+            ],
             EDIT_NODE: [
                 CallbackQueryHandler(handle_node_edit_menu),
                 CallbackQueryHandler(handle_cancel_node_edit, pattern="^cancel_edit_node_")
@@ -171,6 +195,7 @@ def create_conversation_handler():
         },
         fallbacks=[
             CommandHandler("start", unauthorized_handler),
+            CommandHandler("export", export_command),
             MessageHandler(filters.TEXT, unauthorized_handler),
             CallbackQueryHandler(unauthorized_handler)
         ],
@@ -180,5 +205,12 @@ def create_conversation_handler():
         per_user=True,
         per_message=False
     )
+    
+    # Запросы к панели из любого нажатия укладываются в дедлайн, а не в 60-секундный таймаут клиента
+    # (кроме чтения всей базы, см. without_deadline)
+    steps = handler.entry_points + [step for state in handler.states.values() for step in state] + handler.fallbacks
+    for step in steps:
+        step.callback = with_deadline(step.callback)
+    return handler
 
 
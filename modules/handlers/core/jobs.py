@@ -0,0 +1,29 @@
+from telegram import Update
+from telegram.ext import ContextTypes, ApplicationHandlerStop
+import logging
+
+from modules.utils.auth import check_authorization
+from modules.utils.jobs import job_manager
+
+logger = logging.getLogger(__name__)
+
+async def handle_job_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle cancel/resume buttons on job progress messages, outside of the conversation"""
+    query = update.callback_query
+
+    if not check_authorization(update.effective_user):
+        await query.answer("⛔ Вы не авторизованы для использования этого бота.", show_alert=True)
+        raise ApplicationHandlerStop
+
+    _, action, job_id = query.data.split("_", 2)
+    if action == "cancel":
+        ok = await job_manager.cancel(job_id)
+        await query.answer("⏹️ Задача будет остановлена" if ok else "Задача уже завершена")
+    elif action == "resume":
+        ok = await job_manager.resume(job_id)
+        await query.answer("▶️ Задача снова в очереди" if ok else "Задачу нельзя продолжить")
+    else:
+        await query.answer()
+
+    # Кнопки задач не должны менять состояние основного диалога
+    raise ApplicationHandlerStop
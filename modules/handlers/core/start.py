@@ -3,17 +3,23 @@ from telegram.ext import ContextTypes, ConversationHandler
 from modules.config import (
     MAIN_MENU, DASHBOARD_SHOW_SYSTEM_STATS, DASHBOARD_SHOW_SERVER_INFO,
     DASHBOARD_SHOW_USERS_COUNT, DASHBOARD_SHOW_NODES_COUNT, 
-    DASHBOARD_SHOW_TRAFFIC_STATS, DASHBOARD_SHOW_UPTIME
+    DASHBOARD_SHOW_TRAFFIC_STATS, DASHBOARD_SHOW_UPTIME,
+    DASHBOARD_CACHE_TTL, CACHE_MAX_STALE
 )
 from modules.utils.auth import check_admin
+from modules.api.client import APIStreamError, RemnaAPI
 from modules.api.users import UserAPI
 from modules.api.nodes import NodeAPI
 from modules.api.inbounds import InboundAPI
-from modules.utils.formatters import format_bytes
+from modules.utils.cache import TTLCache
+from modules.utils.formatters import format_bytes, format_age
+from modules.utils.resilience import degraded_notice
 import logging
 
 logger = logging.getLogger(__name__)
 
+_panel_stats_cache = TTLCache(DASHBOARD_CACHE_TTL, max_stale=CACHE_MAX_STALE, stale_on_error=True)
+
 @check_admin
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start command handler"""
@@ -37,6 +43,10 @@ async def show_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     stats_text = await get_system_stats()
     
     message = "🎛️ *Главное меню Remnawave Admin*\n\n"
+    # Предупреждение берём после сбора статистики: её запросы могли открыть автомат
+    notice = degraded_notice()
+    if notice:
+        message += notice + "\n"
     message += stats_text + "\n"
     message += "Выберите раздел для управления:"
 
@@ -180,135 +190,17 @@ async def get_system_stats():
             except Exception as e:
                 logger.error(f"Error getting system stats: {e}")
         
-        # Статистика пользователей (если включена)
-        if DASHBOARD_SHOW_USERS_COUNT:
-            try:
-                users_response = await UserAPI.get_all_users()
-                users_count = 0
-                user_stats = {'ACTIVE': 0, 'DISABLED': 0, 'LIMITED': 0, 'EXPIRED': 0}
-                total_traffic = 0
-                
-                if users_response:
-                    users = []
-                    if isinstance(users_response, dict):
-                        if 'users' in users_response:
-                            users = users_response['users']
-                        elif 'response' in users_response and 'users' in users_response['response']:
-                            users = users_response['response']['users']
-                    elif isinstance(users_response, list):
-                        users = users_response
-                    
-                    users_count = len(users)
-                    
-                    for user in users:
-                        status = user.get('status', 'UNKNOWN')
-                        if status in user_stats:
-                            user_stats[status] += 1
-                        
-                        if DASHBOARD_SHOW_TRAFFIC_STATS:
-                            traffic_bytes = user.get('usedTrafficBytes', 0)
-                            if isinstance(traffic_bytes, (int, float)):
-                                total_traffic += traffic_bytes
-                            elif isinstance(traffic_bytes, str) and traffic_bytes.isdigit():
-                                total_traffic += int(traffic_bytes)
-                
-                user_section = f"👥 *Пользователи* ({users_count} всего):\n"
-                for status, count in user_stats.items():
-                    if count > 0:
-                        emoji = {"ACTIVE": "✅", "DISABLED": "❌", "LIMITED": "⚠️", "EXPIRED": "⏰"}.get(status, "❓")
-                        user_section += f"  • {emoji} {status}: {count}\n"
-                
-                if DASHBOARD_SHOW_TRAFFIC_STATS and total_traffic > 0:
-                    user_section += f"  • Общий трафик: {format_bytes(total_traffic)}\n"
-                
-                stats_sections.append(user_section)
-                
-            except Exception as e:
-                logger.error(f"Error getting user stats: {e}")
-        
-        # Статистика узлов (если включена)
-        if DASHBOARD_SHOW_NODES_COUNT:
-            try:
-                nodes_response = await NodeAPI.get_all_nodes()
-                nodes_count = 0
-                online_nodes = 0
-                
-                if nodes_response:
-                    nodes = []
-                    if isinstance(nodes_response, dict):
-                        if 'nodes' in nodes_response:
-                            nodes = nodes_response['nodes']
-                        elif 'response' in nodes_response and 'nodes' in nodes_response['response']:
-                            nodes = nodes_response['response']['nodes']
-                    elif isinstance(nodes_response, list):
-                        nodes = nodes_response
-                    
-                    nodes_count = len(nodes)
-                    online_nodes = sum(1 for node in nodes if node.get('isConnected'))
-                
-                node_section = f"🖥️ *Серверы*: {online_nodes}/{nodes_count} онлайн\n"
-                stats_sections.append(node_section)
-                
-            except Exception as e:
-                logger.error(f"Error getting node stats: {e}")
-        
-        # Статистика трафика в реальном времени (если включена)
-        if DASHBOARD_SHOW_TRAFFIC_STATS:
-            try:
-                realtime_usage = await NodeAPI.get_nodes_realtime_usage()
-                if realtime_usage and len(realtime_usage) > 0:
-                    total_download_speed = 0
-                    total_upload_speed = 0
-                    total_download_bytes = 0
-                    total_upload_bytes = 0
-                    
-                    for node_data in realtime_usage:
-                        total_download_speed += node_data.get('downloadSpeedBps', 0)
-                        total_upload_speed += node_data.get('uploadSpeedBps', 0)
-                        total_download_bytes += node_data.get('downloadBytes', 0)
-                        total_upload_bytes += node_data.get('uploadBytes', 0)
-                    
-                    total_speed = total_download_speed + total_upload_speed
-                    total_bytes = total_download_bytes + total_upload_bytes
-                    
-                    if total_speed > 0 or total_bytes > 0:
-                        traffic_section = f"📊 *Текущая активность серверов*:\n"
-                        if total_speed > 0:
-                            traffic_section += f"  • Общая скорость: {format_bytes(total_speed)}/с\n"
-                            traffic_section += f"  • Скачивание: {format_bytes(total_download_speed)}/с\n"
-                            traffic_section += f"  • Загрузка: {format_bytes(total_upload_speed)}/с\n"
-                        if total_bytes > 0:
-                            traffic_section += f"  • Всего скачано: {format_bytes(total_download_bytes)}\n"
-                            traffic_section += f"  • Всего загружено: {format_bytes(total_upload_bytes)}\n"
-                        
-                        stats_sections.append(traffic_section)
-                        
-            except Exception as e:
-                logger.warning(f"Could not get realtime server stats: {e}")
-        
-        # Информация о серверах (если включена)
-        if DASHBOARD_SHOW_SERVER_INFO:
-            try:
-                inbounds_response = await InboundAPI.get_inbounds()
-                inbounds_count = 0
-                
-                if inbounds_response:
-                    inbounds = []
-                    if isinstance(inbounds_response, dict):
-                        if 'inbounds' in inbounds_response:
-                            inbounds = inbounds_response['inbounds']
-                        elif 'response' in inbounds_response and 'inbounds' in inbounds_response['response']:
-                            inbounds = inbounds_response['response']['inbounds']
-                    elif isinstance(inbounds_response, list):
-                        inbounds = inbounds_response
-                    
-                    inbounds_count = len(inbounds)
-                
-                server_section = f"🔌 *Inbound'ы*: {inbounds_count} шт.\n"
-                stats_sections.append(server_section)
-                
-            except Exception as e:
-                logger.error(f"Error getting inbound stats: {e}")
+        # Данные панели берём из кэша: устаревшие показываются сразу и обновляются в фоне
+        panel_sections = await _panel_stats_cache.get_or_fetch("dashboard", _fetch_panel_stats)
+        if panel_sections is None and _panel_stats_cache.refreshing("dashboard"):
+            # Первая загрузка большой базы идёт дольше нажатия и продолжается в фоне
+            stats_sections.append("⏳ Данные панели загружаются, откройте меню ещё раз через несколько секунд\n")
+        elif panel_sections is None:
+            stats_sections.append("⚠️ Данные панели временно недоступны\n")
+        elif panel_sections:
+            stats_sections.extend(panel_sections)
+            age = _panel_stats_cache.age("dashboard")
+            stats_sections.append(f"🕒 _{format_age(age)}_\n")
         
         # Собираем все секции в одну строку
         if stats_sections:
@@ -323,26 +215,172 @@ async def get_system_stats():
         return "📈 *Статистика временно недоступна*\n"
 
 
+def invalidate_panel_stats(*_):
+    """Drop cached main menu statistics, so the next render loads them again"""
+    _panel_stats_cache.invalidate("dashboard")
+
+
+def expire_panel_stats(*_):
+    """Mark main menu statistics outdated after users, nodes or inbounds changed; they are shown until refreshed"""
+    _panel_stats_cache.expire("dashboard")
+
+
+RemnaAPI.on_mutation(("users", "nodes", "inbounds"), expire_panel_stats)
+
+
+async def _fetch_panel_stats():
+    """
+    Build the main menu sections that come from the panel. Returns None when users,
+    nodes or inbounds could not be loaded, so the cache keeps the previous complete
+    snapshot instead of storing a partial one.
+    """
+    stats_sections = []
+    failed = False
+
+    # Статистика пользователей (если включена)
+    if DASHBOARD_SHOW_USERS_COUNT:
+        try:
+            users_count = 0
+            user_stats = {'ACTIVE': 0, 'DISABLED': 0, 'LIMITED': 0, 'EXPIRED': 0}
+            total_traffic = 0
+            
+            # Считаем по потоку пользователей, не собирая их в список
+            async for user in UserAPI.iter_users(fields=('status', 'usedTrafficBytes', 'userTraffic')):
+                users_count += 1
+                status = user.get('status', 'UNKNOWN')
+                if status in user_stats:
+                    user_stats[status] += 1
+                
+                if DASHBOARD_SHOW_TRAFFIC_STATS:
+                    traffic_bytes = user.get('usedTrafficBytes')
+                    if traffic_bytes is None:
+                        traffic_bytes = (user.get('userTraffic') or {}).get('usedTrafficBytes', 0)
+                    if isinstance(traffic_bytes, (int, float)):
+                        total_traffic += traffic_bytes
+                    elif isinstance(traffic_bytes, str) and traffic_bytes.isdigit():
+                        total_traffic += int(traffic_bytes)
+            
+            user_section = f"👥 *Пользователи* ({users_count} всего):\n"
+            for status, count in user_stats.items():
+                if count > 0:
+                    emoji = {"ACTIVE": "✅", "DISABLED": "❌", "LIMITED": "⚠️", "EXPIRED": "⏰"}.get(status, "❓")
+                    user_section += f"  • {emoji} {status}: {count}\n"
+            
+            if DASHBOARD_SHOW_TRAFFIC_STATS and total_traffic > 0:
+                user_section += f"  • Общий трафик: {format_bytes(total_traffic)}\n"
+            
+            stats_sections.append(user_section)
+            
+        except Exception as e:
+            logger.error(f"Error getting user stats: {e}")
+            failed = True
+    
+    # Статистика узлов (если включена)
+    if DASHBOARD_SHOW_NODES_COUNT:
+        try:
+            nodes_response = await NodeAPI.get_all_nodes()
+            if nodes_response is None:
+                raise RuntimeError("nodes request failed")
+            nodes_count = 0
+            online_nodes = 0
+            
+            if nodes_response:
+                nodes = []
+                if isinstance(nodes_response, dict):
+                    if 'nodes' in nodes_response:
+                        nodes = nodes_response['nodes']
+                    elif 'response' in nodes_response and 'nodes' in nodes_response['response']:
+                        nodes = nodes_response['response']['nodes']
+                elif isinstance(nodes_response, list):
+                    nodes = nodes_response
+                
+                nodes_count = len(nodes)
+                online_nodes = sum(1 for node in nodes if node.get('isConnected'))
+            
+            node_section = f"🖥️ *Серверы*: {online_nodes}/{nodes_count} онлайн\n"
+            stats_sections.append(node_section)
+            
+        except Exception as e:
+            logger.error(f"Error getting node stats: {e}")
+            failed = True
+    
+    # Статистика трафика в реальном времени (если включена)
+    if DASHBOARD_SHOW_TRAFFIC_STATS:
+        try:
+            realtime_usage = await NodeAPI.get_nodes_realtime_usage()
+            if realtime_usage and len(realtime_usage) > 0:
+                total_download_speed = 0
+                total_upload_speed = 0
+                total_download_bytes = 0
+                total_upload_bytes = 0
+                
+                for node_data in realtime_usage:
+                    total_download_speed += node_data.get('downloadSpeedBps', 0)
+                    total_upload_speed += node_data.get('uploadSpeedBps', 0)
+                    total_download_bytes += node_data.get('downloadBytes', 0)
+                    total_upload_bytes += node_data.get('uploadBytes', 0)
+                
+                total_speed = total_download_speed + total_upload_speed
+                total_bytes = total_download_bytes + total_upload_bytes
+                
+                if total_speed > 0 or total_bytes > 0:
+                    traffic_section = f"📊 *Текущая активность серверов*:\n"
+                    if total_speed > 0:
+                        traffic_section += f"  • Общая скорость: {format_bytes(total_speed)}/с\n"
+                        traffic_section += f"  • Скачивание: {format_bytes(total_download_speed)}/с\n"
+                        traffic_section += f"  • Загрузка: {format_bytes(total_upload_speed)}/с\n"
+                    if total_bytes > 0:
+                        traffic_section += f"  • Всего скачано: {format_bytes(total_download_bytes)}\n"
+                        traffic_section += f"  • Всего загружено: {format_bytes(total_upload_bytes)}\n"
+                    
+                    stats_sections.append(traffic_section)
+                    
+        except Exception as e:
+            logger.warning(f"Could not get realtime server stats: {e}")
+    
+    # Информация о серверах (если включена)
+    if DASHBOARD_SHOW_SERVER_INFO:
+        try:
+            inbounds_response = await InboundAPI.get_inbounds()
+            if inbounds_response is None:
+                raise RuntimeError("inbounds request failed")
+            inbounds_count = 0
+            
+            if inbounds_response:
+                inbounds = []
+                if isinstance(inbounds_response, dict):
+                    if 'inbounds' in inbounds_response:
+                        inbounds = inbounds_response['inbounds']
+                    elif 'response' in inbounds_response and 'inbounds' in inbounds_response['response']:
+                        inbounds = inbounds_response['response']['inbounds']
+                elif isinstance(inbounds_response, list):
+                    inbounds = inbounds_response
+                
+                inbounds_count = len(inbounds)
+            
+            server_section = f"🔌 *Inbound'ы*: {inbounds_count} шт.\n"
+            stats_sections.append(server_section)
+            
+        except Exception as e:
+            logger.error(f"Error getting inbound stats: {e}")
+            failed = True
+
+    return None if failed else stats_sections
+
+
 async def get_basic_system_stats():
     """Get basic system statistics (fallback version)"""
     try:
         # Получаем статистику пользователей
-        users_response = await UserAPI.get_all_users()
         users_count = 0
         active_users = 0
-        if users_response:
-            # Проверяем разные возможные структуры ответа
-            users = []
-            if isinstance(users_response, dict):
-                if 'users' in users_response:
-                    users = users_response['users']
-                elif 'response' in users_response and 'users' in users_response['response']:
-                    users = users_response['response']['users']
-            elif isinstance(users_response, list):
-                users = users_response
-            
-            users_count = len(users)
-            active_users = sum(1 for user in users if user.get('status') == 'ACTIVE')
+        try:
+            async for user in UserAPI.iter_users(fields=('status',)):
+                users_count += 1
+                if user.get('status') == 'ACTIVE':
+                    active_users += 1
+        except APIStreamError as e:
+            logger.error(f"Error streaming users for basic stats: {e}")
 
         # Получаем статистику узлов
         nodes_response = await NodeAPI.get_all_nodes()
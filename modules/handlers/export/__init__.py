@@ -0,0 +1 @@
+from .handlers import *  # noqa: F401,F403
@@ -0,0 +1,99 @@
+import logging
+import os
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes
+
+from modules.config import BULK_MENU
+from modules.utils.auth import check_admin
+from modules.utils.export import (
+    EXPORT_COLUMNS, ExportError, parse_export_args, export_to_file, export_filename
+)
+from modules.utils.jobs import job_manager
+
+logger = logging.getLogger(__name__)
+
+# Лимит Telegram Bot API на отправку файлов
+MAX_DOCUMENT_SIZE = 50 * 1024 * 1024
+
+EXPORT_USAGE = (
+    "📤 *Экспорт данных*\n\n"
+    "Файл будет отправлен как gzip-архив CSV или JSONL.\n\n"
+    "Команда с параметрами:\n"
+    "`/export users csv status=ACTIVE,LIMITED columns=username,status,expireAt`\n\n"
+    "• Тип: `users`, `nodes`, `hosts`\n"
+    "• Формат: `csv` (по умолчанию) или `jsonl`\n"
+    "• `columns=` — список колонок через запятую\n"
+    "• `поле=значение` — фильтр, несколько значений через запятую"
+)
+
+
+async def show_export_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show export options"""
+    keyboard = [
+        [
+            InlineKeyboardButton("👥 Пользователи CSV", callback_data="export_users_csv"),
+            InlineKeyboardButton("👥 Пользователи JSONL", callback_data="export_users_jsonl")
+        ],
+        [
+            InlineKeyboardButton("🖥️ Серверы CSV", callback_data="export_nodes_csv"),
+            InlineKeyboardButton("🌐 Хосты CSV", callback_data="export_hosts_csv")
+        ],
+        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_bulk")]
+    ]
+    await update.callback_query.edit_message_text(
+        text=EXPORT_USAGE,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="Markdown"
+    )
+    return BULK_MENU
+
+
+async def handle_export_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue an export with default columns from an `export_<entity>_<format>` button"""
+    query = update.callback_query
+    _, entity, fmt = query.data.split("_", 2)
+    await submit_export(query.message.chat_id, entity, fmt, EXPORT_COLUMNS[entity], {})
+    return BULK_MENU
+
+
+@check_admin
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /export <entity> [format] [columns=...] [field=value]"""
+    try:
+        entity, fmt, columns, filters = parse_export_args(context.args)
+    except ExportError as e:
+        await update.message.reply_text(f"❌ {e}\n\n{EXPORT_USAGE}", parse_mode="Markdown")
+        return None
+
+    await submit_export(update.effective_chat.id, entity, fmt, columns, filters)
+    return None
+
+
+async def submit_export(chat_id, entity, fmt, columns, filters):
+    params = {
+        "entity": entity,
+        "format": fmt,
+        "columns": columns,
+        # Множества не сериализуются в JSON — храним списки
+        "filters": {key: sorted(values) for key, values in filters.items()},
+    }
+    await job_manager.submit("export", params, chat_id)
+
+
+@job_manager.register("export", "📤 Экспорт")
+async def run_export_job(job):
+    """Stream the export into a temp file; restarts from scratch when resumed"""
+    params = job.params
+    filters = {key: set(values) for key, values in params["filters"].items()}
+    path, rows = await export_to_file(params["entity"], params["format"], params["columns"], filters, progress=job.progress)
+
+    if os.path.getsize(path) > MAX_DOCUMENT_SIZE:
+        os.unlink(path)
+        raise ExportError("файл превышает лимит Telegram в 50 МБ, уточните фильтры или колонки")
+
+    return {
+        "text": f"{params['entity']}: {rows} записей",
+        "document": path,
+        "filename": export_filename(params["entity"], params["format"]),
+    }
@@ -2,18 +2,27 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 import logging
 
-from modules.config import MAIN_MENU, HOST_MENU, EDIT_HOST, EDIT_HOST_FIELD, HOST_PROFILE, HOST_INBOUND, HOST_PARAMS
-from modules.api.config_profiles import ConfigProfileAPI
+from modules.config import (
+    MAIN_MENU, HOST_MENU, EDIT_HOST, EDIT_HOST_FIELD, HOST_PROFILE, HOST_INBOUND, HOST_PARAMS, HOST_BULK_PORT
+)
 from modules.api.hosts import HostAPI
-from modules.utils.formatters import format_host_details
+from modules.utils.formatters import escape_markdown, format_host_details
+from modules.utils.paging import PageRenderer
+from modules.utils.host_probe import (
+    cached_probe, probe_hosts, latency_summary, format_probe, format_latency_summary
+)
+from modules.utils.multiselect import BitSelection
+from modules.utils.topology import get_topology
 from modules.handlers.core.start import show_main_menu
 
 logger = logging.getLogger(__name__)
 
 async def show_hosts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show hosts menu"""
+    context.user_data.pop("hosts_list", None)
     keyboard = [
         [InlineKeyboardButton("📋 Список всех хостов", callback_data="list_hosts")],
+        [InlineKeyboardButton("☑️ Выбрать несколько хостов", callback_data="hsel_start")],
         [InlineKeyboardButton("➕ Создать хост", callback_data="create_host")],
         [InlineKeyboardButton("🔙 Назад в главное меню", callback_data="back_to_main")]
     ]
@@ -38,6 +47,34 @@ async def handle_hosts_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if data == "list_hosts":
         await list_hosts(update, context)
 
+    elif data.startswith("hl_p_"):
+        if "hosts" not in context.user_data.get("hosts_list", {}):
+            return await list_hosts(update, context)
+        return await list_hosts(update, context, page=int(data[len("hl_p_"):]))
+
+    elif data == "hl_tags":
+        return await show_host_tags(update, context)
+
+    elif data == "hl_probe":
+        state = context.user_data.get("hosts_list") or {}
+        if "hosts" not in state:
+            return await list_hosts(update, context)
+        await query.edit_message_text("📶 Проверка доступности хостов...")
+        results = await probe_hosts(state["hosts"], force=True)
+        state["probe_summary"] = latency_summary(results.values())
+        return await list_hosts(update, context, page=state.get("page", 0))
+
+    elif data.startswith("hl_tag_"):
+        tags = context.user_data.get("hosts_tags") or []
+        value = data[len("hl_tag_"):]
+        state = context.user_data.setdefault("hosts_list", {"page": 0, "tag": None})
+        state["tag"] = tags[int(value)] if value.isdigit() and int(value) < len(tags) else None
+        state["page"] = 0
+        return await list_hosts(update, context, page=0 if "hosts" in state else None)
+
+    elif data.startswith("hsel_"):
+        return await handle_host_selection(update, context)
+
     elif data == "create_host":
         return await start_create_host(update, context)
     
@@ -123,7 +160,8 @@ async def start_create_host(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Start host creation wizard: choose config profile"""
     query = update.callback_query
     await query.answer()
-    profiles = await ConfigProfileAPI.get_profiles()
+    topology = await get_topology()
+    profiles = topology.profiles if topology else None
     if not profiles:
         await query.edit_message_text("❌ Не удалось получить список профилей.")
         return HOST_MENU
@@ -148,7 +186,8 @@ async def choose_host_inbound(update: Update, context: ContextTypes.DEFAULT_TYPE
     profile_uuid = ch.get("configProfileUuid")
     if not profile_uuid:
         return await start_create_host(update, context)
-    inbounds = await ConfigProfileAPI.get_profile_inbounds(profile_uuid)
+    topology = await get_topology()
+    inbounds = topology.inbounds_of_profile(profile_uuid) if topology else None
     if not inbounds:
         await query.edit_message_text("❌ В профиле нет inbound'ов.")
         return HOST_MENU
@@ -236,40 +275,93 @@ async def handle_host_creation_text(update: Update, context: ContextTypes.DEFAUL
 
     return HOST_MENU
 
-async def list_hosts(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """List all hosts"""
-    await update.callback_query.edit_message_text("🌐 Загрузка списка хостов...")
+def _format_host_block(host):
+    status_emoji = "🟢" if not host["isDisabled"] else "🔴"
+    remark = host.get("remark") or ""
+    if len(remark) > 64:
+        remark = remark[:63] + "…"
+    block = f"{host['_position']}. {status_emoji} *{escape_markdown(remark)}*\n"
+    block += f"   🌐 Адрес: {escape_markdown(host['address'])}:{host['port']}\n"
+    inbound = host.get('inbound') or {}
+    inbound_short = (inbound.get('configProfileInboundUuid') or '—')
+    block += f"   🔌 Inbound: {inbound_short[:8]}...\n"
+    if host.get("tag"):
+        block += f"   🏷️ {escape_markdown(host['tag'])}\n"
+    if host.get("_probe"):
+        block += f"   {escape_markdown(format_probe(host['_probe']))}\n"
+    return block + "\n"
 
-    hosts = await HostAPI.get_all_hosts()
+def _hosts_header(page, pages, total):
+    header = f"🌐 *Хосты* ({total})"
+    if pages > 1:
+        header += f" — стр. {page}/{pages}"
+    return header + ":\n\n"
 
-    if not hosts:
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_hosts")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.callback_query.edit_message_text(
-            "❌ Хосты не найдены или ошибка при получении списка.",
-            reply_markup=reply_markup
-        )
-        return HOST_MENU
+HOSTS_PER_PAGE = 20
 
-    message = f"🌐 *Хосты* ({len(hosts)}):\n\n"
+host_pages = PageRenderer(
+    _format_host_block,
+    _hosts_header,
+    fields=("_position", "uuid", "remark", "address", "port", "isDisabled", "inbound", "tag", "_probe"),
+    max_items=HOSTS_PER_PAGE,
+    # Место под строки фильтра по тегу и сводки проверки доступности
+    reserve=320
+)
 
-    for i, host in enumerate(hosts):
-        status_emoji = "🟢" if not host["isDisabled"] else "🔴"
-        
-        message += f"{i+1}. {status_emoji} *{host['remark']}*\n"
-        message += f"   🌐 Адрес: {host['address']}:{host['port']}\n"
-        inbound = host.get('inbound') or {}
-        inbound_short = (inbound.get('configProfileInboundUuid') or '—')
-        message += f"   🔌 Inbound: {inbound_short[:8]}...\n\n"
+async def list_hosts(update: Update, context: ContextTypes.DEFAULT_TYPE, page=None):
+    """List hosts page by page; a fresh snapshot is loaded unless only the page changes"""
+    state = context.user_data.setdefault("hosts_list", {"page": 0, "tag": None})
+    if page is None:
+        await update.callback_query.edit_message_text("🌐 Загрузка списка хостов...")
+        hosts = await HostAPI.get_all_hosts()
+        if not hosts:
+            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_hosts")]]
+            reply_markup = InlineKeyboardMarkup(keyboard)
+
+            await update.callback_query.edit_message_text(
+                "❌ Хосты не найдены или ошибка при получении списка.",
+                reply_markup=reply_markup
+            )
+            return HOST_MENU
+        hosts = sorted(hosts, key=lambda host: host.get("viewPosition", 0))
+        for position, host in enumerate(hosts, start=1):
+            host["_position"] = position
+        state["hosts"] = hosts
+    else:
+        state["page"] = page
+
+    hosts = state.get("hosts") or []
+    for host in hosts:
+        host["_probe"] = None if host.get("isDisabled") else cached_probe(host)
+    tag = state.get("tag")
+    if tag:
+        hosts = [host for host in hosts if host.get("tag") == tag]
+
+    message, (start, end), state["page"], pages = host_pages.render(hosts, state["page"], variant=tag or "")
+    if state.get("probe_summary"):
+        message = escape_markdown(format_latency_summary(state["probe_summary"])) + "\n\n" + message
+    if tag:
+        message = f"🏷️ Тег: *{escape_markdown(tag[:48])}*\n" + message
+    if not hosts:
+        message += "Нет хостов с этим тегом.\n"
 
     # Add action buttons
-    keyboard = []
-    
-    for i, host in enumerate(hosts):
+    buttons = [
+        InlineKeyboardButton(f"👁️ {host['remark'][:30]}", callback_data=f"view_host_{host['uuid']}")
+        for host in hosts[start:end]
+    ]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+
+    if pages > 1:
         keyboard.append([
-            InlineKeyboardButton(f"👁️ {host['remark']}", callback_data=f"view_host_{host['uuid']}")
+            InlineKeyboardButton("⬅️", callback_data=f"hl_p_{max(state['page'] - 1, 0)}"),
+            InlineKeyboardButton(f"{state['page'] + 1}/{pages}", callback_data=f"hl_p_{state['page']}"),
+            InlineKeyboardButton("➡️", callback_data=f"hl_p_{min(state['page'] + 1, pages - 1)}")
         ])
+    keyboard.append([
+        InlineKeyboardButton("🏷️ Фильтр по тегу", callback_data="hl_tags"),
+        InlineKeyboardButton("📶 Проверить доступность", callback_data="hl_probe")
+    ])
     
     # Add back button
     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_hosts")])
@@ -284,6 +376,18 @@ async def list_hosts(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     return HOST_MENU
 
+async def show_host_tags(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Offer host tags from `hosts/tags` as list filters"""
+    tags = await HostAPI.get_host_tags() or []
+    context.user_data["hosts_tags"] = tags[:40]
+    buttons = [InlineKeyboardButton(f"🏷️ {tag}", callback_data=f"hl_tag_{i}") for i, tag in enumerate(tags[:40])]
+    keyboard = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    keyboard.append([InlineKeyboardButton("📋 Все хосты", callback_data="hl_tag_all")])
+    keyboard.append([InlineKeyboardButton("🔙 К списку хостов", callback_data="hl_p_0")])
+    message = "🏷️ Выберите тег:" if tags else "🏷️ У хостов нет тегов."
+    await update.callback_query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+    return HOST_MENU
+
 async def show_host_details(update: Update, context: ContextTypes.DEFAULT_TYPE, uuid):
     """Show host details"""
     host = await HostAPI.get_host_by_uuid(uuid)
@@ -299,6 +403,9 @@ async def show_host_details(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return HOST_MENU
     
     message = format_host_details(host)
+    if not host.get("isDisabled"):
+        results = await probe_hosts([host])
+        message += f"\n{escape_markdown(format_probe(results.get(host['uuid'])))}\n"
     
     # Create action buttons
     keyboard = []
@@ -706,4 +813,233 @@ async def handle_cancel_host_edit(update: Update, context: ContextTypes.DEFAULT_
         await show_hosts_menu(update, context)
         return HOST_MENU
 
+# Действия над выбранными хостами: одна bulk-операция на всё выделение
+HOST_BULK_ACTIONS = {
+    "enable": ("🟢 Включено", HostAPI.bulk_enable_hosts),
+    "disable": ("🔴 Отключено", HostAPI.bulk_disable_hosts),
+    "delete": ("❌ Удалено", HostAPI.bulk_delete_hosts),
+}
+
+def _host_snapshot_item(host):
+    return {
+        "uuid": host["uuid"],
+        "remark": host.get("remark", ""),
+        "port": host.get("port"),
+        "isDisabled": host.get("isDisabled", False),
+    }
+
+def _refresh_host_selection(selection, hosts):
+    """Update pinned items from the host list a bulk endpoint returned, keeping the selection"""
+    current = {host["uuid"]: host for host in hosts if isinstance(host, dict) and host.get("uuid")}
+    for item in selection.items:
+        if item["uuid"] in current:
+            item.update(_host_snapshot_item(current[item["uuid"]]))
+
+def _host_selection_view(selection, notice=None):
+    """Build the message and keyboard for the multi-select host list"""
+    count = selection.count()
+    message = f"{notice}\n\n" if notice else ""
+    message += "☑️ *Выбор хостов*\n\n"
+    message += f"Выбрано: *{count}* из {len(selection)}\n"
+    message += "Отметьте хосты и выберите действие — оно выполнится одним запросом."
+
+    keyboard = []
+    for index, item in selection.page_items():
+        mark = "☑️" if selection.is_selected(index) else "⬜"
+        status = "🔴" if item["isDisabled"] else "🟢"
+        keyboard.append([
+            InlineKeyboardButton(f"{mark} {status} {item['remark']} :{item['port']}", callback_data=f"hsel_t_{index}")
+        ])
+
+    if selection.pages > 1:
+        keyboard.append([
+            InlineKeyboardButton("⬅️", callback_data=f"hsel_p_{selection.page - 1}"),
+            InlineKeyboardButton(f"{selection.page + 1}/{selection.pages}", callback_data="hsel_noop"),
+            InlineKeyboardButton("➡️", callback_data=f"hsel_p_{selection.page + 1}")
+        ])
+    keyboard.append([
+        InlineKeyboardButton("✅ Все", callback_data="hsel_all"),
+        InlineKeyboardButton("⬜ Снять", callback_data="hsel_none"),
+        InlineKeyboardButton("🔁 Инверсия", callback_data="hsel_inv")
+    ])
+    keyboard.append([
+        InlineKeyboardButton("🟢 Только включенные", callback_data="hsel_enabled"),
+        InlineKeyboardButton("🔴 Только отключенные", callback_data="hsel_disabled")
+    ])
+    if count:
+        keyboard.append([
+            InlineKeyboardButton(f"🟢 Включить ({count})", callback_data="hsel_a_enable"),
+            InlineKeyboardButton(f"🔴 Отключить ({count})", callback_data="hsel_a_disable")
+        ])
+        keyboard.append([
+            InlineKeyboardButton("🔌 Порт", callback_data="hsel_a_port"),
+            InlineKeyboardButton("📡 Inbound", callback_data="hsel_a_inbound"),
+            InlineKeyboardButton("❌ Удалить", callback_data="hsel_a_delete")
+        ])
+    keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back_to_hosts")])
+    return message, InlineKeyboardMarkup(keyboard)
+
+async def _show_host_selection(query, selection, notice=None):
+    message, reply_markup = _host_selection_view(selection, notice)
+    await query.edit_message_text(text=message, reply_markup=reply_markup, parse_mode="Markdown")
+    return HOST_MENU
+
+async def _run_host_bulk_action(selection, action):
+    """Apply one bulk endpoint to the selection and return a notice line"""
+    title, call = HOST_BULK_ACTIONS[action]
+    uuids = [item["uuid"] for item in selection.selected()]
+    result = await call(uuids)
+    if result is None:
+        return "❌ Панель не выполнила операцию."
+    if action == "delete":
+        deleted = set(uuids)
+        selection.items = [item for item in selection.items if item["uuid"] not in deleted]
+        selection.clear()
+        selection.set_page(selection.page)
+    else:
+        _refresh_host_selection(selection, result if isinstance(result, list) else [])
+    return f"{title} хостов: {len(uuids)}"
+
+async def handle_host_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle `hsel_*` callbacks of the multi-select host list"""
+    query = update.callback_query
+    data = query.data
+
+    if data == "hsel_start":
+        hosts = await HostAPI.get_all_hosts()
+        if not hosts:
+            keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_hosts")]]
+            await query.edit_message_text(
+                "❌ Хосты не найдены или ошибка при получении списка.",
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+            return HOST_MENU
+        hosts = sorted(hosts, key=lambda host: host.get("viewPosition", 0))
+        context.user_data["host_selection"] = BitSelection([_host_snapshot_item(host) for host in hosts])
+        return await _show_host_selection(query, context.user_data["host_selection"])
+
+    selection = context.user_data.get("host_selection")
+    if selection is None:
+        await show_hosts_menu(update, context)
+        return HOST_MENU
+
+    if data == "hsel_noop":
+        return HOST_MENU
+    elif data.startswith("hsel_t_"):
+        selection.toggle(int(data[len("hsel_t_"):]))
+    elif data.startswith("hsel_p_"):
+        selection.set_page(int(data[len("hsel_p_"):]))
+    elif data == "hsel_all":
+        selection.select_all()
+    elif data == "hsel_none":
+        selection.clear()
+    elif data == "hsel_inv":
+        selection.invert()
+    elif data == "hsel_enabled":
+        selection.select_where(lambda item: not item["isDisabled"])
+    elif data == "hsel_disabled":
+        selection.select_where(lambda item: item["isDisabled"])
+
+    elif not selection.count():
+        pass
+
+    elif data in ("hsel_a_enable", "hsel_a_disable"):
+        notice = await _run_host_bulk_action(selection, data[len("hsel_a_"):])
+        return await _show_host_selection(query, selection, notice)
+
+    elif data == "hsel_a_delete":
+        keyboard = [[
+            InlineKeyboardButton("✅ Да, удалить", callback_data="hsel_confirm_delete"),
+            InlineKeyboardButton("❌ Отмена", callback_data="hsel_back")
+        ]]
+        await query.edit_message_text(
+            f"⚠️ Удалить выбранные хосты ({selection.count()})?",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return HOST_MENU
+
+    elif data == "hsel_confirm_delete":
+        notice = await _run_host_bulk_action(selection, "delete")
+        return await _show_host_selection(query, selection, notice)
+
+    elif data == "hsel_a_port":
+        keyboard = [[InlineKeyboardButton("❌ Отмена", callback_data="hsel_back")]]
+        await query.edit_message_text(
+            f"🔌 Введите новый порт для выбранных хостов ({selection.count()}):",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return HOST_BULK_PORT
+
+    elif data == "hsel_a_inbound":
+        topology = await get_topology()
+        profiles = topology.profiles if topology else None
+        if not profiles:
+            return await _show_host_selection(query, selection, "❌ Не удалось получить список профилей.")
+        context.user_data["host_selection_profiles"] = [profile.get("uuid") for profile in profiles[:20]]
+        keyboard = [
+            [InlineKeyboardButton(profile.get("name", profile.get("uuid")), callback_data=f"hsel_prof_{index}")]
+            for index, profile in enumerate(profiles[:20])
+        ]
+        keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="hsel_back")])
+        await query.edit_message_text("📡 Выберите профиль конфигурации:", reply_markup=InlineKeyboardMarkup(keyboard))
+        return HOST_MENU
+
+    elif data.startswith("hsel_prof_"):
+        profiles = context.user_data.get("host_selection_profiles") or []
+        index = int(data[len("hsel_prof_"):])
+        if index >= len(profiles):
+            return await _show_host_selection(query, selection)
+        topology = await get_topology()
+        inbounds = topology.inbounds_of_profile(profiles[index]) if topology else None
+        if not inbounds:
+            return await _show_host_selection(query, selection, "❌ В профиле нет inbound'ов.")
+        context.user_data["host_selection_inbounds"] = [
+            [profiles[index], inbound.get("uuid"), inbound.get("tag")] for inbound in inbounds[:20]
+        ]
+        keyboard = [
+            [InlineKeyboardButton(
+                f"{inbound.get('tag')} ({inbound.get('type')} :{inbound.get('port')})", callback_data=f"hsel_inb_{i}"
+            )]
+            for i, inbound in enumerate(inbounds[:20])
+        ]
+        keyboard.append([InlineKeyboardButton("❌ Отмена", callback_data="hsel_back")])
+        await query.edit_message_text("📡 Выберите inbound:", reply_markup=InlineKeyboardMarkup(keyboard))
+        return HOST_MENU
+
+    elif data.startswith("hsel_inb_"):
+        inbounds = context.user_data.get("host_selection_inbounds") or []
+        index = int(data[len("hsel_inb_"):])
+        if index >= len(inbounds):
+            return await _show_host_selection(query, selection)
+        profile_uuid, inbound_uuid, tag = inbounds[index]
+        uuids = [item["uuid"] for item in selection.selected()]
+        result = await HostAPI.bulk_set_inbound_to_hosts(uuids, inbound_uuid, profile_uuid)
+        if result is None:
+            notice = "❌ Панель не выполнила операцию."
+        else:
+            notice = f"📡 Inbound {escape_markdown(tag)} назначен хостам: {len(uuids)}"
+        return await _show_host_selection(query, selection, notice)
+
+    return await _show_host_selection(query, selection)
 
+async def handle_host_bulk_port_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Apply a port entered by the admin to all selected hosts in one request"""
+    selection = context.user_data.get("host_selection")
+    if selection is None or not selection.count():
+        await update.message.reply_text("❌ Хосты не выбраны.")
+        return HOST_MENU
+
+    text = (update.message.text or "").strip()
+    if not text.isdigit() or not 1 <= int(text) <= 65535:
+        await update.message.reply_text("❌ Порт должен быть числом 1-65535")
+        return HOST_BULK_PORT
+
+    result = await HostAPI.bulk_set_port_to_hosts([item["uuid"] for item in selection.selected()], int(text))
+    if result is None:
+        notice = "❌ Панель не выполнила операцию."
+    else:
+        _refresh_host_selection(selection, result if isinstance(result, list) else [])
+        notice = f"🔌 Порт {text} назначен хостам: {selection.count()}"
+    message, reply_markup = _host_selection_view(selection, notice)
+    await update.message.reply_text(message, reply_markup=reply_markup, parse_mode="Markdown")
+    return HOST_MENU
@@ -6,7 +6,8 @@ from modules.config import MAIN_MENU, INBOUND_MENU
 from modules.api.inbounds import InboundAPI
 from modules.api.users import UserAPI
 from modules.api.nodes import NodeAPI
-from modules.utils.formatters import format_inbound_details
+from modules.utils.formatters import escape_markdown, format_inbound_details
+from modules.utils.topology import get_topology
 from modules.utils.selection_helpers import SelectionHelper
 from modules.handlers.core.start import show_main_menu
 
@@ -204,20 +205,8 @@ async def list_full_inbounds(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def show_inbound_details(update: Update, context: ContextTypes.DEFAULT_TYPE, uuid):
     """Show inbound details"""
-    # Get full inbounds to find the one with matching UUID
-    inbounds = await InboundAPI.get_full_inbounds()
-    
-    if not inbounds:
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_inbounds")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        await update.callback_query.edit_message_text(
-            "❌ Inbound не найден или ошибка при получении данных.",
-            reply_markup=reply_markup
-        )
-        return INBOUND_MENU
-    
-    inbound = next((i for i in inbounds if i['uuid'] == uuid), None)
+    topology = await get_topology()
+    inbound = topology.inbound(uuid) if topology else None
     
     if not inbound:
         keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_inbounds")]]
@@ -230,6 +219,22 @@ async def show_inbound_details(update: Update, context: ContextTypes.DEFAULT_TYP
         return INBOUND_MENU
     
     message = format_inbound_details(inbound)
+
+    profile = topology.profiles_by_uuid.get(inbound.get("profileUuid")) or {}
+    if profile:
+        message += f"\n📁 *Профиль*: {escape_markdown(profile.get('name', ''))}\n"
+    hosts = topology.hosts_of_inbound(uuid)
+    message += f"\n🌐 *Хосты* ({len(hosts)}):\n"
+    for host in hosts[:15]:
+        status_emoji = "🟢" if not host.get("isDisabled") else "🔴"
+        message += f"  • {status_emoji} {escape_markdown(host.get('remark', ''))} — {escape_markdown(host.get('address', ''))}:{host.get('port')}\n"
+    if len(hosts) > 15:
+        message += f"  ... и еще {len(hosts) - 15}\n"
+    nodes = topology.nodes_of_profile(inbound.get("profileUuid"))
+    if nodes:
+        message += f"\n🖥️ *Серверы профиля* ({len(nodes)}): "
+        message += escape_markdown(", ".join(node.get("name", "") for node in nodes[:15]))
+        message += "\n"
     
     # Create action buttons (limited in v208)
     keyboard = [[InlineKeyboardButton("🔙 Назад к списку", callback_data="list_full_inbounds")]]
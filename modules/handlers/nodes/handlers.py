@@ -1,13 +1,16 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+import asyncio
 import logging
 
-from modules.config import MAIN_MENU, NODE_MENU, EDIT_NODE, EDIT_NODE_FIELD, CREATE_NODE, NODE_NAME, NODE_ADDRESS, NODE_PORT, NODE_TLS, SELECT_INBOUNDS
+from modules.config import MAIN_MENU, NODE_MENU, EDIT_NODE, EDIT_NODE_FIELD, CREATE_NODE, NODE_NAME, NODE_ADDRESS, NODE_PORT, NODE_TLS, SELECT_INBOUNDS, ROLLING_RESTART_TIMEOUT
 from modules.api.nodes import NodeAPI
 from modules.api.inbounds import InboundAPI
 from modules.api.config_profiles import ConfigProfileAPI
 from modules.utils.formatters import format_node_details, format_bytes
 from modules.utils.selection_helpers import SelectionHelper
+from modules.utils.charts import render_chart, render_daily_bars, daily_series, remember_file_id
+from modules.utils.jobs import job_manager
 from modules.handlers.core.start import show_main_menu
 
 logger = logging.getLogger(__name__)
@@ -19,6 +22,7 @@ async def show_nodes_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("➕ Добавить новый сервер", callback_data="add_node")],
         [InlineKeyboardButton("📜 Получить сертификат панели", callback_data="get_panel_certificate")],
         [InlineKeyboardButton("🔄 Перезапустить все серверы", callback_data="restart_all_nodes")],
+        [InlineKeyboardButton("🔁 Поочередный перезапуск", callback_data="rolling_restart_nodes")],
         [InlineKeyboardButton("📊 Статистика использования", callback_data="nodes_usage")],
         [InlineKeyboardButton("🔙 Назад в главное меню", callback_data="back_to_main")]
     ]
@@ -33,6 +37,44 @@ async def show_nodes_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
+@job_manager.register("rolling_restart", "🔁 Поочередный перезапуск серверов")
+async def run_rolling_restart_job(job):
+    """Restart enabled nodes one at a time, waiting for each to reconnect before the next"""
+    checkpoint = job.checkpoint
+    node_uuids = checkpoint.get("nodes")
+    if node_uuids is None:
+        nodes = await NodeAPI.get_all_nodes()
+        if nodes is None:
+            raise RuntimeError("не удалось получить список серверов")
+        node_uuids = [node["uuid"] for node in nodes if not node.get("isDisabled")]
+    failed = checkpoint.get("failed", [])
+
+    for index in range(checkpoint.get("index", 0), len(node_uuids)):
+        await job.progress(index, len(node_uuids))
+        uuid = node_uuids[index]
+        result = await NodeAPI.restart_node(uuid)
+        online = False
+        if result:
+            # Даём ноде время отключиться, затем ждём повторного подключения
+            await asyncio.sleep(5)
+            deadline = asyncio.get_running_loop().time() + ROLLING_RESTART_TIMEOUT
+            while asyncio.get_running_loop().time() < deadline:
+                job.check_cancelled()
+                node = await NodeAPI.get_node_by_uuid(uuid)
+                if node and node.get("isConnected") and node.get("isXrayRunning", True):
+                    online = True
+                    break
+                await asyncio.sleep(5)
+        if not online:
+            failed.append(uuid)
+        job.save_checkpoint({"nodes": node_uuids, "index": index + 1, "failed": failed})
+
+    await job.progress(len(node_uuids), len(node_uuids))
+    message = f"Перезапущено серверов: {len(node_uuids) - len(failed)} из {len(node_uuids)}"
+    if failed:
+        message += f"\n⚠️ Не подключились после перезапуска: {len(failed)}"
+    return {"text": message}
+
 async def handle_nodes_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle nodes menu selection"""
     query = update.callback_query
@@ -89,6 +131,29 @@ async def handle_nodes_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return NODE_MENU
         
+    elif data == "rolling_restart_nodes":
+        keyboard = [
+            [
+                InlineKeyboardButton("✅ Да, по очереди", callback_data="confirm_rolling_restart"),
+                InlineKeyboardButton("❌ Отмена", callback_data="back_to_nodes")
+            ]
+        ]
+        await query.edit_message_text(
+            "🔁 Серверы будут перезапущены по одному: следующий начнет перезапуск "
+            "только после того, как предыдущий снова подключится к панели.\n\nПродолжить?",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return NODE_MENU
+
+    elif data == "confirm_rolling_restart":
+        await job_manager.submit("rolling_restart", {}, query.message.chat_id)
+        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_nodes")]]
+        await query.edit_message_text(
+            "✅ Поочередный перезапуск поставлен в очередь. Прогресс будет показываться отдельным сообщением.",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return NODE_MENU
+
     elif data == "nodes_usage":
         await show_nodes_usage(update, context)
         return NODE_MENU
@@ -134,6 +199,10 @@ async def handle_nodes_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         uuid = data.split("_")[2]
         await show_node_stats(update, context, uuid)
         return NODE_MENU
+    elif data.startswith("node_chart_"):
+        uuid = data.split("_")[2]
+        await show_node_traffic_chart(update, context, uuid)
+        return NODE_MENU
     elif data.startswith("edit_node_"):
         uuid = data.split("_")[2]
         await start_edit_node(update, context, uuid)
@@ -489,6 +558,7 @@ async def show_node_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, uu
         message = "❌ Ошибка при получении статистики сервера."
     
     keyboard = [
+        [InlineKeyboardButton("📈 График за 7 дней", callback_data=f"node_chart_{uuid}")],
         [InlineKeyboardButton("🔄 Обновить", callback_data=f"node_stats_{uuid}")],
         [InlineKeyboardButton("🔙 Назад к деталям", callback_data=f"view_node_{uuid}")]
     ]
@@ -502,6 +572,40 @@ async def show_node_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, uu
     
     return NODE_MENU
 
+async def show_node_traffic_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, uuid):
+    """Send daily traffic chart for the last 7 days as a photo"""
+    query = update.callback_query
+    
+    from datetime import datetime, timedelta
+    end_date = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    start_date = (datetime.now() - timedelta(days=7)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    
+    node, usage_stats = await asyncio.gather(
+        NodeAPI.get_node_by_uuid(uuid),
+        NodeAPI.get_node_usage_by_range(uuid, start_date, end_date)
+    )
+    
+    labels, values = daily_series(usage_stats, 7)
+    node_name = node.get('name', uuid) if node else uuid
+    key, photo = await render_chart(
+        f"node:{uuid}", "7d", render_daily_bars,
+        f"{node_name}: трафик по дням (7 дней)", labels, values
+    )
+    
+    if photo is None:
+        await query.message.reply_text("❌ Не удалось построить график.")
+        return NODE_MENU
+    
+    keyboard = [[InlineKeyboardButton("🔙 Назад к деталям", callback_data=f"view_node_{uuid}")]]
+    sent = await query.message.reply_photo(
+        photo=photo,
+        caption=f"📈 Трафик за 7 дней: {format_bytes(sum(values))}",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    remember_file_id(key, sent)
+    
+    return NODE_MENU
+
 async def handle_node_pagination(update: Update, context: ContextTypes.DEFAULT_TYPE, page: int):
     """Handle pagination for node list"""
     try:
@@ -4,8 +4,13 @@ from telegram.ext import ContextTypes
 
 from modules.config import MAIN_MENU, STATS_MENU
 from modules.api.system import SystemAPI
-from modules.api.nodes import NodeAPI
-from modules.utils.formatters import format_system_stats, format_bandwidth_stats, format_bytes
+from modules.api.client import ACCEPT_ENCODING, transfer_stats, hedge_stats
+from modules.utils.formatters import (
+    format_bytes, format_system_stats, format_bandwidth_stats, format_node_metrics_dashboard, parse_bytes
+)
+from modules.utils.node_metrics import get_node_metrics_dashboard, get_rate_history
+from modules.utils.scheduler import request_scheduler
+from modules.utils.charts import render_chart, render_grouped_bars, render_lines, remember_file_id
 from modules.handlers.core.start import show_main_menu
 
 logger = logging.getLogger(__name__)
@@ -16,6 +21,7 @@ async def show_stats_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         [InlineKeyboardButton("📊 Общая статистика", callback_data="system_stats")],
         [InlineKeyboardButton("📈 Статистика трафика", callback_data="bandwidth_stats")],
         [InlineKeyboardButton("🖥️ Статистика серверов", callback_data="nodes_stats")],
+        [InlineKeyboardButton("📡 Трафик API панели", callback_data="api_transfer_stats")],
         [InlineKeyboardButton("🔙 Назад в главное меню", callback_data="back_to_main")]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -45,6 +51,18 @@ async def handle_stats_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif data == "nodes_stats":
         return await show_nodes_stats(update, context)
 
+    elif data == "nodes_stats_refresh":
+        return await show_nodes_stats(update, context, force_refresh=True)
+
+    elif data == "bandwidth_chart":
+        return await show_bandwidth_chart(update, context)
+
+    elif data == "nodes_speed_chart":
+        return await show_nodes_speed_chart(update, context)
+
+    elif data == "api_transfer_stats":
+        return await show_api_transfer_stats(update, context)
+
     elif data == "back_to_stats":
         await show_stats_menu(update, context)
         return STATS_MENU
@@ -121,6 +139,7 @@ async def show_bandwidth_stats(update: Update, context: ContextTypes.DEFAULT_TYP
 
     # Add back button
     keyboard = [
+        [InlineKeyboardButton("📈 График", callback_data="bandwidth_chart")],
         [InlineKeyboardButton("🔄 Обновить", callback_data="bandwidth_stats")],
         [InlineKeyboardButton("🔙 Назад", callback_data="back_to_stats")]
     ]
@@ -134,22 +153,17 @@ async def show_bandwidth_stats(update: Update, context: ContextTypes.DEFAULT_TYP
 
     return STATS_MENU
 
-async def show_nodes_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show nodes statistics"""
+async def show_nodes_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, force_refresh: bool = False):
+    """Show nodes metrics dashboard"""
     query = update.callback_query
-    await query.answer()
     
     try:
-        logger.info("Starting nodes stats request")
         await query.edit_message_text("📊 Загрузка статистики серверов...")
         
-        # Get nodes stats from API
-        logger.info("Calling NodeAPI.get_nodes_stats()")
-        nodes_stats = await NodeAPI.get_nodes_stats()
-        logger.info(f"NodeAPI.get_nodes_stats() returned: {nodes_stats}")
+        dashboard = await get_node_metrics_dashboard(force=force_refresh)
         
-        if not nodes_stats:
-            logger.warning("nodes_stats is None or empty")
+        if not dashboard or not dashboard.get('nodes'):
+            logger.warning("Node metrics dashboard is empty")
             keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_stats")]]
             reply_markup = InlineKeyboardMarkup(keyboard)
             
@@ -159,26 +173,13 @@ async def show_nodes_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return STATS_MENU
         
-        # Format nodes statistics
-        message = "🖥️ *Статистика серверов*\n\n"
-        
-        total_nodes = len(nodes_stats)
-        online_nodes = sum(1 for node in nodes_stats if node.get('status') == 'connected')
+        message = format_node_metrics_dashboard(dashboard)
         
-        message += f"📊 *Общая информация:*\n"
-        message += f"• Всего серверов: {total_nodes}\n"
-        message += f"• Онлайн: {online_nodes}\n"
-        message += f"• Офлайн: {total_nodes - online_nodes}\n\n"
-        
-        if nodes_stats:
-            message += "📋 *Детали серверов:*\n"
-            for node in nodes_stats:
-                name = node.get('name', 'Неизвестно')
-                status = '🟢' if node.get('status') == 'connected' else '🔴'
-                uptime = node.get('uptime', 'N/A')
-                message += f"• {status} {name} (Uptime: {uptime})\n"
-        
-        keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_stats")]]
+        keyboard = [
+            [InlineKeyboardButton("📈 График скорости", callback_data="nodes_speed_chart")],
+            [InlineKeyboardButton("🔄 Обновить", callback_data="nodes_stats_refresh")],
+            [InlineKeyboardButton("🔙 Назад", callback_data="back_to_stats")]
+        ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await query.edit_message_text(
@@ -201,4 +202,116 @@ async def show_nodes_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return STATS_MENU
 
+async def show_bandwidth_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send bandwidth comparison chart (current vs previous period) as a photo"""
+    query = update.callback_query
+
+    stats = await SystemAPI.get_bandwidth_stats()
+    if not stats:
+        await query.message.reply_text("❌ Не удалось получить статистику трафика.")
+        return STATS_MENU
+
+    periods = [
+        ("2 дня", "bandwidthLastTwoDays"),
+        ("7 дней", "bandwidthLastSevenDays"),
+        ("30 дней", "bandwidthLast30Days"),
+        ("Месяц", "bandwidthCalendarMonth"),
+        ("Год", "bandwidthCurrentYear"),
+    ]
+    labels = [label for label, _ in periods]
+    series = {
+        "Текущий": [parse_bytes((stats.get(field) or {}).get('current')) for _, field in periods],
+        "Предыдущий": [parse_bytes((stats.get(field) or {}).get('previous')) for _, field in periods],
+    }
+
+    key, photo = await render_chart("system:bandwidth", "periods", render_grouped_bars, "Трафик по периодам", labels, series)
+    if photo is None:
+        await query.message.reply_text("❌ Не удалось построить график.")
+        return STATS_MENU
+
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_stats")]]
+    sent = await query.message.reply_photo(
+        photo=photo,
+        caption="📈 Трафик: текущий и предыдущий период",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    remember_file_id(key, sent)
+
+    return STATS_MENU
+
+async def show_nodes_speed_chart(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send inbound speed lines for the busiest nodes as a photo"""
+    query = update.callback_query
+
+    dashboard = await get_node_metrics_dashboard()
+    labels, series = get_rate_history(dashboard.get('nodes', []) if dashboard else [])
+    if len(labels) < 2:
+        await query.message.reply_text("ℹ️ Недостаточно замеров. Обновите статистику серверов несколько раз.")
+        return STATS_MENU
+
+    key, photo = await render_chart("nodes:speed", labels[-1], render_lines, "Скорость inbound по серверам", labels, series)
+    if photo is None:
+        await query.message.reply_text("❌ Не удалось построить график.")
+        return STATS_MENU
+
+    keyboard = [[InlineKeyboardButton("🔙 Назад", callback_data="back_to_stats")]]
+    sent = await query.message.reply_photo(
+        photo=photo,
+        caption=f"📈 Скорость по последним {len(labels)} замерам",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    remember_file_id(key, sent)
+
+    return STATS_MENU
 
+async def show_api_transfer_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show bytes received from the panel API per endpoint, hedging counters and request queue metrics"""
+    message = "📡 *Трафик API панели*\n\n"
+    message += f"Accept-Encoding: `{ACCEPT_ENCODING}`\n\n"
+
+    if not transfer_stats:
+        message += "Запросов к API еще не было."
+    else:
+        wire = sum(stats["wire_bytes"] for stats in transfer_stats.values())
+        decoded = sum(stats["decoded_bytes"] for stats in transfer_stats.values())
+        message += f"Всего: {format_bytes(wire)} по сети, {format_bytes(decoded)} после распаковки"
+        if wire:
+            message += f" (x{decoded / wire:.1f})"
+        message += "\n\n"
+        top = sorted(transfer_stats.items(), key=lambda item: item[1]["decoded_bytes"], reverse=True)[:15]
+        for endpoint, stats in top:
+            ratio = stats["decoded_bytes"] / stats["wire_bytes"] if stats["wire_bytes"] else 1
+            message += f"• `{endpoint}` — {stats['requests']} запр., "
+            message += f"{format_bytes(stats['wire_bytes'])} → {format_bytes(stats['decoded_bytes'])} (x{ratio:.1f})\n"
+
+    hedged = {endpoint: stats for endpoint, stats in hedge_stats.items() if stats["hedged"]}
+    if hedged:
+        message += "\n🪞 *Дублирующие запросы*\n"
+        for endpoint, stats in sorted(hedged.items(), key=lambda item: item[1]["hedged"], reverse=True)[:10]:
+            message += (
+                f"• `{endpoint}` — дубль отправлен {stats['hedged']} из {stats['requests']}, "
+                f"ответил первым {stats['hedge_won']}\n"
+            )
+
+    rate = f"{request_scheduler.rate:g}/с" if request_scheduler.rate else "без ограничения"
+    message += f"\n🚦 *Очередь запросов* (одновременно {request_scheduler.max_concurrency}, частота {rate})\n"
+    labels = {"interactive": "Действия админа", "background": "Фоновые обновления", "bulk": "Массовые задания"}
+    for name, metrics in request_scheduler.metrics().items():
+        if not metrics["requests"]:
+            continue
+        message += (
+            f"• {labels[name]}: {metrics['requests']} запр., в очереди {metrics['queued']} "
+            f"(макс. {metrics['max_queued']}), ожидание p95 {metrics['wait_p95_ms']:.0f} мс, "
+            f"макс. {metrics['wait_max_ms']:.0f} мс\n"
+        )
+
+    keyboard = [
+        [InlineKeyboardButton("🔄 Обновить", callback_data="api_transfer_stats")],
+        [InlineKeyboardButton("🔙 Назад", callback_data="back_to_stats")]
+    ]
+    await update.callback_query.edit_message_text(
+        text=message,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="Markdown"
+    )
+    return STATS_MENU
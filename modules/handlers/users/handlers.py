@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import asyncio
 import logging
 import random
 import string
@@ -13,6 +14,7 @@ from modules.config import (
 from modules.api.users import UserAPI
 from modules.utils.formatters import format_bytes, format_user_details, format_user_details_safe, escape_markdown, safe_edit_message
 from modules.utils.selection_helpers import SelectionHelper
+from modules.utils.charts import render_chart, render_daily_bars, daily_series, remember_file_id
 from modules.utils.auth import check_admin, check_authorization
 from modules.handlers.core.start import show_main_menu
 
@@ -85,47 +87,28 @@ async def handle_users_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     return USER_MENU
 
-async def search_users_by_term(term: str):
-    """Fetch users and filter by generic term"""
-    try:
-        response = await UserAPI.get_all_users()
-    except Exception as e:
-        logger.error(f"Error fetching users for search: {e}")
-        return []
+def _user_matches_term(user, term_lower):
+    fields = (
+        user.get('username'), user.get('description'), user.get('email'), user.get('tag'),
+        user.get('shortUuid'), user.get('uuid'), user.get('telegramId')
+    )
+    return any(term_lower in str(field).lower() for field in fields if field)
 
-    users = []
-    if isinstance(response, dict):
-        if 'users' in response:
-            users = response['users'] or []
-        elif 'response' in response and isinstance(response['response'], dict) and 'users' in response['response']:
-            users = response['response']['users'] or []
-    elif isinstance(response, list):
-        users = response
 
+async def search_users_by_term(term: str, limit=None):
+    """Stream users and return those matching a generic term, stopping after `limit` matches"""
     term_lower = term.lower()
     matches = []
     seen = set()
-
-    for user in users:
-        if not isinstance(user, dict):
-            continue
-        user_uuid = str(user.get('uuid') or '')
-        if not user_uuid or user_uuid in seen:
-            continue
-
-        fields = [
-            str(user.get('username') or ''),
-            str(user.get('description') or ''),
-            str(user.get('email') or ''),
-            str(user.get('tag') or ''),
-            str(user.get('shortUuid') or ''),
-            user_uuid,
-            str(user.get('telegramId') or '')
-        ]
-
-        if any(term_lower in field.lower() for field in fields if field):
-            matches.append(user)
-            seen.add(user_uuid)
+    try:
+        async for user in UserAPI.iter_users(where=lambda user: _user_matches_term(user, term_lower), limit=limit):
+            user_uuid = str(user.get('uuid') or '')
+            if user_uuid and user_uuid not in seen:
+                matches.append(user)
+                seen.add(user_uuid)
+    except Exception as e:
+        # Найденное до ошибки всё равно показываем
+        logger.error(f"Error fetching users for search: {e}")
 
     matches.sort(key=lambda u: (u.get('username') or '').lower())
     return matches
@@ -412,6 +395,10 @@ async def handle_user_action(update: Update, context: ContextTypes.DEFAULT_TYPE)
             elif action == "refresh":
                 await show_user_details(update, context, uuid)
                 return SELECTING_USER
+            elif action == "stats":
+                return await show_user_stats(update, context, uuid)
+            elif action == "chart":
+                return await show_user_traffic_chart(update, context, uuid)
             elif action == "disable":
                 context.user_data["action"] = "disable"
                 context.user_data["uuid"] = uuid
@@ -697,7 +684,9 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return WAITING_FOR_INPUT
 
-        matches = await search_users_by_term(term)
+        max_results = 10
+        # На одного больше лимита — чтобы знать, что совпадений больше, не просматривая всю базу
+        matches = await search_users_by_term(term, limit=max_results + 1)
 
         if not matches:
             back_markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Назад", callback_data="back_to_users")]])
@@ -768,10 +757,10 @@ async def handle_text_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 context.user_data["current_user"] = user
                 return SELECTING_USER
 
-        max_results = 10
         keyboard = []
+        found = f"более {max_results}" if len(matches) > max_results else str(len(matches))
         message_lines = [
-            f"🔍 Найдено {len(matches)} пользователей по запросу `{escape_markdown(term)}`:",
+            f"🔍 Найдено {found} пользователей по запросу `{escape_markdown(term)}`:",
             ""
         ]
 
@@ -1893,8 +1882,15 @@ async def finish_create_user(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
 async def show_user_hwid_devices(update: Update, context: ContextTypes.DEFAULT_TYPE, uuid: str):
     """Show user HWID devices"""
-    devices = await UserAPI.get_user_hwid_devices(uuid)
-    user = context.user_data.get("current_user") or await UserAPI.get_user_by_uuid(uuid)
+    user = context.user_data.get("current_user")
+    if user:
+        devices = await UserAPI.get_user_hwid_devices(uuid)
+    else:
+        # Устройства и пользователь загружаются одновременно
+        devices, user = await asyncio.gather(UserAPI.get_user_hwid_devices(uuid), UserAPI.get_user_by_uuid(uuid))
+    # Панель отдаёт объект {total, devices}
+    if isinstance(devices, dict):
+        devices = devices.get('devices', [])
     
     if not devices:
         keyboard = [
@@ -2008,8 +2004,9 @@ async def show_user_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, uu
     
     # Add action buttons
     keyboard = [
+        [InlineKeyboardButton("📈 График за 30 дней", callback_data=f"user_action_chart_{uuid}")],
         [InlineKeyboardButton("🔙 Назад к пользователю", callback_data=f"view_{uuid}")],
-        [InlineKeyboardButton("🔄 Обновить статистику", callback_data=f"stats_{uuid}")]
+        [InlineKeyboardButton("🔄 Обновить статистику", callback_data=f"user_action_stats_{uuid}")]
     ]
     
     reply_markup = InlineKeyboardMarkup(keyboard)
@@ -2022,6 +2019,36 @@ async def show_user_stats(update: Update, context: ContextTypes.DEFAULT_TYPE, uu
     
     return SELECTING_USER
 
+async def show_user_traffic_chart(update: Update, context: ContextTypes.DEFAULT_TYPE, uuid):
+    """Send daily traffic chart for the last 30 days as a photo"""
+    query = update.callback_query
+    user = context.user_data.get("current_user") or await UserAPI.get_user_by_uuid(uuid)
+    
+    end_date = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    start_date = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+    usage = await UserAPI.get_user_usage_by_range(uuid, start_date, end_date)
+    
+    labels, values = daily_series(usage, 30)
+    username = user.get('username', uuid) if user else uuid
+    key, photo = await render_chart(
+        f"user:{uuid}", "30d", render_daily_bars,
+        f"{username}: трафик по дням (30 дней)", labels, values
+    )
+    
+    if photo is None:
+        await query.message.reply_text("❌ Не удалось построить график.")
+        return SELECTING_USER
+    
+    keyboard = [[InlineKeyboardButton("🔙 Назад к пользователю", callback_data=f"view_{uuid}")]]
+    sent = await query.message.reply_photo(
+        photo=photo,
+        caption=f"📈 Трафик за 30 дней: {format_bytes(sum(values))}",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    remember_file_id(key, sent)
+    
+    return SELECTING_USER
+
 async def start_add_hwid(update: Update, context: ContextTypes.DEFAULT_TYPE, uuid):
     """Start adding a HWID device"""
     user = context.user_data.get("current_user") or await UserAPI.get_user_by_uuid(uuid)
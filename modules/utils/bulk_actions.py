@@ -0,0 +1,225 @@
+"""
+Chunked execution of bulk user actions with per-chunk retries
+"""
+import asyncio
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+
+from modules.api.bulk import BulkAPI
+from modules.api.users import TAG_PATTERN, TRAFFIC_LIMIT_STRATEGIES, UserAPI
+from modules.config import BULK_CHUNK_SIZE, IMPORT_CONCURRENCY
+from modules.utils.concurrency import AdaptiveLimiter
+from modules.utils.formatters import parse_bytes
+from modules.utils.importer import parse_date
+
+logger = logging.getLogger(__name__)
+
+CHUNK_RETRIES = 3
+# Сколько одиночных PATCH запускать между сохранениями контрольной точки
+PATCH_BATCH_SIZE = 200
+EXPIRY_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+
+EXTEND_TITLE = "📅 Продлить"
+
+# action -> (название кнопки, функция bulk API)
+BULK_ACTIONS = {
+    "reset": ("🔄 Сбросить трафик", lambda uuids, fields: BulkAPI.bulk_reset_user_traffic(uuids)),
+    "revoke": ("🚫 Отозвать подписку", lambda uuids, fields: BulkAPI.bulk_revoke_users_subscription(uuids)),
+    "disable": ("⏸️ Отключить", lambda uuids, fields: BulkAPI.bulk_update_users(uuids, {"status": "DISABLED"})),
+    "enable": ("▶️ Включить", lambda uuids, fields: BulkAPI.bulk_update_users(uuids, {"status": "ACTIVE"})),
+    "update": ("✏️ Изменить поля", lambda uuids, fields: BulkAPI.bulk_update_users(uuids, fields)),
+    "delete": ("🗑️ Удалить", lambda uuids, fields: BulkAPI.bulk_delete_users(uuids)),
+}
+
+UPDATE_FIELDS_HELP = (
+    "`status=DISABLED` — статус\n"
+    "`tag=VIP` / `tag=none` — тег\n"
+    "`traffic=100 GB` / `traffic=0` — лимит трафика (0 — безлимит)\n"
+    "`strategy=MONTH` — стратегия сброса трафика\n"
+    "`devices=3` — лимит устройств\n"
+    "`expire=2026-12-31` — дата истечения"
+)
+
+
+class BulkActionError(Exception):
+    """Raised when update fields cannot be parsed"""
+
+
+def parse_update_fields(text):
+    """Parse `key=value` pairs (values may contain spaces) into bulk update fields"""
+    pairs = re.findall(r"(\w+)=(.*?)(?=\s+\w+=|$)", text.strip())
+    if not pairs:
+        raise BulkActionError("Укажите хотя бы одно поле в формате `поле=значение`")
+
+    fields = {}
+    for key, value in pairs:
+        key, value = key.lower(), value.strip()
+        if key == "status":
+            if value.upper() not in ("ACTIVE", "DISABLED", "LIMITED", "EXPIRED"):
+                raise BulkActionError(f"Неизвестный статус: {value}")
+            fields["status"] = value.upper()
+        elif key == "tag":
+            if value.lower() == "none":
+                fields["tag"] = None
+            elif TAG_PATTERN.match(value.upper()):
+                fields["tag"] = value.upper()
+            else:
+                raise BulkActionError(f"Некорректный тег: {value}")
+        elif key == "traffic":
+            match = re.match(r"^([\d.,]+)\s*([a-zA-Z]*)$", value)
+            if not match:
+                raise BulkActionError(f"Некорректный лимит трафика: {value}")
+            fields["trafficLimitBytes"] = int(parse_bytes(f"{match.group(1)} {match.group(2) or 'B'}"))
+        elif key == "strategy":
+            if value.upper() not in TRAFFIC_LIMIT_STRATEGIES:
+                raise BulkActionError(f"Неизвестная стратегия: {value}")
+            fields["trafficLimitStrategy"] = value.upper()
+        elif key == "devices":
+            if not value.isdigit():
+                raise BulkActionError(f"Некорректный лимит устройств: {value}")
+            fields["hwidDeviceLimit"] = int(value)
+        elif key == "expire":
+            try:
+                fields["expireAt"] = parse_date(value)
+            except ValueError as e:
+                raise BulkActionError(str(e))
+        else:
+            raise BulkActionError(f"Неизвестное поле: {key}")
+    return fields
+
+
+def _affected(result, chunk):
+    if isinstance(result, dict):
+        for key in ("affectedRows", "deletedCount"):
+            if key in result:
+                return result[key]
+    return len(chunk)
+
+
+async def run_bulk_action(action, uuids, fields=None, progress=None, start=0):
+    """
+    Apply `action` to `uuids[start:]` in chunks of BULK_CHUNK_SIZE, retrying each chunk.
+    `progress(processed, total, affected, failed)` is awaited after every chunk,
+    where `processed` is an offset into `uuids` usable as the next `start`.
+    Returns (affected, failed_uuids_count) for this run.
+    """
+    call = BULK_ACTIONS[action][1]
+    affected = failed = 0
+
+    for offset in range(start, len(uuids), BULK_CHUNK_SIZE):
+        chunk = uuids[offset:offset + BULK_CHUNK_SIZE]
+        result = None
+        for attempt in range(CHUNK_RETRIES):
+            result = await call(chunk, fields)
+            if result:
+                break
+            if attempt < CHUNK_RETRIES - 1:
+                logger.warning(f"Bulk {action} chunk at {offset} failed, retrying")
+                await asyncio.sleep(2 ** attempt)
+
+        if result:
+            affected += _affected(result, chunk)
+        else:
+            logger.error(f"Bulk {action} chunk at {offset} failed after {CHUNK_RETRIES} attempts")
+            failed += len(chunk)
+
+        if progress is not None:
+            await progress(offset + len(chunk), len(uuids), affected, failed)
+
+    return affected, failed
+
+
+def plan_expiry_extension(users, days, now=None):
+    """
+    Compute the new expiry for every (uuid, expireAt) pair: N days from the current
+    expiry, or from now if the subscription has already ended.
+    Returns (groups, singles): groups are [target, [uuids]] sharing one target date,
+    largest first; singles are [uuid, target] pairs with a unique target.
+    """
+    now = now or datetime.now(timezone.utc)
+    targets = {}
+    for uuid, expire_at in users:
+        current = None
+        if expire_at:
+            try:
+                current = datetime.fromisoformat(str(expire_at).replace("Z", "+00:00"))
+            except ValueError:
+                current = None
+        if current is not None and current.tzinfo is None:
+            current = current.replace(tzinfo=timezone.utc)
+        base = current if current and current > now else now
+        target = (base + timedelta(days=days)).astimezone(timezone.utc).strftime(EXPIRY_FORMAT)
+        targets.setdefault(target, []).append(uuid)
+
+    groups = sorted(
+        ([target, uuids] for target, uuids in targets.items() if len(uuids) > 1),
+        key=lambda group: len(group[1]),
+        reverse=True
+    )
+    singles = [[uuids[0], target] for target, uuids in targets.items() if len(uuids) == 1]
+    return groups, singles
+
+
+def _extension_units(groups, singles):
+    """Split the plan into ordered work units so a resumed run can skip finished ones"""
+    units = []
+    for target, uuids in groups:
+        for offset in range(0, len(uuids), BULK_CHUNK_SIZE):
+            units.append(("bulk", target, uuids[offset:offset + BULK_CHUNK_SIZE]))
+    for offset in range(0, len(singles), PATCH_BATCH_SIZE):
+        units.append(("patch", None, singles[offset:offset + PATCH_BATCH_SIZE]))
+    return units
+
+
+async def run_expiry_extension(groups, singles, progress=None, start=0):
+    """
+    Apply a plan from plan_expiry_extension: shared targets go through users/bulk/update,
+    unique ones as concurrent PATCH requests under an adaptive limiter.
+    Targets are absolute dates, so replaying a unit after a restart is harmless.
+    `progress(processed, total, ok, failed)` is awaited after every unit.
+    Returns (ok, failed) for this run.
+    """
+    units = _extension_units(groups, singles)
+    total = sum(len(items) for _, _, items in units)
+    limiter = AdaptiveLimiter(IMPORT_CONCURRENCY)
+    ok = failed = processed = 0
+
+    async def patch(uuid, target):
+        for attempt in range(CHUNK_RETRIES):
+            async with limiter:
+                result = await UserAPI.update_user(uuid, {"expireAt": target})
+            limiter.record(bool(result))
+            if result:
+                return True
+            if attempt < CHUNK_RETRIES - 1:
+                await asyncio.sleep(2 ** attempt)
+        return False
+
+    for kind, target, items in units:
+        processed += len(items)
+        if processed <= start:
+            continue
+
+        if kind == "bulk":
+            result = None
+            for attempt in range(CHUNK_RETRIES):
+                result = await BulkAPI.bulk_update_users(items, {"expireAt": target})
+                if result:
+                    break
+                if attempt < CHUNK_RETRIES - 1:
+                    await asyncio.sleep(2 ** attempt)
+            if result:
+                ok += len(items)
+            else:
+                logger.error(f"Bulk expiry update to {target} failed for {len(items)} users")
+                failed += len(items)
+        else:
+            results = await asyncio.gather(*(patch(uuid, target) for uuid, target in items))
+            ok += sum(results)
+            failed += len(results) - sum(results)
+
+        if progress is not None:
+            await progress(processed, total, ok, failed)
+
+    return ok, failed
@@ -0,0 +1,166 @@
+"""
+In-process caches for panel data that is read far more often than it changes
+"""
+import asyncio
+import contextvars
+import logging
+import time
+
+from modules.utils.deadline import remaining
+from modules.utils.scheduler import BACKGROUND, current_priority, request_priority
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Small key/value cache where every entry expires after `ttl` seconds.
+    With `max_stale` an expired entry is still served by `get_or_fetch` for that many
+    more seconds while it is refreshed in the background (stale-while-revalidate), and
+    every fetch runs in a detached task outside the caller's deadline.
+    With `stale_on_error` an expired entry of any age is served when a refetch fails;
+    only for data that is displayed, never for data that mutations are planned from.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = None, max_stale: float = 0, stale_on_error: bool = False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self.stale_on_error = stale_on_error
+        self._entries = {}
+        self._locks = {}
+        self._refreshing = {}
+        self._expired = set()
+        self._generation = 0
+
+    def get(self, key, default=None):
+        """Return a fresh cached value or `default`"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        value, stored_at = entry
+        if key in self._expired or time.monotonic() - stored_at > self.ttl:
+            return default
+        return value
+
+    def set(self, key, value):
+        """Store a value and reset its age"""
+        self._entries.pop(key, None)
+        self._entries[key] = (value, time.monotonic())
+        self._expired.discard(key)
+        # dict хранит порядок вставки, поэтому первой удаляется самая старая запись
+        if self.max_entries and len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._entries.pop(oldest, None)
+            self._locks.pop(oldest, None)
+            self._expired.discard(oldest)
+
+    def invalidate(self, key=None):
+        """Drop one entry, or everything when no key is given"""
+        # Идущее фоновое обновление могло начаться до изменения данных — его результат не будет свежим
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+            self._expired.clear()
+        else:
+            self._entries.pop(key, None)
+            self._expired.discard(key)
+
+    def expire(self, key=None):
+        """Mark one entry, or all, as expired but keep it to be served stale while it is refreshed"""
+        self._generation += 1
+        self._expired.update(self._entries if key is None else [key] if key in self._entries else [])
+
+    def refreshing(self, key):
+        """Whether a detached fetch of `key` is in progress"""
+        return key in self._refreshing
+
+    def get_stale(self, key, default=None):
+        """Return the cached value even if it has expired"""
+        entry = self._entries.get(key)
+        return default if entry is None else entry[0]
+
+    def age(self, key):
+        """Seconds since the entry was stored, or None when there is no entry"""
+        entry = self._entries.get(key)
+        return None if entry is None else time.monotonic() - entry[1]
+
+    def _revalidate(self, key, fetch, priority=BACKGROUND):
+        task = self._refreshing.get(key)
+        if task is not None:
+            return task
+        # Пустой контекст: обновление не наследует дедлайн обработчика; приоритет — фоновый,
+        # если только его результата не ждут прямо сейчас
+        task = asyncio.create_task(self._refresh(key, fetch, priority), context=contextvars.Context())
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+        return task
+
+    async def _refresh(self, key, fetch, priority=BACKGROUND):
+        generation = self._generation
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        try:
+            with request_priority(priority):
+                async with lock:
+                    if self.get(key) is not None:
+                        return
+                    value = await fetch()
+        except Exception as e:
+            logger.error(f"Background refresh of {key!r} failed: {e}")
+            return
+        if value is None:
+            logger.warning(f"Background refresh of {key!r} failed, keeping the stale value")
+            return
+        self.set(key, value)
+        if generation != self._generation:
+            # Данные менялись во время загрузки: результат годится только как устаревший,
+            # иначе при частых изменениях (массовые задачи) кэш не заполнился бы никогда
+            self._expired.add(key)
+
+    async def get_or_fetch(self, key, fetch):
+        """
+        Return the cached value or await `fetch()` once, even for concurrent callers.
+        An entry expired less than `max_stale` seconds ago is returned at once and refreshed
+        in the background; without a usable entry the detached fetch is awaited until the
+        caller's deadline at most. If the fetch fails (returns None) or is still running at
+        the deadline, the result is None, or the expired value when there is one and the
+        cache was created with `stale_on_error`.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        age = self.age(key)
+        if age is not None and age <= self.ttl + self.max_stale:
+            self._revalidate(key, fetch)
+            return self.get_stale(key)
+
+        if self.max_stale:
+            # Полная загрузка может не уложиться в дедлайн нажатия — она продолжится в фоне
+            task = self._revalidate(key, fetch, current_priority())
+            try:
+                await asyncio.wait_for(asyncio.shield(task), remaining())
+            except TimeoutError:
+                logger.warning(f"Fetch for {key!r} continues in the background after the deadline")
+            value = self.get(key)
+            if value is None and self.stale_on_error:
+                value = self.get_stale(key)
+            return value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Другой вызов мог уже обновить запись, пока мы ждали блокировку
+            value = self.get(key)
+            if value is not None:
+                return value
+            value = await fetch()
+            if value is not None:
+                self.set(key, value)
+                return value
+            if not self.stale_on_error:
+                return None
+            # Панель недоступна — для отображения устаревшие данные лучше, чем ничего
+            stale = self.get_stale(key)
+            if stale is not None:
+                logger.warning(f"Fetch for {key!r} failed, serving stale cached value")
+            return stale
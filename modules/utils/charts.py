@@ -0,0 +1,173 @@
+"""
+PNG charts for traffic statistics, rendered off the event loop in a worker pool
+"""
+import asyncio
+import hashlib
+import io
+import json
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from modules.config import CHART_WORKERS, CHART_EXECUTOR, CHART_CACHE_TTL
+from modules.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_chart_cache = TTLCache(CHART_CACHE_TTL, max_entries=256)
+
+
+def charts_available():
+    """Check whether matplotlib is installed"""
+    try:
+        import matplotlib  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def daily_series(entries, days, value_key="total", date_key="date"):
+    """Sum usage entries per calendar day over the last `days` days, oldest first"""
+    today = datetime.now().date()
+    dates = [(today - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+    totals = dict.fromkeys(dates, 0)
+    for entry in entries or []:
+        date = str(entry.get(date_key) or "")[:10]
+        if date in totals:
+            try:
+                totals[date] += int(entry.get(value_key) or 0)
+            except (TypeError, ValueError):
+                continue
+    return [date[5:] for date in dates], [totals[date] for date in dates]
+
+
+def _new_figure(title):
+    # Используем объектный API вместо pyplot: он не держит глобального состояния
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    figure = Figure(figsize=(8, 4.5), dpi=100)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+    axes.set_title(title)
+    axes.grid(axis="y", alpha=0.3)
+    return figure, axes
+
+
+def _to_png(figure):
+    figure.tight_layout()
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _bytes_axis(axes):
+    from matplotlib.ticker import FuncFormatter
+
+    def human(value, _position):
+        for unit in ["B", "KB", "MB", "GB", "TB"]:
+            if abs(value) < 1024.0:
+                return f"{value:.0f} {unit}"
+            value /= 1024.0
+        return f"{value:.0f} PB"
+
+    axes.yaxis.set_major_formatter(FuncFormatter(human))
+
+
+def render_daily_bars(title, labels, values):
+    """Render one bar per day; values are byte counts"""
+    figure, axes = _new_figure(title)
+    axes.bar(range(len(values)), values, color="#3b82f6")
+    axes.set_xticks(range(len(labels)))
+    axes.set_xticklabels(labels, rotation=60, ha="right", fontsize=8)
+    _bytes_axis(axes)
+    return _to_png(figure)
+
+
+def render_grouped_bars(title, labels, series):
+    """Render side-by-side bars; series maps legend name to byte counts"""
+    figure, axes = _new_figure(title)
+    count = max(len(series), 1)
+    width = 0.8 / count
+    for index, (name, values) in enumerate(series.items()):
+        offsets = [x + index * width - 0.4 + width / 2 for x in range(len(values))]
+        axes.bar(offsets, values, width=width, label=name)
+    axes.set_xticks(range(len(labels)))
+    axes.set_xticklabels(labels, fontsize=8)
+    axes.legend()
+    _bytes_axis(axes)
+    return _to_png(figure)
+
+
+def render_lines(title, labels, series):
+    """Render one line per series; series maps legend name to bytes per second"""
+    figure, axes = _new_figure(title)
+    for name, values in series.items():
+        axes.plot(range(len(values)), values, label=name, linewidth=1.5)
+    step = max(1, len(labels) // 10)
+    axes.set_xticks(range(0, len(labels), step))
+    axes.set_xticklabels(labels[::step], rotation=45, ha="right", fontsize=8)
+    axes.legend(fontsize=8)
+    _bytes_axis(axes)
+    axes.set_ylabel("/с")
+    return _to_png(figure)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        if CHART_EXECUTOR == "process":
+            try:
+                _executor = ProcessPoolExecutor(max_workers=CHART_WORKERS)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"Process pool unavailable for charts, using threads: {e}")
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix="chart")
+    return _executor
+
+
+def shutdown_chart_executor():
+    """Stop chart workers (used on shutdown and in benchmarks)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _cache_key(entity, range_key, renderer, args):
+    payload = json.dumps([renderer.__name__, args], sort_keys=True, default=str)
+    data_hash = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    return (entity, range_key, data_hash)
+
+
+async def render_chart(entity, range_key, renderer, *args):
+    """
+    Render a chart in the worker pool, cached by (entity, range, data hash).
+    Returns (key, photo) where photo is PNG bytes or a Telegram file_id
+    of an already uploaded image; returns (None, None) when charts are unavailable.
+    """
+    if not charts_available():
+        return None, None
+
+    key = _cache_key(entity, range_key, renderer, args)
+    cached = _chart_cache.get(key)
+    if cached is not None:
+        return key, cached
+
+    loop = asyncio.get_running_loop()
+    try:
+        png = await loop.run_in_executor(_get_executor(), renderer, *args)
+    except Exception as e:
+        logger.error(f"Error rendering chart for {entity}: {e}")
+        return None, None
+
+    _chart_cache.set(key, png)
+    return key, png
+
+
+def remember_file_id(key, message):
+    """Replace cached PNG bytes with the Telegram file_id so repeated views skip the upload"""
+    if key is None or message is None or not getattr(message, "photo", None):
+        return
+    _chart_cache.set(key, message.photo[-1].file_id)
@@ -0,0 +1,49 @@
+"""
+Concurrency helpers for long-running bulk jobs against the panel API
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit that adapts to the panel: halves on failure and grows by one
+    after `limit` consecutive successes (AIMD), never exceeding `max_limit`.
+    Use as `async with limiter:` around a request, then call `record(ok)`.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1):
+        self.max_limit = max(max_limit, min_limit)
+        self.min_limit = min_limit
+        self.limit = self.max_limit
+        self._active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+        return False
+
+    def record(self, ok: bool):
+        """Adjust the limit after a request finished"""
+        if ok:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self._successes = 0
+        else:
+            previous = self.limit
+            self.limit = max(self.min_limit, self.limit // 2)
+            self._successes = 0
+            if self.limit != previous:
+                logger.info(f"Reducing concurrency from {previous} to {self.limit} after a failed request")
@@ -0,0 +1,63 @@
+"""
+Per-invocation deadlines: panel requests made by a handler trim their timeouts and retries to what is left
+"""
+import asyncio
+import contextvars
+import logging
+from contextlib import contextmanager
+from functools import wraps
+
+from modules.config import HANDLER_DEADLINE
+
+logger = logging.getLogger(__name__)
+
+# Момент (по часам event loop), к которому запросы к панели должны завершиться; None — без ограничения
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Requests inside the block must finish within `seconds`; a nested scope can only shorten the deadline"""
+    deadline = asyncio.get_running_loop().time() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def without_deadline():
+    """Lift the deadline inside the block, for shared reads of the whole user base that cannot fit one tap"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    """Loop time by which requests must finish, or None"""
+    return _deadline.get()
+
+
+def remaining():
+    """Seconds left until the deadline, or None when there is none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - asyncio.get_running_loop().time()
+
+
+def with_deadline(callback, seconds=None):
+    """Wrap a handler callback so each invocation runs under a deadline (HANDLER_DEADLINE by default; 0 disables)"""
+    seconds = HANDLER_DEADLINE if seconds is None else seconds
+    if not seconds:
+        return callback
+
+    @wraps(callback)
+    async def wrapped(update, context, *args, **kwargs):
+        with deadline_scope(seconds):
+            return await callback(update, context, *args, **kwargs)
+    return wrapped
@@ -0,0 +1,183 @@
+"""
+Streaming export of users, nodes and hosts to gzip-compressed CSV or JSONL files
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import tempfile
+from contextlib import aclosing
+from datetime import datetime
+
+from modules.api.client import APIStreamError
+from modules.api.users import UserAPI
+from modules.api.nodes import NodeAPI
+from modules.api.hosts import HostAPI
+from modules.config import EXPORT_PAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+# Колонки по умолчанию; вложенные поля указываются через точку (lastConnectedNode.nodeName)
+EXPORT_COLUMNS = {
+    "users": [
+        "uuid", "shortUuid", "username", "status", "usedTrafficBytes", "trafficLimitBytes",
+        "trafficLimitStrategy", "expireAt", "onlineAt", "telegramId", "email", "tag",
+        "hwidDeviceLimit", "createdAt", "subscriptionUrl"
+    ],
+    "nodes": [
+        "uuid", "name", "address", "port", "countryCode", "isConnected", "isDisabled",
+        "usersOnline", "trafficUsedBytes", "trafficLimitBytes", "xrayVersion", "nodeVersion"
+    ],
+    "hosts": [
+        "uuid", "remark", "address", "port", "sni", "host", "path", "securityLayer",
+        "isDisabled", "isHidden", "tag"
+    ],
+}
+
+
+class ExportError(Exception):
+    """Raised when export arguments are invalid or the panel cannot be read"""
+
+
+def parse_export_args(args):
+    """
+    Parse `/export <users|nodes|hosts> [csv|jsonl] [columns=a,b] [field=value,...]`.
+    Returns (entity, fmt, columns, filters) where filters maps a field to allowed values.
+    """
+    if not args:
+        raise ExportError("Укажите что экспортировать: users, nodes или hosts")
+
+    entity = args[0].lower()
+    if entity not in EXPORT_COLUMNS:
+        raise ExportError(f"Неизвестный тип экспорта: {args[0]}")
+
+    fmt = "csv"
+    columns = list(EXPORT_COLUMNS[entity])
+    filters = {}
+    for arg in args[1:]:
+        if arg.lower() in EXPORT_FORMATS:
+            fmt = arg.lower()
+            continue
+        key, sep, value = arg.partition("=")
+        if not sep or not key or not value:
+            raise ExportError(f"Не удалось разобрать параметр: {arg}")
+        values = [item.strip() for item in value.split(",") if item.strip()]
+        if key == "columns":
+            columns = values
+        else:
+            filters[key] = {item.lower() for item in values}
+    return entity, fmt, columns, filters
+
+
+def _pluck(item, column):
+    value = item
+    for part in column.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _matches(item, filters):
+    for key, allowed in filters.items():
+        value = _pluck(item, key)
+        if value is None or str(value).lower() not in allowed:
+            return False
+    return True
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+class _RowWriter:
+    """Write rows into a gzip text stream one at a time"""
+
+    def __init__(self, stream, fmt, columns):
+        self.stream = stream
+        self.fmt = fmt
+        self.columns = columns
+        self.count = 0
+        if fmt == "csv":
+            self._csv = csv.writer(stream)
+            self._csv.writerow(columns)
+
+    def write(self, item):
+        if self.fmt == "csv":
+            self._csv.writerow([_csv_value(_pluck(item, column)) for column in self.columns])
+        else:
+            row = {column: _pluck(item, column) for column in self.columns}
+            self.stream.write(json.dumps(row, ensure_ascii=False, default=str))
+            self.stream.write("\n")
+        self.count += 1
+
+
+async def _iter_items(entity, meta):
+    """Yield entities one at a time; meta["total"] is filled in once the panel reports it"""
+    if entity == "users":
+        # Пользователи разбираются прямо из потока ответа — в памяти только текущая запись
+        try:
+            async for user in UserAPI.stream_users(EXPORT_PAGE_SIZE, envelope=meta):
+                yield user
+        except APIStreamError as e:
+            raise ExportError(f"Ошибка получения пользователей: {e}") from e
+        return
+
+    fetch = NodeAPI.get_all_nodes if entity == "nodes" else HostAPI.get_all_hosts
+    items = await fetch()
+    if items is None:
+        raise ExportError(f"Ошибка получения данных: {entity}")
+    if isinstance(items, dict):
+        items = items.get(entity) or []
+    meta["total"] = len(items)
+    for item in items:
+        yield item
+
+
+def export_filename(entity, fmt):
+    """File name shown to the admin in Telegram"""
+    return f"{entity}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}.gz"
+
+
+async def export_to_file(entity, fmt, columns, filters, progress=None):
+    """
+    Stream entities one by one into a temporary gzip file.
+    `progress(processed, total)` is awaited after every EXPORT_PAGE_SIZE entities and at the end.
+    Returns (path, rows_written); the caller removes the file after sending it.
+    """
+    handle, path = tempfile.mkstemp(prefix=f"export_{entity}_", suffix=f".{fmt}.gz")
+    os.close(handle)
+    processed = 0
+    meta = {}
+    try:
+        with gzip.open(path, "wb") as raw:
+            stream = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+            writer = _RowWriter(stream, fmt, columns)
+            # aclosing: при отмене задания поток ответа панели закрывается сразу, а не сборщиком мусора
+            async with aclosing(_iter_items(entity, meta)) as items:
+                async for item in items:
+                    if _matches(item, filters):
+                        writer.write(item)
+                    processed += 1
+                    if processed % EXPORT_PAGE_SIZE == 0:
+                        stream.flush()
+                        if progress is not None:
+                            await progress(processed, meta.get("total", processed))
+            stream.flush()
+            if progress is not None:
+                await progress(processed, meta.get("total", processed))
+            stream.detach()
+    except BaseException:
+        os.unlink(path)
+        raise
+
+    logger.info(f"Exported {writer.count} of {processed} {entity} to {path}")
+    return path, writer.count
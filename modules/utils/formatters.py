@@ -1,6 +1,7 @@
 from datetime import datetime
 
 import logging
+import time
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -54,6 +55,35 @@ def format_bytes(bytes_value):
         bytes_value /= 1024.0
     return f"{bytes_value:.2f} PB"
 
+def format_age(seconds):
+    """Format data age for display, e.g. 'обновлено 40 с назад'"""
+    if seconds is None or seconds < 5:
+        return "обновлено только что"
+    if seconds < 60:
+        return f"обновлено {int(seconds)} с назад"
+    if seconds < 3600:
+        return f"обновлено {int(seconds // 60)} мин назад"
+    return f"обновлено {int(seconds // 3600)} ч назад"
+
+def parse_bytes(value):
+    """Parse a human-readable size such as '12.5 GiB' back to bytes"""
+    if isinstance(value, (int, float)):
+        return value
+    if not value:
+        return 0
+    
+    multipliers = {
+        'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4, 'PB': 1024 ** 5,
+        'KIB': 1024, 'MIB': 1024 ** 2, 'GIB': 1024 ** 3, 'TIB': 1024 ** 4, 'PIB': 1024 ** 5
+    }
+    parts = str(value).replace(',', '.').split()
+    try:
+        number = float(parts[0])
+    except (ValueError, IndexError):
+        return 0
+    unit = parts[1].upper() if len(parts) > 1 else 'B'
+    return number * multipliers.get(unit, 1)
+
 def escape_markdown(text):
     """Escape Markdown special characters for Telegram (simplified for text, not URLs)"""
     if text is None:
@@ -409,3 +439,62 @@ def format_inbound_details(inbound):
         message += f"  • Отключенные: {inbound['nodes']['disabled']}\n"
     
     return message
+
+def format_node_metrics_dashboard(dashboard, max_tags=3, max_length=3900):
+    """Format node metrics dashboard for display"""
+    nodes = dashboard.get('nodes') or []
+
+    total_online = sum(node['usersOnline'] for node in nodes)
+    total_inbound = sum(node['inbound_total'] for node in nodes)
+    total_outbound = sum(node['outbound_total'] for node in nodes)
+
+    header = f"🖥️ *Метрики серверов* ({len(nodes)})\n"
+    if dashboard.get('sampled_at'):
+        header += f"🕒 _{format_age(time.time() - dashboard['sampled_at'])}_\n"
+    header += "\n"
+    header += f"👥 Онлайн: {total_online}\n"
+    header += f"📥 Inbound: {format_bytes(total_inbound)}\n"
+    header += f"📤 Outbound: {format_bytes(total_outbound)}\n\n"
+
+    def format_rate(rate):
+        if rate is None:
+            return ""
+        return f" ({format_bytes(rate)}/с)" if rate > 0 else " (0 B/с)"
+
+    def format_tags(stats):
+        top = sorted(
+            stats,
+            key=lambda s: s['upload'] + s['download'],
+            reverse=True
+        )[:max_tags]
+        lines = ""
+        for item in top:
+            lines += (
+                f"      · {escape_markdown(item['tag'])}: "
+                f"↑{format_bytes(item['upload'])} ↓{format_bytes(item['download'])}\n"
+            )
+        return lines
+
+    blocks = []
+    for node in nodes:
+        block = f"{node['countryEmoji']} *{escape_markdown(node['nodeName'])}* — 👥 {node['usersOnline']}\n"
+        block += f"   📥 Inbound: {format_bytes(node['inbound_total'])}{format_rate(node['inbound_rate'])}\n"
+        block += format_tags(node['inboundsStats'])
+        block += f"   📤 Outbound: {format_bytes(node['outbound_total'])}{format_rate(node['outbound_rate'])}\n"
+        block += format_tags(node['outboundsStats'])
+        if node.get('today_bytes') is not None:
+            block += f"   📅 Сегодня: {format_bytes(node['today_bytes'])}"
+            if node.get('day_change') is not None:
+                arrow = "📈" if node['day_change'] >= 0 else "📉"
+                block += f" {arrow} {node['day_change']:+.1f}% к вчера"
+            block += "\n"
+        blocks.append(block + "\n")
+
+    message = header
+    for index, block in enumerate(blocks):
+        if len(message) + len(block) > max_length:
+            message += f"…и ещё {len(blocks) - index} серверов"
+            break
+        message += block
+
+    return message
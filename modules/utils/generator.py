@@ -0,0 +1,144 @@
+"""
+Mass generation of accounts from USER_TEMPLATES
+"""
+import asyncio
+import csv
+import logging
+import os
+import random
+import string
+import tempfile
+from datetime import datetime, timedelta
+
+from modules.api.users import USERNAME_PATTERN, UserAPI
+from modules.config import IMPORT_CONCURRENCY
+from modules.utils.concurrency import AdaptiveLimiter
+from modules.utils.importer import create_user_with_retries
+from modules.utils.presets import apply_template_to_user_data
+from modules.utils.user_index import load_usernames
+
+logger = logging.getLogger(__name__)
+
+GENERATE_MAX_COUNT = 5000
+REPORT_COLUMNS = ["username", "result", "uuid", "subscriptionUrl"]
+
+
+class GenerateError(Exception):
+    """Raised when generation parameters are invalid"""
+
+
+def _random_suffix(length=6):
+    return "".join(random.choices(string.ascii_lowercase + string.digits, k=length))
+
+
+def expand_usernames(pattern, count, existing, start=1):
+    """
+    Produce `count` free usernames from a pattern.
+    `{n}` is replaced by a zero-padded sequence number and `{rand}` by random characters;
+    without placeholders `_{n}` is appended. Names already in `existing` are skipped.
+    """
+    if "{n}" not in pattern and "{rand}" not in pattern:
+        pattern += "_{n}"
+    width = len(str(start + count * 2))
+    usernames = []
+    number = start
+    # Ограничиваем число попыток, чтобы неудачный шаблон не зациклился на занятых именах
+    attempts_left = count * 10
+    while len(usernames) < count and attempts_left > 0:
+        attempts_left -= 1
+        username = pattern.replace("{n}", str(number).zfill(width)).replace("{rand}", _random_suffix())
+        number += 1
+        if not USERNAME_PATTERN.match(username):
+            raise GenerateError(
+                f"Имя «{username}» не подходит: допустимы латиница, цифры, _ и -, длина 6–34 символа"
+            )
+        if username in existing:
+            continue
+        existing.add(username)
+        usernames.append(username)
+    if len(usernames) < count:
+        raise GenerateError("Не удалось подобрать свободные имена по этому шаблону")
+    return usernames
+
+
+def parse_generate_args(text):
+    """Parse `<count> <pattern> [days]` entered by the admin"""
+    parts = text.split()
+    if len(parts) < 2:
+        raise GenerateError("Укажите количество и шаблон имени, например: `100 trial_{n} 7`")
+    try:
+        count = int(parts[0])
+        days = int(parts[2]) if len(parts) > 2 else None
+    except ValueError:
+        raise GenerateError("Количество и срок должны быть числами")
+    if not 1 <= count <= GENERATE_MAX_COUNT:
+        raise GenerateError(f"Количество должно быть от 1 до {GENERATE_MAX_COUNT}")
+    if days is not None and days <= 0:
+        raise GenerateError("Срок действия должен быть больше нуля")
+    return count, parts[1], days
+
+
+def build_generation_base(template_name, count, pattern, days=None):
+    """
+    Create-user payload shared by all generated accounts; checks the template and the name
+    pattern up front so mistakes are reported before a job is queued. Raises GenerateError.
+    """
+    base = apply_template_to_user_data({}, template_name)
+    if days:
+        base["expireAt"] = (datetime.now() + timedelta(days=days)).strftime("%Y-%m-%dT23:59:59.000Z")
+    error = UserAPI.validate_user_data(dict(base, username=expand_usernames(pattern, count, set())[0]))
+    if error:
+        raise GenerateError(error)
+    return base
+
+
+async def plan_generation(template_name, count, pattern, days=None):
+    """Payload and `count` free usernames for a generation run: {"base": ..., "usernames": [...]}"""
+    base = build_generation_base(template_name, count, pattern, days)
+    existing = await load_usernames()
+    return {"base": base, "usernames": expand_usernames(pattern, count, existing)}
+
+
+async def generate_accounts(base, usernames, created=None, progress=None):
+    """
+    Create users named `usernames` from the `base` payload concurrently.
+    `created` maps usernames already created by an earlier run to [uuid, subscriptionUrl];
+    they are not created again and new accounts are added to it as they complete.
+    `progress(done, total)` is awaited as creations complete.
+    Returns (report_path, created, failed); the report is a CSV with subscription URLs.
+    """
+    created = {} if created is None else created
+    limiter = AdaptiveLimiter(IMPORT_CONCURRENCY)
+
+    async def create(username):
+        user, _ = await create_user_with_retries(limiter, dict(base, username=username))
+        return username, user
+
+    pending = [username for username in usernames if username not in created]
+    failed = []
+    tasks = [asyncio.create_task(create(username)) for username in pending]
+    try:
+        for done, task in enumerate(asyncio.as_completed(tasks), start=len(usernames) - len(pending) + 1):
+            username, user = await task
+            if user:
+                created[username] = [user.get("uuid", ""), user.get("subscriptionUrl", "")]
+            else:
+                failed.append(username)
+            if progress is not None:
+                await progress(done, len(usernames))
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    handle, report_path = tempfile.mkstemp(prefix="generated_", suffix=".csv")
+    with os.fdopen(handle, "w", encoding="utf-8", newline="") as target:
+        writer = csv.writer(target)
+        writer.writerow(REPORT_COLUMNS)
+        for username in usernames:
+            if username in created:
+                writer.writerow([username, "created", *created[username]])
+            else:
+                writer.writerow([username, "failed", "", ""])
+
+    logger.info(f"Generated {len(created)} users, {len(failed)} failed")
+    return report_path, len(created), len(failed)
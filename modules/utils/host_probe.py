@@ -0,0 +1,135 @@
+"""
+Concurrent TCP/TLS reachability checks for host endpoints
+"""
+import asyncio
+import logging
+import ssl
+import time
+
+from modules.config import HOST_PROBE_CONCURRENCY, HOST_PROBE_TIMEOUT, HOST_PROBE_TTL
+from modules.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_probe_cache = TTLCache(HOST_PROBE_TTL, max_entries=5000)
+
+
+def _tls_context():
+    # Проверяем доступность, а не цепочку сертификатов: у REALITY и самоподписанных хостов она не сойдётся
+    context = ssl.create_default_context()
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_TLS_CONTEXT = _tls_context()
+
+
+def probe_target(host):
+    """Return the (address, port, tls, sni) endpoint to check for a host entry"""
+    security = host.get("securityLayer") or "DEFAULT"
+    sni = host.get("sni") or None
+    tls = security == "TLS" or (security == "DEFAULT" and (bool(sni) or host.get("port") == 443))
+    return host.get("address"), host.get("port"), tls, sni
+
+
+async def probe_endpoint(address, port, tls=False, sni=None, timeout=None):
+    """
+    Open a TCP connection and, if requested, complete a TLS handshake, both within one
+    `timeout` budget. Returns {"ok", "connect_ms", "tls_ms", "error", "checked_at"}.
+    """
+    timeout = timeout or HOST_PROBE_TIMEOUT
+    result = {"ok": False, "connect_ms": None, "tls_ms": None, "error": None, "checked_at": time.time()}
+    writer = None
+    deadline = time.perf_counter() + timeout
+    try:
+        started = time.perf_counter()
+        _, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+        result["connect_ms"] = (time.perf_counter() - started) * 1000
+
+        if tls:
+            started = time.perf_counter()
+            await asyncio.wait_for(
+                writer.start_tls(_TLS_CONTEXT, server_hostname=sni or address), max(deadline - started, 0.01)
+            )
+            result["tls_ms"] = (time.perf_counter() - started) * 1000
+        result["ok"] = True
+    except asyncio.TimeoutError:
+        result["error"] = "timeout"
+    except ssl.SSLError as e:
+        result["error"] = f"TLS: {e.reason or e}"
+    except OSError as e:
+        result["error"] = e.strerror or str(e)
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        # Не ждём корректного закрытия: зависший хост не должен задерживать проверку
+        if writer is not None:
+            writer.transport.abort()
+    return result
+
+
+def cached_probe(host):
+    """Return the cached result for a host's endpoint or None"""
+    return _probe_cache.get(probe_target(host))
+
+
+async def probe_hosts(hosts, force=False, concurrency=None):
+    """
+    Check all enabled hosts concurrently under a semaphore; hosts sharing an endpoint are probed
+    once and fresh cached results are reused unless `force`. Returns {host_uuid: result}.
+    """
+    semaphore = asyncio.Semaphore(concurrency or HOST_PROBE_CONCURRENCY)
+    targets = {
+        host["uuid"]: probe_target(host) for host in hosts
+        if not host.get("isDisabled") and host.get("address") and host.get("port")
+    }
+    pending = {target for target in targets.values() if force or _probe_cache.get(target) is None}
+
+    async def probe(target):
+        async with semaphore:
+            result = await probe_endpoint(*target)
+        _probe_cache.set(target, result)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(probe(target) for target in pending))
+    if pending:
+        logger.info(f"Probed {len(pending)} host endpoints in {time.perf_counter() - started:.2f}s")
+    return {uuid: _probe_cache.get(target) for uuid, target in targets.items()}
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def latency_summary(results):
+    """Return reachability counts and p50/p90/p99 of connect and TLS latency in ms"""
+    results = [result for result in results if result]
+    summary = {"total": len(results), "ok": sum(1 for result in results if result["ok"])}
+    for key in ("connect_ms", "tls_ms"):
+        values = [result[key] for result in results if result.get(key) is not None]
+        summary[key] = {p: _percentile(values, p) for p in (50, 90, 99)} if values else None
+    return summary
+
+
+def format_probe(result):
+    """One-line status of a probe result"""
+    if result is None:
+        return "❔ не проверялся"
+    if not result["ok"]:
+        return f"⚠️ недоступен: {result['error']}"
+    line = f"📶 TCP {result['connect_ms']:.0f} мс"
+    if result.get("tls_ms") is not None:
+        line += f", TLS {result['tls_ms']:.0f} мс"
+    return line
+
+
+def format_latency_summary(summary):
+    line = f"📶 Доступно: {summary['ok']}/{summary['total']}"
+    for key, label in (("connect_ms", "TCP"), ("tls_ms", "TLS")):
+        if summary[key]:
+            p = summary[key]
+            line += f"\n{label} p50/p90/p99: {p[50]:.0f}/{p[90]:.0f}/{p[99]:.0f} мс"
+    return line
@@ -0,0 +1,291 @@
+"""
+Bulk user import from CSV, JSON or JSONL documents with a resumable checkpoint
+"""
+import asyncio
+import csv
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from modules.api.users import UserAPI
+from modules.config import IMPORT_CONCURRENCY, IMPORT_RETRIES, IMPORT_CHECKPOINT_DIR
+from modules.utils.concurrency import AdaptiveLimiter
+from modules.utils.user_index import load_usernames
+
+logger = logging.getLogger(__name__)
+
+# Поля тела POST /users, которые принимаются из файла
+STRING_FIELDS = (
+    "username", "status", "shortUuid", "trojanPassword", "vlessUuid", "ssPassword",
+    "trafficLimitStrategy", "tag", "email"
+)
+INTEGER_FIELDS = ("trafficLimitBytes", "telegramId", "hwidDeviceLimit")
+DATE_FIELDS = ("expireAt", "createdAt", "lastTrafficResetAt")
+
+REPORT_COLUMNS = ["row", "username", "result", "uuid", "subscriptionUrl", "error"]
+CHECKPOINT_SAVE_INTERVAL = 2.0
+
+
+def parse_date(value):
+    """Accept ISO timestamps as well as plain YYYY-MM-DD dates"""
+    value = str(value).strip()
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}")
+    if parsed.tzinfo is None and len(value) == 10:
+        parsed = parsed.replace(hour=23, minute=59, second=59)
+    elif parsed.tzinfo is not None:
+        # Смещение переводим в UTC, иначе «Z» в конце сдвинет время на величину смещения
+        parsed = parsed.astimezone(timezone.utc)
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def row_to_user_data(row):
+    """Convert a CSV/JSON row into a create-user payload; raises ValueError on bad values"""
+    if not isinstance(row, dict):
+        raise ValueError("Row is not an object")
+    data = {}
+    for field in STRING_FIELDS:
+        value = row.get(field)
+        if value not in (None, ""):
+            data[field] = str(value).strip()
+    for field in INTEGER_FIELDS:
+        value = row.get(field)
+        if value not in (None, ""):
+            try:
+                data[field] = int(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid {field}: {value}")
+    for field in DATE_FIELDS:
+        value = row.get(field)
+        if value not in (None, ""):
+            data[field] = parse_date(value)
+
+    squads = row.get("activeInternalSquads")
+    if isinstance(squads, str):
+        squads = [item.strip() for item in squads.split(",") if item.strip()]
+    if squads:
+        data["activeInternalSquads"] = list(squads)
+
+    data.setdefault("trafficLimitStrategy", "NO_RESET")
+    return data
+
+
+class RowParseError(ValueError):
+    """Yielded by iter_rows in place of a JSONL line that is not valid JSON"""
+
+
+def detect_format(path):
+    """
+    Return "json", "jsonl" or "csv" for an import file. A JSON document that is not
+    an array of rows raises ValueError, so it can be rejected before the import is queued.
+    """
+    with open(path, "r", encoding="utf-8-sig") as source:
+        first = source.read(1)
+        while first and first.isspace():
+            first = source.read(1)
+        if first == "[":
+            return "json"
+        if first != "{":
+            return "csv"
+
+        source.seek(0)
+        line = next((line for line in source if line.strip()), "")
+        try:
+            json.loads(line)
+            return "jsonl"
+        except ValueError:
+            pass
+        # Первая строка не разбирается: это либо многострочный объект, либо испорченный JSONL
+        source.seek(0)
+        try:
+            json.load(source)
+        except ValueError:
+            return "jsonl"
+    raise ValueError("JSON document must be an array of users")
+
+
+def iter_rows(path):
+    """
+    Yield (row number, row dict) from a CSV, JSON array or JSONL file; a JSONL line
+    that cannot be parsed is yielded as a RowParseError so only that row fails
+    """
+    file_format = detect_format(path)
+    with open(path, "r", encoding="utf-8-sig") as source:
+        if file_format == "json":
+            for index, row in enumerate(json.load(source), start=1):
+                yield index, row
+        elif file_format == "jsonl":
+            for index, line in enumerate(source, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    row = RowParseError(f"Invalid JSON: {e}")
+                yield index, row
+        else:
+            # Номер строки с учётом заголовка, чтобы совпадал с тем, что видно в редакторе
+            for index, row in enumerate(csv.DictReader(source), start=2):
+                yield index, row
+
+
+def file_checksum(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(65536), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImportCheckpoint:
+    """Per-file record of finished rows, saved atomically so a crashed import can resume"""
+
+    def __init__(self, key):
+        self.path = os.path.join(IMPORT_CHECKPOINT_DIR, f"{key}.json")
+        self.results = {}
+        self._saved_at = 0.0
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as source:
+                    self.results = {int(row): result for row, result in json.load(source).items()}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable import checkpoint {self.path}: {e}")
+
+    @property
+    def resumed(self):
+        return bool(self.results)
+
+    def add(self, row, result):
+        self.results[row] = result
+        if time.monotonic() - self._saved_at >= CHECKPOINT_SAVE_INTERVAL:
+            self.save()
+
+    def save(self):
+        os.makedirs(IMPORT_CHECKPOINT_DIR, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as target:
+            json.dump(self.results, target, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+        self._saved_at = time.monotonic()
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def _result(row, username, outcome, user=None, error=""):
+    user = user or {}
+    return [row, username, outcome, user.get("uuid", ""), user.get("subscriptionUrl", ""), error]
+
+
+async def create_user_with_retries(limiter, data):
+    """Create one user, backing off and shrinking concurrency when the panel struggles"""
+    for attempt in range(IMPORT_RETRIES):
+        async with limiter:
+            user = await UserAPI.create_user(dict(data))
+        limiter.record(bool(user))
+        if user:
+            return user, ""
+
+        # Ответ мог потеряться после успешного создания — проверяем, прежде чем повторять
+        existing = await UserAPI.get_user_by_username(data["username"])
+        if existing:
+            return existing, ""
+        if attempt < IMPORT_RETRIES - 1:
+            await asyncio.sleep(2 ** attempt)
+    return None, "API error"
+
+
+async def run_import(path, progress=None):
+    """
+    Validate and create users from `path` through a bounded pipeline.
+    `progress(done, total)` is awaited periodically.
+    Returns (report_path, counts, resumed) where counts maps outcome to number of rows.
+    """
+    checkpoint = ImportCheckpoint(file_checksum(path))
+    resumed = checkpoint.resumed
+    existing = await load_usernames()
+    limiter = AdaptiveLimiter(IMPORT_CONCURRENCY)
+    queue = asyncio.Queue(maxsize=IMPORT_CONCURRENCY * 4)
+    total = 0
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                row, data = item
+                try:
+                    user, error = await create_user_with_retries(limiter, data)
+                except Exception as e:
+                    logger.error(f"Error importing row {row}: {e}")
+                    user, error = None, str(e)
+                outcome = "created" if user else "failed"
+                checkpoint.add(row, _result(row, data["username"], outcome, user, error))
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(worker()) for _ in range(IMPORT_CONCURRENCY)]
+    try:
+        seen = set()
+        for row, raw in iter_rows(path):
+            total += 1
+            if row in checkpoint.results:
+                continue
+            try:
+                if isinstance(raw, RowParseError):
+                    raise raw
+                data = row_to_user_data(raw)
+                error = UserAPI.validate_user_data(data)
+            except ValueError as e:
+                data, error = {}, str(e)
+            username = data.get("username") or (raw.get("username") if isinstance(raw, dict) else "")
+
+            if error:
+                checkpoint.add(row, _result(row, username, "invalid", error=error))
+            elif username in existing:
+                checkpoint.add(row, _result(row, username, "exists"))
+            elif username in seen:
+                checkpoint.add(row, _result(row, username, "duplicate"))
+            else:
+                seen.add(username)
+                await queue.put((row, data))
+
+            if progress is not None:
+                await progress(len(checkpoint.results), total)
+
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        checkpoint.save()
+
+    if progress is not None:
+        await progress(len(checkpoint.results), total)
+
+    report_path = write_report(checkpoint.results)
+    counts = {}
+    for result in checkpoint.results.values():
+        counts[result[2]] = counts.get(result[2], 0) + 1
+    checkpoint.remove()
+    return report_path, counts, resumed
+
+
+def write_report(results):
+    """Write import results ordered by row number into a temporary CSV file"""
+    handle, report_path = tempfile.mkstemp(prefix="import_report_", suffix=".csv")
+    with os.fdopen(handle, "w", encoding="utf-8", newline="") as target:
+        writer = csv.writer(target)
+        writer.writerow(REPORT_COLUMNS)
+        for row in sorted(results):
+            writer.writerow(results[row])
+    return report_path
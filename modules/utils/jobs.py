@@ -0,0 +1,281 @@
+"""
+Background jobs for long-running bulk work: durable records, checkpoints,
+a bounded worker pool and throttled progress messages with cancel/resume buttons
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid as uuid_lib
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from modules.config import JOBS_DIR, JOB_WORKERS, JOB_PROGRESS_INTERVAL
+from modules.utils.scheduler import BULK, request_priority
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, INTERRUPTED = (
+    "queued", "running", "done", "failed", "cancelled", "interrupted"
+)
+RESUMABLE_STATUSES = (FAILED, CANCELLED, INTERRUPTED)
+
+# Завершённые записи храним неделю, чтобы каталог не рос бесконечно
+FINISHED_RETENTION = 7 * 24 * 3600
+
+
+class JobCancelled(Exception):
+    """Raised inside a runner when the admin pressed cancel"""
+
+
+class Job:
+    """Handle passed to a runner: parameters, checkpoint and progress reporting"""
+
+    def __init__(self, record, manager):
+        self.record = record
+        self.manager = manager
+        self.cancel_requested = False
+        self._reported_at = 0.0
+
+    @property
+    def id(self):
+        return self.record["id"]
+
+    @property
+    def params(self):
+        return self.record["params"]
+
+    @property
+    def checkpoint(self):
+        return self.record.get("checkpoint") or {}
+
+    def save_checkpoint(self, checkpoint):
+        """Remember how far the job got; persisted together with the next progress update"""
+        self.record["checkpoint"] = checkpoint
+
+    def check_cancelled(self):
+        if self.cancel_requested:
+            raise JobCancelled()
+
+    async def progress(self, done, total):
+        """Report progress; persists the record and edits the message at most every JOB_PROGRESS_INTERVAL"""
+        self.record["progress"] = [done, total]
+        self.check_cancelled()
+        now = time.monotonic()
+        if now - self._reported_at < JOB_PROGRESS_INTERVAL:
+            return
+        self._reported_at = now
+        self.manager.persist(self.record)
+        await self.manager.render(self.record)
+
+
+class JobManager:
+    """Queue of durable jobs executed by JOB_WORKERS background tasks"""
+
+    def __init__(self):
+        self.runners = {}
+        self.records = {}
+        self.active = {}
+        self.bot = None
+        self._queue = asyncio.Queue()
+        self._workers = []
+
+    def register(self, kind, title):
+        """Decorator registering `async def runner(job) -> result dict` for a job kind.
+        The result may contain `text`, `document` (a file path) and `filename`."""
+        def decorator(runner):
+            self.runners[kind] = (title, runner)
+            return runner
+        return decorator
+
+    def _path(self, job_id):
+        return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+    def persist(self, record):
+        record["updated_at"] = time.time()
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        path = self._path(record["id"])
+        with open(f"{path}.tmp", "w", encoding="utf-8") as target:
+            json.dump(record, target, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    async def start(self, bot):
+        """Load stored jobs, mark unfinished ones as interrupted and start the workers"""
+        self.bot = bot
+        if os.path.isdir(JOBS_DIR):
+            for name in os.listdir(JOBS_DIR):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(JOBS_DIR, name), "r", encoding="utf-8") as source:
+                        record = json.load(source)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Skipping unreadable job record {name}: {e}")
+                    continue
+
+                if record["status"] in (QUEUED, RUNNING):
+                    record["status"] = INTERRUPTED
+                    self.persist(record)
+                    await self.render(record)
+                elif record["status"] == DONE and time.time() - record.get("updated_at", 0) > FINISHED_RETENTION:
+                    os.unlink(os.path.join(JOBS_DIR, name))
+                    continue
+                self.records[record["id"]] = record
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(JOB_WORKERS)]
+        logger.info(f"Job manager started with {JOB_WORKERS} workers, {len(self.records)} stored jobs")
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, kind, params, chat_id):
+        """Create a durable job, post its progress message and queue it; returns the job id"""
+        if kind not in self.runners:
+            raise ValueError(f"Unknown job kind: {kind}")
+        record = {
+            "id": uuid_lib.uuid4().hex[:12],
+            "kind": kind,
+            "params": params,
+            "status": QUEUED,
+            "progress": [0, 0],
+            "checkpoint": {},
+            "chat_id": chat_id,
+            "message_id": None,
+            "created_at": time.time(),
+        }
+        self.records[record["id"]] = record
+        await self.render(record)
+        self.persist(record)
+        await self._queue.put(record["id"])
+        return record["id"]
+
+    async def cancel(self, job_id):
+        record = self.records.get(job_id)
+        if record is None:
+            return False
+        if record["id"] in self.active:
+            self.active[record["id"]].cancel_requested = True
+            return True
+        if record["status"] == QUEUED:
+            record["status"] = CANCELLED
+            self.persist(record)
+            await self.render(record)
+            return True
+        return False
+
+    async def resume(self, job_id):
+        """Queue a cancelled, failed or interrupted job again; it continues from its checkpoint"""
+        record = self.records.get(job_id)
+        if record is None or record["status"] not in RESUMABLE_STATUSES:
+            return False
+        record["status"] = QUEUED
+        record.pop("error", None)
+        self.persist(record)
+        await self.render(record)
+        await self._queue.put(job_id)
+        return True
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            record = self.records.get(job_id)
+            if record is None or record["status"] != QUEUED:
+                continue
+            await self._run(record)
+
+    async def _run(self, record):
+        title, runner = self.runners[record["kind"]]
+        job = Job(record, self)
+        self.active[record["id"]] = job
+        record["status"] = RUNNING
+        self.persist(record)
+        await self.render(record)
+        try:
+            # Запросы задания (и созданных им задач) уступают очередь нажатиям администратора
+            with request_priority(BULK):
+                result = await runner(job) or {}
+            record["status"] = DONE
+            record["result"] = result.get("text", "")
+            if result.get("document"):
+                await self._send_document(record, result)
+        except JobCancelled:
+            record["status"] = CANCELLED
+        except Exception as e:
+            logger.error(f"Job {record['id']} ({record['kind']}) failed: {e}", exc_info=True)
+            record["status"] = FAILED
+            record["error"] = str(e)
+        finally:
+            self.active.pop(record["id"], None)
+            self.persist(record)
+            await self.render(record)
+
+    async def _send_document(self, record, result):
+        try:
+            with open(result["document"], "rb") as document:
+                await self.bot.send_document(
+                    chat_id=record["chat_id"],
+                    document=document,
+                    filename=result.get("filename") or os.path.basename(result["document"])
+                )
+        finally:
+            os.unlink(result["document"])
+
+    def _message(self, record):
+        title = self.runners.get(record["kind"], (record["kind"], None))[0]
+        done, total = record.get("progress") or [0, 0]
+        status = record["status"]
+        keyboard = None
+
+        if status == QUEUED:
+            text = f"🕓 {title}: в очереди"
+            keyboard = [[InlineKeyboardButton("❌ Отменить", callback_data=f"job_cancel_{record['id']}")]]
+        elif status == RUNNING:
+            text = f"⏳ {title}"
+            if total:
+                filled = int(done / total * 10)
+                text += f"\n{'▓' * filled}{'░' * (10 - filled)} {done / total:.0%} ({done}/{total})"
+            keyboard = [[InlineKeyboardButton("❌ Отменить", callback_data=f"job_cancel_{record['id']}")]]
+        elif status == DONE:
+            text = f"✅ {title}: завершено"
+            if record.get("result"):
+                text += f"\n\n{record['result']}"
+        else:
+            labels = {
+                CANCELLED: ("⏹️", "отменено", "▶️ Продолжить"),
+                FAILED: ("❌", f"ошибка: {record.get('error', '')}", "🔁 Повторить"),
+                INTERRUPTED: ("⚠️", "прервано перезапуском бота", "▶️ Продолжить"),
+            }
+            icon, label, button = labels[status]
+            text = f"{icon} {title}: {label}"
+            if total:
+                text += f" ({done}/{total})"
+            keyboard = [[InlineKeyboardButton(button, callback_data=f"job_resume_{record['id']}")]]
+
+        return text, InlineKeyboardMarkup(keyboard) if keyboard else None
+
+    async def render(self, record):
+        """Create or update the job's progress message"""
+        if self.bot is None:
+            return
+        text, reply_markup = self._message(record)
+        try:
+            if record.get("message_id"):
+                await self.bot.edit_message_text(
+                    chat_id=record["chat_id"],
+                    message_id=record["message_id"],
+                    text=text,
+                    reply_markup=reply_markup
+                )
+            else:
+                message = await self.bot.send_message(chat_id=record["chat_id"], text=text, reply_markup=reply_markup)
+                record["message_id"] = message.message_id
+        except Exception as e:
+            # "Message is not modified" и подобные ошибки не должны ронять задачу
+            logger.debug(f"Could not update job message {record['id']}: {e}")
+
+
+job_manager = JobManager()
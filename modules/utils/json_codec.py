@@ -0,0 +1,33 @@
+"""
+JSON decoding for panel responses: orjson when installed, large bodies off the event loop
+"""
+import asyncio
+import json
+
+from modules.config import JSON_OFFLOAD_THRESHOLD
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data):
+    """Decode JSON from bytes with the fastest available decoder"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+async def decode_json(data):
+    """Decode a response body; bodies of JSON_OFFLOAD_THRESHOLD bytes or more are parsed in a worker thread"""
+    if len(data) >= JSON_OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(loads, data)
+    return loads(data)
+
+
+async def feed_stream(parser, chunk):
+    """Feed a chunk of a streamed body to a JsonArrayStream; chunks of JSON_OFFLOAD_THRESHOLD bytes or more are parsed in a worker thread"""
+    if len(chunk) >= JSON_OFFLOAD_THRESHOLD:
+        return await asyncio.to_thread(parser.feed, chunk)
+    return parser.feed(chunk)
@@ -0,0 +1,88 @@
+"""
+Incremental parsing of one array inside a JSON body while the body is still arriving
+"""
+import codecs
+import json
+import re
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class JsonArrayStream:
+    """
+    Parse the items of the array stored under `key` (e.g. {"response": {"users": [...]}})
+    or of a top-level array chunk by chunk. `feed()` returns items as soon as they are
+    complete, so only the unfinished tail of the body is buffered; `close()` returns the
+    rest of the document with the array emptied, keeping fields such as `total`.
+    """
+
+    def __init__(self, key):
+        self._key = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._prefix = ""
+        # prefix -> items -> suffix: до массива, внутри массива, после него
+        self._state = "prefix"
+        self.count = 0
+
+    def feed(self, chunk):
+        """Consume the next bytes of the body and return the items completed by them"""
+        self._buffer += self._text.decode(chunk)
+        if self._state == "prefix":
+            self._find_array()
+        if self._state != "items":
+            return []
+        items = self._read_items()
+        self.count += len(items)
+        return items
+
+    def _find_array(self):
+        stripped = self._buffer.lstrip()
+        if stripped.startswith("["):
+            self._prefix, self._buffer = "[", stripped[1:]
+            self._state = "items"
+            return
+        # Ключ ищем только в обёртке до массива, поэтому совпадение внутри данных невозможно
+        match = self._key.search(self._buffer)
+        if match:
+            self._prefix, self._buffer = self._buffer[:match.end()], self._buffer[match.end():]
+            self._state = "items"
+
+    def _read_items(self):
+        buffer = self._buffer
+        items = []
+        pos = 0
+        while True:
+            pos = _WHITESPACE.match(buffer, pos).end()
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+            if char == ",":
+                pos += 1
+                continue
+            if char == "]":
+                self._state = "suffix"
+                break
+            try:
+                item, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Элемент ещё не дочитан — ждём следующий кусок
+                break
+            if not isinstance(item, (dict, list, str)) and (end == len(buffer) or buffer[end] not in ",] \t\n\r"):
+                # Число или литерал мог оборваться на середине — принимаем его только вместе с разделителем
+                break
+            items.append(item)
+            pos = end
+        self._buffer = buffer[pos:]
+        return items
+
+    def close(self):
+        """Return the document without the array items; raises ValueError on a truncated or malformed body"""
+        self._buffer += self._text.decode(b"", final=True)
+        if self._state == "prefix":
+            # Массива нет (например, ответ с ошибкой) — весь документ и есть обёртка
+            return json.loads(self._buffer)
+        if self._state == "items":
+            raise ValueError(f"JSON body ended inside the array after {self.count} items")
+        return json.loads(self._prefix + self._buffer)
@@ -0,0 +1,131 @@
+"""
+Micro-batching of per-key panel lookups for flows that need many users at once: keys requested
+within a few milliseconds are de-duplicated and fetched in one batch, and within a loader_scope()
+results are reused for the rest of the block
+"""
+import asyncio
+import contextvars
+import logging
+from contextlib import contextmanager
+from functools import wraps
+
+from modules.api.client import RemnaAPI
+from modules.api.users import UserAPI
+from modules.config import LOADER_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# name -> DataLoader для текущего обработчика; None — вне области, результаты не кэшируются
+_scope = contextvars.ContextVar("loader_scope", default=None)
+_shared = {}
+
+
+class DataLoader:
+    """
+    Collect keys passed to `load()` for `window` seconds, then call `batch_fn(keys)` once
+    with the distinct keys; it returns {key: value}. With `cache` the value (or the pending
+    batch) is reused for later loads of the same key; None results are never kept.
+    A `shared` loader serves unrelated callers, so its batches run in an empty context
+    instead of inheriting the deadline and priority of whichever caller came first.
+    """
+
+    def __init__(self, batch_fn, window=None, cache=True, shared=False):
+        self.batch_fn = batch_fn
+        self.window = LOADER_WINDOW if window is None else window
+        self.cache = cache
+        self.shared = shared
+        self._futures = {}
+        self._pending = {}
+        self._timer = None
+        self.batches = 0
+
+    async def load(self, key):
+        future = self._futures.get(key) or self._pending.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            if self.cache:
+                self._futures[key] = future
+            if self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._dispatch)
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys):
+        return await asyncio.gather(*(self.load(key) for key in keys))
+
+    def clear(self, key=None):
+        if key is None:
+            self._futures.clear()
+        else:
+            self._futures.pop(key, None)
+
+    def _dispatch(self):
+        self._timer = None
+        batch, self._pending = self._pending, {}
+        self.batches += 1
+        # Загрузчик области наследует контекст её обработчика (дедлайн и приоритет), общий — нет
+        asyncio.create_task(self._run(batch), context=contextvars.Context() if self.shared else None)
+
+    async def _run(self, batch):
+        try:
+            results = await self.batch_fn(list(batch))
+        except Exception as e:
+            logger.error(f"Batch load of {len(batch)} keys failed: {e}")
+            results = {}
+        for key, future in batch.items():
+            value = results.get(key)
+            if value is None and self._futures.get(key) is future:
+                # Ошибку не кэшируем: следующий load() этого ключа повторит запрос
+                del self._futures[key]
+            if not future.done():
+                future.set_result(value)
+
+
+@contextmanager
+def loader_scope():
+    """Share loaders, and their cached results, between all lookups inside the block"""
+    token = _scope.set({})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def with_loader_scope(callback):
+    """Wrap a handler callback so each invocation gets its own loader scope"""
+    @wraps(callback)
+    async def wrapped(update, context, *args, **kwargs):
+        with loader_scope():
+            return await callback(update, context, *args, **kwargs)
+    return wrapped
+
+
+def get_loader(name, batch_fn):
+    """Loader `name` of the current scope; outside a scope a shared loader that only batches"""
+    loaders = _scope.get()
+    if loaders is None:
+        loaders = _shared
+    loader = loaders.get(name)
+    if loader is None:
+        shared = loaders is _shared
+        loader = loaders[name] = DataLoader(batch_fn, cache=not shared, shared=shared)
+    return loader
+
+
+async def load_user(uuid):
+    return await get_loader("users", UserAPI.get_users_by_uuids).load(uuid)
+
+
+async def load_hwid_devices(uuid):
+    return await get_loader("hwid_devices", UserAPI.get_hwid_devices_by_users).load(uuid)
+
+
+def invalidate_loaded(*_):
+    """Forget users and devices loaded in the current scope after they were changed"""
+    loaders = _scope.get()
+    if loaders:
+        for loader in loaders.values():
+            loader.clear()
+
+
+RemnaAPI.on_mutation(("users", "hwid"), invalidate_loaded)
@@ -0,0 +1,67 @@
+"""
+Multi-select state for inline keyboards: a bitset over a pinned snapshot of items
+"""
+
+
+class BitSelection:
+    """
+    Selection over a snapshot of items taken when the selection started.
+    Button callbacks refer to items by their index in the snapshot, so the
+    selection stays consistent even if the panel list changes meanwhile;
+    the selected indexes are kept as bits of a single int.
+    """
+
+    def __init__(self, items, page_size=10):
+        self.items = list(items)
+        self.page_size = page_size
+        self.bits = 0
+        self.page = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def mask(self):
+        return (1 << len(self.items)) - 1
+
+    @property
+    def pages(self):
+        return max(1, (len(self.items) + self.page_size - 1) // self.page_size)
+
+    def is_selected(self, index):
+        return bool(self.bits >> index & 1)
+
+    def toggle(self, index):
+        if 0 <= index < len(self.items):
+            self.bits ^= 1 << index
+
+    def select_all(self):
+        self.bits = self.mask
+
+    def clear(self):
+        self.bits = 0
+
+    def invert(self):
+        self.bits ^= self.mask
+
+    def select_where(self, predicate):
+        """Replace the selection with items matching `predicate(item)`"""
+        self.bits = 0
+        for index, item in enumerate(self.items):
+            if predicate(item):
+                self.bits |= 1 << index
+
+    def count(self):
+        return bin(self.bits).count("1")
+
+    def selected(self):
+        """Return selected items in snapshot order"""
+        return [item for index, item in enumerate(self.items) if self.bits >> index & 1]
+
+    def set_page(self, page):
+        self.page = min(max(page, 0), self.pages - 1)
+
+    def page_items(self):
+        """Return (index, item) pairs of the current page"""
+        start = self.page * self.page_size
+        return list(enumerate(self.items[start:start + self.page_size], start=start))
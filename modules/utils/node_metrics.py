@@ -0,0 +1,154 @@
+"""
+Node metrics dashboard data built from system/nodes/metrics and system/stats/nodes
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+from modules.api.system import SystemAPI
+from modules.config import NODE_METRICS_CACHE_TTL, CACHE_MAX_STALE
+from modules.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_dashboard_cache = TTLCache(NODE_METRICS_CACHE_TTL, max_stale=CACHE_MAX_STALE, stale_on_error=True)
+
+# nodeUuid -> (sampled_at, inbound_total, outbound_total) из предыдущего запроса
+_previous_samples = {}
+
+# nodeUuid -> последние замеры скорости (sampled_at, inbound_rate, outbound_rate) для графика
+_rate_history = {}
+RATE_HISTORY_SIZE = 60
+
+
+def _to_int(value):
+    """Panel returns byte counters as strings"""
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _normalize_stats(stats):
+    """Convert inbound or outbound stats to integer counters"""
+    return [
+        {
+            'tag': item.get('tag') or '—',
+            'upload': _to_int(item.get('upload')),
+            'download': _to_int(item.get('download'))
+        }
+        for item in stats or []
+    ]
+
+
+def _daily_totals(stats_response):
+    """Group system/stats/nodes lastSevenDays by node name, oldest day first"""
+    daily = {}
+    if not isinstance(stats_response, dict):
+        return daily
+    for entry in stats_response.get('lastSevenDays') or []:
+        name = entry.get('nodeName') or 'Unknown'
+        date = (entry.get('date') or '')[:10]
+        daily.setdefault(name, {})
+        daily[name][date] = daily[name].get(date, 0) + _to_int(entry.get('totalBytes'))
+    return {name: sorted(days.items()) for name, days in daily.items()}
+
+
+def _apply_trends(nodes, daily, sampled_at):
+    """Attach rate since the previous sample and day-over-day change to every node"""
+    for node in nodes:
+        uuid = node['nodeUuid']
+        previous = _previous_samples.get(uuid)
+        node['inbound_rate'] = None
+        node['outbound_rate'] = None
+        if previous:
+            prev_at, prev_inbound, prev_outbound = previous
+            elapsed = sampled_at - prev_at
+            # Счётчики сбрасываются при рестарте Xray — отрицательную дельту не показываем
+            if elapsed > 0 and node['inbound_total'] >= prev_inbound and node['outbound_total'] >= prev_outbound:
+                node['inbound_rate'] = (node['inbound_total'] - prev_inbound) / elapsed
+                node['outbound_rate'] = (node['outbound_total'] - prev_outbound) / elapsed
+                history = _rate_history.setdefault(uuid, deque(maxlen=RATE_HISTORY_SIZE))
+                history.append((sampled_at, node['inbound_rate'], node['outbound_rate']))
+        _previous_samples[uuid] = (sampled_at, node['inbound_total'], node['outbound_total'])
+
+        days = daily.get(node['nodeName'], [])
+        node['today_bytes'] = days[-1][1] if days else None
+        node['day_change'] = None
+        if len(days) >= 2 and days[-2][1] > 0:
+            node['day_change'] = (days[-1][1] - days[-2][1]) / days[-2][1] * 100
+
+
+async def _fetch_dashboard():
+    metrics, stats = await asyncio.gather(
+        SystemAPI.get_nodes_metrics(),
+        SystemAPI.get_nodes_statistics(),
+        return_exceptions=True
+    )
+
+    if isinstance(metrics, Exception):
+        logger.error(f"Error fetching nodes metrics: {metrics}")
+        metrics = None
+    if isinstance(stats, Exception):
+        logger.warning(f"Error fetching nodes statistics: {stats}")
+        stats = None
+
+    if not isinstance(metrics, dict) or metrics.get('nodes') is None:
+        return None
+
+    sampled_at = time.time()
+    nodes = []
+    for node in metrics['nodes']:
+        inbounds = _normalize_stats(node.get('inboundsStats'))
+        outbounds = _normalize_stats(node.get('outboundsStats'))
+        inbound_upload = sum(item['upload'] for item in inbounds)
+        inbound_download = sum(item['download'] for item in inbounds)
+        outbound_upload = sum(item['upload'] for item in outbounds)
+        outbound_download = sum(item['download'] for item in outbounds)
+        nodes.append({
+            'nodeUuid': node.get('nodeUuid'),
+            'nodeName': node.get('nodeName', 'Unknown'),
+            'countryEmoji': node.get('countryEmoji') or '',
+            'providerName': node.get('providerName'),
+            'usersOnline': node.get('usersOnline') or 0,
+            'inboundsStats': inbounds,
+            'outboundsStats': outbounds,
+            'inbound_upload': inbound_upload,
+            'inbound_download': inbound_download,
+            'inbound_total': inbound_upload + inbound_download,
+            'outbound_upload': outbound_upload,
+            'outbound_download': outbound_download,
+            'outbound_total': outbound_upload + outbound_download,
+        })
+
+    daily = _daily_totals(stats)
+    _apply_trends(nodes, daily, sampled_at)
+    nodes.sort(key=lambda n: n['inbound_total'], reverse=True)
+
+    return {'nodes': nodes, 'daily': daily, 'sampled_at': sampled_at}
+
+
+async def get_node_metrics_dashboard(force=False):
+    """Return cached dashboard data, refetching both endpoints concurrently when stale"""
+    if force:
+        _dashboard_cache.invalidate('dashboard')
+    return await _dashboard_cache.get_or_fetch('dashboard', _fetch_dashboard)
+
+
+def get_rate_history(nodes, limit=5):
+    """Inbound speed series for the busiest nodes: (labels, {node name: [bytes/s]})"""
+    busiest = sorted(nodes, key=lambda n: n.get('inbound_rate') or 0, reverse=True)[:limit]
+    timestamps = sorted({
+        sampled_at
+        for node in busiest
+        for sampled_at, _, _ in _rate_history.get(node['nodeUuid'], ())
+    })
+    series = {}
+    for node in busiest:
+        rates = {sampled_at: rate for sampled_at, rate, _ in _rate_history.get(node['nodeUuid'], ())}
+        if rates:
+            series[node['nodeName']] = [rates.get(sampled_at, 0) for sampled_at in timestamps]
+    labels = [datetime.fromtimestamp(sampled_at).strftime("%H:%M:%S") for sampled_at in timestamps]
+    return labels, series
@@ -0,0 +1,78 @@
+"""
+Size-aware pagination of list messages within Telegram limits
+"""
+import hashlib
+import json
+
+from modules.utils.cache import TTLCache
+
+# Ограничения Telegram: длина текста считается в UTF-16 единицах, кнопок не больше 100
+MESSAGE_LIMIT = 4096
+KEYBOARD_LIMIT = 100
+
+
+def text_length(text):
+    """Length of a message as Telegram counts it (UTF-16 code units)"""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def split_pages(blocks, reserved=0, max_items=20, limit=MESSAGE_LIMIT):
+    """
+    Greedily pack text blocks into pages so that every page fits into `limit`
+    after `reserved` characters of header/footer, with at most `max_items` blocks.
+    Returns a list of (start, end) ranges into `blocks`; always at least one page.
+    """
+    budget = limit - reserved
+    pages = []
+    start, size = 0, 0
+    for index, block in enumerate(blocks):
+        length = text_length(block)
+        if index > start and (size + length > budget or index - start >= max_items):
+            pages.append((start, index))
+            start, size = index, 0
+        size += length
+    pages.append((start, len(blocks)))
+    return pages
+
+
+def snapshot_key(items, fields):
+    """Stable digest of the fields a renderer uses, so cached pages follow data changes"""
+    payload = json.dumps([[item.get(field) for field in fields] for item in items], default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class PageRenderer:
+    """
+    Render a list into pages that each fit a single message edit.
+    `format_item(item)` returns the text block of one item; `header(page, pages, total)`
+    returns the text above it; `reserve` leaves room for lines the caller adds around a page.
+    Rendered page ranges are cached per snapshot digest.
+    """
+
+    def __init__(self, format_item, header, fields, max_items=20, reserve=0, ttl=600):
+        self.format_item = format_item
+        self.header = header
+        self.fields = fields
+        self.max_items = min(max_items, KEYBOARD_LIMIT - 10)
+        self.reserve = reserve
+        self._cache = TTLCache(ttl, max_entries=32)
+
+    def layout(self, items, variant=""):
+        """Return (key, blocks, ranges) for items, reusing a cached layout for the same snapshot"""
+        key = f"{snapshot_key(items, self.fields)}:{variant}"
+        cached = self._cache.get(key)
+        if cached is None:
+            blocks = [self.format_item(item) for item in items]
+            # Заголовок с максимально длинными номерами страниц — чтобы его длина точно уместилась
+            reserved = text_length(self.header(len(items), len(items), len(items))) + self.reserve
+            cached = (blocks, split_pages(blocks, reserved, self.max_items))
+            self._cache.set(key, cached)
+        return (key,) + cached
+
+    def render(self, items, page, variant=""):
+        """Return (text, (start, end), page, pages) for a page index clamped to the valid range"""
+        _, blocks, ranges = self.layout(items, variant)
+        page = min(max(page, 0), len(ranges) - 1)
+        start, end = ranges[page]
+        text = self.header(page + 1, len(ranges), len(items)) + "".join(blocks[start:end])
+        return text, (start, end), page, len(ranges)
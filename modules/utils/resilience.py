@@ -0,0 +1,155 @@
+"""
+Failure handling for panel requests: circuit breakers per endpoint group, jittered backoff and a shared retry budget
+"""
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+from modules.config import (
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+    RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX
+)
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed: requests pass and consecutive failures are counted.
+    Open: after `failure_threshold` consecutive failures requests fail fast for `reset_timeout` seconds.
+    Half-open: then a single trial request is let through; success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_at = None
+
+    def allow(self):
+        """Return True if a request may be sent now"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = HALF_OPEN
+            self._trial_at = None
+            logger.info(f"Circuit '{self.name}' is half-open, sending a trial request")
+        if self.state == HALF_OPEN:
+            # Пробный запрос мог потеряться (отмена задачи) — тогда через reset_timeout пускаем следующий
+            if self._trial_at is not None and now - self._trial_at < self.reset_timeout:
+                return False
+            self._trial_at = now
+        return True
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info(f"Circuit '{self.name}' closed: panel responds again")
+        self.state = CLOSED
+        self.failures = 0
+        self._trial_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            logger.warning(
+                f"Circuit '{self.name}' opened after {self.failures} failures, "
+                f"failing fast for {self.reset_timeout}s"
+            )
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+            self._trial_at = None
+
+    def retry_in(self):
+        """Seconds until an open breaker lets a trial request through"""
+        if self.state != OPEN:
+            return 0
+        return max(0, self.reset_timeout - (time.monotonic() - self.opened_at))
+
+
+class RetryBudget:
+    """
+    Retries shared by all requests: each request earns `ratio` of a retry, each retry spends one,
+    so during an outage retries add at most about `ratio` extra load instead of multiplying it
+    """
+
+    def __init__(self, ratio, max_tokens):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self):
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+_breakers = {}
+retry_budget = RetryBudget(RETRY_BUDGET_RATIO, RETRY_BUDGET_MAX)
+
+
+def endpoint_group(endpoint):
+    """Group endpoints by their first path segment: users/{uuid} and users/bulk/... share 'users'"""
+    return endpoint.lstrip("/").split("/", 1)[0].split("?", 1)[0] or "root"
+
+
+def breaker_for(endpoint):
+    group = endpoint_group(endpoint)
+    breaker = _breakers.get(group)
+    if breaker is None:
+        breaker = _breakers[group] = CircuitBreaker(group, CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+    return breaker
+
+
+def parse_retry_after(value):
+    """Seconds from a Retry-After header given as a number or an HTTP date, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Delay before retry number `attempt + 1`: the panel's Retry-After when given,
+    otherwise full-jitter exponential backoff. None means waiting longer than
+    RETRY_MAX_DELAY would be required, so the request should fail instead.
+    """
+    wait = parse_retry_after(retry_after)
+    if wait is not None:
+        return wait if wait <= RETRY_MAX_DELAY else None
+    # Случайная задержка разводит повторы разных запросов во времени
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def degraded_groups():
+    """Endpoint groups whose breaker is not closed"""
+    return sorted(name for name, breaker in _breakers.items() if breaker.state != CLOSED)
+
+
+def degraded_notice():
+    """Warning line for the UI while the panel fails, or an empty string"""
+    groups = degraded_groups()
+    if not groups:
+        return ""
+    retry_in = max(_breakers[name].retry_in() for name in groups)
+    return (
+        f"⚠️ *Панель отвечает с ошибками* ({', '.join(groups)}): запросы временно не отправляются, "
+        f"показываются сохранённые данные. Повторная попытка через {retry_in:.0f} с.\n"
+    )
@@ -0,0 +1,174 @@
+"""
+Client-side scheduling of panel requests: a token bucket for the request rate, a concurrency
+limit and a priority queue, so admin taps go before background refreshes and bulk jobs
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from modules.config import API_MAX_CONCURRENCY, API_RATE_LIMIT, API_RATE_BURST
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, BACKGROUND, BULK = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background", BULK: "bulk"}
+
+# Приоритет наследуется задачами, созданными внутри блока request_priority()
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def request_priority(priority):
+    """Send panel requests made inside the block, and in tasks it creates, with `priority`"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))] if ordered else 0.0
+
+
+class RequestScheduler:
+    """
+    Admit requests when a concurrency slot and a rate token are both available.
+    Waiting requests are served strictly by priority, then in arrival order, and one
+    slot is kept for interactive requests so they never wait behind a long bulk call.
+    `rate` is requests per second with bursts up to `burst`; 0 disables the rate limit.
+    """
+
+    def __init__(self, max_concurrency, rate, burst):
+        self.max_concurrency = max(1, max_concurrency)
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.active = 0
+        self._refilled_at = time.monotonic()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer = None
+        self.stats = {
+            priority: {"requests": 0, "queued": 0, "max_queued": 0, "waited": 0, "wait_total": 0.0,
+                       "wait_max": 0.0, "recent": deque(maxlen=200)}
+            for priority in PRIORITY_NAMES
+        }
+
+    def _refill(self):
+        if not self.rate:
+            self.tokens = float(self.burst)
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _slots(self, priority):
+        if priority == INTERACTIVE or self.max_concurrency == 1:
+            return self.max_concurrency
+        return self.max_concurrency - 1
+
+    def _can_start(self, priority):
+        self._refill()
+        return self.active < self._slots(priority) and self.tokens >= 1
+
+    def _start(self):
+        self.active += 1
+        if self.rate:
+            self.tokens -= 1
+
+    def _dispatch(self):
+        while self._waiters:
+            priority, _, future = self._waiters[0]
+            if future.done():
+                # Ожидание отменено — просто выбрасываем запись
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_start(priority):
+                break
+            heapq.heappop(self._waiters)
+            self._start()
+            future.set_result(None)
+
+        if self._waiters and self._timer is None and self.rate and self.active < self._slots(self._waiters[0][0]):
+            # Ждём только токен: просыпаемся, когда он накопится
+            delay = max(0.0, (1 - self.tokens) / self.rate)
+            self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    async def acquire(self, priority=None, deadline=None):
+        """Wait for permission to send one request; raises TimeoutError at `deadline` (loop time)"""
+        priority = current_priority() if priority is None else priority
+        stats = self.stats[priority]
+        stats["requests"] += 1
+        if not self._waiters and self._can_start(priority):
+            self._start()
+            stats["recent"].append(0.0)
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        stats["queued"] += 1
+        stats["max_queued"] = max(stats["max_queued"], stats["queued"])
+        started = time.monotonic()
+        self._dispatch()
+        try:
+            async with asyncio.timeout_at(deadline):
+                await future
+        except (asyncio.CancelledError, TimeoutError):
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но запрос не состоится — возвращаем его
+                self.release()
+            raise
+        finally:
+            stats["queued"] -= 1
+
+        waited = time.monotonic() - started
+        stats["waited"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+        stats["recent"].append(waited)
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority=None, deadline=None):
+        """`async with scheduler.slot():` around one request"""
+        await self.acquire(priority, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self):
+        """Per-priority counters: requests, current/max queue depth, waits and p95 wait (ms) of recent requests"""
+        return {
+            PRIORITY_NAMES[priority]: {
+                "requests": stats["requests"],
+                "queued": stats["queued"],
+                "max_queued": stats["max_queued"],
+                "waited": stats["waited"],
+                "wait_avg_ms": stats["wait_total"] / stats["waited"] * 1000 if stats["waited"] else 0.0,
+                "wait_p95_ms": _percentile(stats["recent"], 95) * 1000,
+                "wait_max_ms": stats["wait_max"] * 1000,
+            }
+            for priority, stats in self.stats.items()
+        }
+
+
+request_scheduler = RequestScheduler(API_MAX_CONCURRENCY, API_RATE_LIMIT, API_RATE_BURST)
@@ -29,26 +29,27 @@ class SelectionHelper:
         Returns: (keyboard, users_data)
         """
         try:
-            response = await UserAPI.get_all_users()
-            if not response or not response.get("users"):
+            # Запрашиваем только записи текущей страницы, общее число берём из ответа панели
+            envelope = {}
+            users = [
+                user async for user in UserAPI.iter_users(
+                    fields=("uuid", "username", "status"), start=page * per_page, limit=per_page, envelope=envelope
+                )
+            ]
+            if not users:
                 keyboard = []
                 if include_back:
                     keyboard.append([InlineKeyboardButton("🔙 Назад", callback_data="back")])
                 return InlineKeyboardMarkup(keyboard), {}
             
-            users = response["users"]
-            total_users = len(users)
+            total_users = envelope.get("total", page * per_page + len(users))
             total_pages = (total_users + per_page - 1) // per_page
             
-            start_idx = page * per_page
-            end_idx = min(start_idx + per_page, total_users)
-            
             keyboard = []
             users_data = {}
             
             # Add user buttons
-            for i in range(start_idx, end_idx):
-                user = users[i]
+            for user in users:
                 status_emoji = "✅" if user["status"] == "ACTIVE" else "❌"
                 display_name = f"{status_emoji} {user['username']}"
                 
@@ -206,6 +207,7 @@ class SelectionHelper:
                 InlineKeyboardButton("🔐 Отозвать подписку", callback_data=f"{action_prefix}_revoke_{user_uuid}")
             ],
             [
+                InlineKeyboardButton("📊 Статистика", callback_data=f"{action_prefix}_stats_{user_uuid}"),
                 InlineKeyboardButton("🗑️ Удалить", callback_data=f"{action_prefix}_delete_{user_uuid}")
             ],
             [
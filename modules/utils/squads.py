@@ -0,0 +1,133 @@
+"""
+Internal squad membership: cached squad data and chunked concurrent membership updates
+"""
+import asyncio
+import json
+import logging
+
+from modules.api.squads import SquadAPI
+from modules.config import BULK_PAYLOAD_LIMIT, IMPORT_CONCURRENCY, SQUAD_CACHE_TTL
+from modules.utils.cache import TTLCache
+from modules.utils.concurrency import AdaptiveLimiter
+
+logger = logging.getLogger(__name__)
+
+CHUNK_RETRIES = 3
+
+_squad_cache = TTLCache(SQUAD_CACHE_TTL)
+
+
+async def get_squads(force=False):
+    """Return all internal squads, cached for SQUAD_CACHE_TTL seconds"""
+    if force:
+        _squad_cache.invalidate("squads")
+    return await _squad_cache.get_or_fetch("squads", SquadAPI.get_squads)
+
+
+async def get_accessible_nodes(squad_uuid):
+    """Return nodes reachable through a squad; the panel computes this from all inbounds, so it is cached"""
+    return await _squad_cache.get_or_fetch(
+        f"nodes:{squad_uuid}", lambda: SquadAPI.get_accessible_nodes(squad_uuid)
+    )
+
+
+def invalidate_squads():
+    """Drop cached squads and accessible nodes after membership or inbounds changed"""
+    _squad_cache.invalidate()
+
+
+def chunk_by_payload(uuids, overhead=0, limit=None):
+    """
+    Split UUIDs into chunks whose JSON array stays under `limit` bytes
+    (BULK_PAYLOAD_LIMIT by default); `overhead` accounts for the rest of the request body.
+    """
+    limit = limit or BULK_PAYLOAD_LIMIT
+    chunks, current, size = [], [], overhead + 2
+    for uuid in uuids:
+        item = len(json.dumps(uuid)) + 1
+        if current and size + item > limit:
+            chunks.append(current)
+            current, size = [], overhead + 2
+        current.append(uuid)
+        size += item
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def plan_squad_change(records, add=(), remove=()):
+    """
+    Compute the resulting squad set for every index record and group users sharing it,
+    since users/bulk/update-squads replaces the whole set. Users whose set does not change
+    are skipped. Returns [[squad_uuids], [user_uuids]] groups, largest first.
+    """
+    add, remove = set(add), set(remove)
+    groups = {}
+    for record in records:
+        current = set(record.get("activeInternalSquads") or [])
+        target = (current - remove) | add
+        if target == current:
+            continue
+        groups.setdefault(tuple(sorted(target)), []).append(record["uuid"])
+    return sorted(
+        ([list(squads), uuids] for squads, uuids in groups.items()),
+        key=lambda group: len(group[1]),
+        reverse=True
+    )
+
+
+def squad_change_units(groups):
+    """Split planned groups into payload-bounded (squads, uuids) requests"""
+    units = []
+    for squads, uuids in groups:
+        overhead = len(json.dumps({"uuids": [], "activeInternalSquads": squads}))
+        units.extend((squads, chunk) for chunk in chunk_by_payload(uuids, overhead))
+    return units
+
+
+async def run_squad_change(groups, progress=None, completed=()):
+    """
+    Send all planned requests concurrently under an adaptive limiter, skipping unit
+    indexes in `completed`. Squad sets are absolute, so repeating a unit is harmless.
+    `progress(completed, processed, total, ok, failed)` is awaited as units finish,
+    `completed` being the list of attempted unit indexes usable for resuming.
+    Returns (ok, failed) for the units sent in this run.
+    """
+    units = squad_change_units(groups)
+    total = sum(len(uuids) for _, uuids in units)
+    completed = set(completed)
+    processed = sum(len(units[index][1]) for index in completed if index < len(units))
+    limiter = AdaptiveLimiter(IMPORT_CONCURRENCY)
+    ok, failed = 0, 0
+
+    async def send(index):
+        squads, uuids = units[index]
+        for attempt in range(CHUNK_RETRIES):
+            async with limiter:
+                result = await SquadAPI.bulk_update_users_squads(uuids, squads)
+            limiter.record(bool(result))
+            if result:
+                return index, True
+            if attempt < CHUNK_RETRIES - 1:
+                await asyncio.sleep(2 ** attempt)
+        logger.error(f"Squad update for {len(uuids)} users failed after {CHUNK_RETRIES} attempts")
+        return index, False
+
+    tasks = [asyncio.create_task(send(index)) for index in range(len(units)) if index not in completed]
+    try:
+        for task in asyncio.as_completed(tasks):
+            index, success = await task
+            size = len(units[index][1])
+            processed += size
+            completed.add(index)
+            if success:
+                ok += size
+            else:
+                failed += size
+            if progress is not None:
+                await progress(sorted(completed), processed, total, ok, failed)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    return ok, failed
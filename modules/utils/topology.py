@@ -0,0 +1,108 @@
+"""
+Cached panel topology: config profiles, inbounds, hosts and nodes indexed for O(1) lookups
+"""
+import asyncio
+import logging
+
+from modules.api.client import RemnaAPI
+from modules.api.config_profiles import ConfigProfileAPI
+from modules.api.hosts import HostAPI
+from modules.api.inbounds import InboundAPI
+from modules.api.nodes import NodeAPI
+from modules.config import TOPOLOGY_CACHE_TTL, CACHE_MAX_STALE
+from modules.utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+_topology_cache = TTLCache(TOPOLOGY_CACHE_TTL, max_stale=CACHE_MAX_STALE, stale_on_error=True)
+
+
+class Topology:
+    """Indexes over one consistent snapshot of profiles, inbounds, hosts and nodes"""
+
+    def __init__(self, profiles, inbounds, hosts, nodes):
+        self.profiles = profiles
+        self.profiles_by_uuid = {profile["uuid"]: profile for profile in profiles}
+
+        self.inbounds = inbounds
+        self.inbounds_by_uuid = {}
+        self.inbounds_by_tag = {}
+        self.profile_inbounds = {profile["uuid"]: [] for profile in profiles}
+        for inbound in inbounds:
+            self.inbounds_by_uuid[inbound["uuid"]] = inbound
+            # Один тег может встречаться в разных профилях
+            self.inbounds_by_tag.setdefault(inbound.get("tag"), []).append(inbound)
+            self.profile_inbounds.setdefault(inbound.get("profileUuid"), []).append(inbound)
+
+        self.hosts_by_uuid = {host["uuid"]: host for host in hosts}
+        self.inbound_hosts = {}
+        for host in hosts:
+            inbound_uuid = (host.get("inbound") or {}).get("configProfileInboundUuid")
+            if inbound_uuid:
+                self.inbound_hosts.setdefault(inbound_uuid, []).append(host)
+
+        self.nodes_by_uuid = {node["uuid"]: node for node in nodes}
+        self.profile_nodes = {}
+        for node in nodes:
+            profile_uuid = (node.get("configProfile") or {}).get("activeConfigProfileUuid")
+            if profile_uuid:
+                self.profile_nodes.setdefault(profile_uuid, []).append(node)
+
+    def inbound(self, uuid):
+        return self.inbounds_by_uuid.get(uuid)
+
+    def inbounds_with_tag(self, tag):
+        return self.inbounds_by_tag.get(tag, [])
+
+    def inbounds_of_profile(self, profile_uuid):
+        return self.profile_inbounds.get(profile_uuid, [])
+
+    def hosts_of_inbound(self, inbound_uuid):
+        return self.inbound_hosts.get(inbound_uuid, [])
+
+    def nodes_of_profile(self, profile_uuid):
+        return self.profile_nodes.get(profile_uuid, [])
+
+
+async def _load_profile_inbounds(profiles):
+    """Fallback for panels whose profile list has no embedded inbounds: fetch them concurrently"""
+    results = await asyncio.gather(*(ConfigProfileAPI.get_profile_inbounds(profile["uuid"]) for profile in profiles))
+    return [inbound for inbounds in results for inbound in inbounds or []]
+
+
+async def _build_topology():
+    profiles, inbounds, hosts, nodes = await asyncio.gather(
+        ConfigProfileAPI.get_profiles(),
+        InboundAPI.get_inbounds(),
+        HostAPI.get_all_hosts(),
+        NodeAPI.get_all_nodes()
+    )
+    if not profiles and inbounds is None:
+        logger.error("Failed to load config profiles and inbounds")
+        return None
+    if not isinstance(inbounds, list):
+        inbounds = [inbound for profile in profiles for inbound in profile.get("inbounds") or []]
+        if not inbounds:
+            inbounds = await _load_profile_inbounds(profiles)
+
+    topology = Topology(profiles or [], inbounds, hosts or [], nodes or [])
+    logger.info(
+        f"Built topology: {len(topology.profiles)} profiles, {len(topology.inbounds)} inbounds, "
+        f"{len(topology.hosts_by_uuid)} hosts, {len(topology.nodes_by_uuid)} nodes"
+    )
+    return topology
+
+
+async def get_topology(force=False):
+    """Return the cached topology, rebuilding it when stale or invalidated"""
+    if force:
+        _topology_cache.invalidate("topology")
+    return await _topology_cache.get_or_fetch("topology", _build_topology)
+
+
+def invalidate_topology(*_):
+    """Drop the cached topology; called after host, node and profile mutations"""
+    _topology_cache.invalidate("topology")
+
+
+RemnaAPI.on_mutation(("hosts", "nodes", "config-profiles"), invalidate_topology)
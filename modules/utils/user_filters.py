@@ -0,0 +1,135 @@
+"""
+Filter expressions for bulk operations, evaluated against the local user index
+"""
+import re
+from datetime import datetime, timezone
+
+FILTER_HELP = (
+    "`status=ACTIVE,LIMITED` — статус (можно несколько)\n"
+    "`tag=VIP` / `tag!=VIP` / `tag=none` — тег\n"
+    "`expires<7` / `expires>=0` — дней до истечения (отрицательные — уже истекли)\n"
+    "`traffic>=80%` — процент использованного лимита\n"
+    "`telegram=yes` / `telegram=no` — привязан ли Telegram ID\n"
+    "`squad=Default` / `squad!=VIP` / `squad=none` — внутренний сквад (имя или UUID)\n"
+    "`desc~пробный` / `name~trial` — подстрока в описании или имени\n"
+    "`all` — все пользователи"
+)
+
+TOKEN_PATTERN = re.compile(r"^(\w+)(!=|<=|>=|=|<|>|~)(.+)$")
+COMPARATORS = {
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+class FilterError(Exception):
+    """Raised when a filter expression cannot be parsed"""
+
+
+def _days_left(record, now):
+    expire_at = record.get("expireAt")
+    if not expire_at:
+        return None
+    try:
+        expires = datetime.fromisoformat(str(expire_at).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return (expires - now).total_seconds() / 86400
+
+
+def _traffic_percent(record):
+    limit = record.get("trafficLimitBytes") or 0
+    if not limit:
+        return None
+    return (record.get("usedTrafficBytes") or 0) / limit * 100
+
+
+def _number(value, key):
+    try:
+        return float(value.rstrip("%d"))
+    except ValueError:
+        raise FilterError(f"Ожидалось число в условии {key}: {value}")
+
+
+def _compile_condition(key, op, value):
+    """Return (predicate(record, now), description) for one `key op value` condition"""
+    if key == "status" and op in ("=", "!="):
+        allowed = {item.upper() for item in value.split(",")}
+        negate = op == "!="
+        return (lambda r, now: (r.get("status") in allowed) != negate), f"статус {op} {', '.join(sorted(allowed))}"
+
+    if key == "tag" and op in ("=", "!="):
+        allowed = {None if item.lower() == "none" else item.upper() for item in value.split(",")}
+        negate = op == "!="
+        return (lambda r, now: ((r.get("tag") or None) in allowed) != negate), f"тег {op} {value}"
+
+    if key == "squad" and op in ("=", "!="):
+        wanted = {item.lower() for item in value.split(",")}
+        negate = op == "!="
+
+        def squad(record, now):
+            members = record.get("activeInternalSquads") or []
+            if "none" in wanted and not members:
+                return not negate
+            names = {str(item).lower() for item in members + (record.get("squadNames") or [])}
+            return bool(names & wanted) != negate
+        return squad, f"сквад {op} {value}"
+
+    if key == "expires" and op in COMPARATORS:
+        days = _number(value, key)
+        compare = COMPARATORS[op]
+
+        def expires(record, now):
+            left = _days_left(record, now)
+            return left is not None and compare(left, days)
+        return expires, f"до истечения {op} {days:g} дн."
+
+    if key == "traffic" and op in COMPARATORS:
+        percent = _number(value, key)
+        compare = COMPARATORS[op]
+
+        def traffic(record, now):
+            used = _traffic_percent(record)
+            return used is not None and compare(used, percent)
+        return traffic, f"трафик {op} {percent:g}%"
+
+    if key == "telegram" and op == "=":
+        wanted = value.lower() in ("yes", "true", "1", "да")
+        return (lambda r, now: bool(r.get("telegramId")) == wanted), f"Telegram ID {'есть' if wanted else 'нет'}"
+
+    if key in ("desc", "name", "email") and op == "~":
+        field = {"desc": "description", "name": "username", "email": "email"}[key]
+        needle = value.lower()
+        return (lambda r, now: needle in str(r.get(field) or "").lower()), f"{key} содержит «{value}»"
+
+    raise FilterError(f"Неподдерживаемое условие: {key}{op}{value}")
+
+
+class UserFilter:
+    """Conjunction of conditions parsed from an expression like `status=ACTIVE traffic>=80%`"""
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        self.conditions = []
+        self.descriptions = []
+        for token in self.expression.split():
+            if token.lower() == "all":
+                continue
+            match = TOKEN_PATTERN.match(token)
+            if not match:
+                raise FilterError(f"Не удалось разобрать условие: {token}")
+            predicate, description = _compile_condition(match.group(1).lower(), match.group(2), match.group(3))
+            self.conditions.append(predicate)
+            self.descriptions.append(description)
+
+    def describe(self):
+        return "; ".join(self.descriptions) if self.descriptions else "все пользователи"
+
+    def apply(self, records):
+        """Return records matching every condition"""
+        now = datetime.now(timezone.utc)
+        return [record for record in records if all(condition(record, now) for condition in self.conditions)]
@@ -0,0 +1,74 @@
+"""
+Local indexes over panel users, built from the user stream to keep memory bounded
+"""
+import logging
+
+from modules.api.client import APIStreamError, RemnaAPI
+from modules.api.users import UserAPI
+from modules.config import EXPORT_PAGE_SIZE, USER_INDEX_TTL
+from modules.utils.cache import TTLCache
+from modules.utils.deadline import without_deadline
+
+logger = logging.getLogger(__name__)
+
+
+async def load_usernames():
+    """Collect all usernames without keeping full user objects; used for collision checks"""
+    try:
+        # Полный список не укладывается в дедлайн нажатия, а без него проверка имён невозможна
+        with without_deadline():
+            usernames = {user.get("username") async for user in UserAPI.stream_users(EXPORT_PAGE_SIZE)}
+    except APIStreamError as e:
+        raise RuntimeError(f"Failed to load users: {e}") from e
+    logger.info(f"Loaded username index with {len(usernames)} entries")
+    return usernames
+
+
+# Поля, которые нужны фильтрам массовых операций; остальное не держим в памяти
+INDEX_FIELDS = (
+    "uuid", "username", "status", "tag", "expireAt", "usedTrafficBytes",
+    "trafficLimitBytes", "telegramId", "email", "description", "activeInternalSquads"
+)
+
+# Без stale_on_error: по индексу планируются удаления и изменения, устаревшим он быть не должен
+_index_cache = TTLCache(USER_INDEX_TTL)
+
+
+def _index_record(user):
+    record = {field: user.get(field) for field in INDEX_FIELDS}
+    # В v2 трафик может приходить во вложенном объекте userTraffic
+    traffic = user.get("userTraffic") or {}
+    if record["usedTrafficBytes"] is None:
+        record["usedTrafficBytes"] = traffic.get("usedTrafficBytes")
+    # Сквады приходят объектами {uuid, name}: UUID нужны для обновления, имена — для фильтра
+    squads = record["activeInternalSquads"] or []
+    record["activeInternalSquads"] = [squad.get("uuid") if isinstance(squad, dict) else squad for squad in squads]
+    record["squadNames"] = [squad.get("name") for squad in squads if isinstance(squad, dict)]
+    return record
+
+
+async def _build_index():
+    try:
+        records = [_index_record(user) async for user in UserAPI.stream_users(EXPORT_PAGE_SIZE)]
+    except APIStreamError as e:
+        logger.error(f"Failed to build user index: {e}")
+        return None
+    logger.info(f"Built user index with {len(records)} entries")
+    return records
+
+
+async def get_user_index(force=False):
+    """Return compact records for all users, cached for USER_INDEX_TTL seconds; None if the panel cannot be read"""
+    if force:
+        _index_cache.invalidate("users")
+    # Индекс строится по всей базе и общий для всех нажатий — дедлайн одного нажатия к нему не применяем
+    with without_deadline():
+        return await _index_cache.get_or_fetch("users", _build_index)
+
+
+def invalidate_user_index(*_):
+    """Drop the cached index; called after user mutations and bulk changes"""
+    _index_cache.invalidate("users")
+
+
+RemnaAPI.on_mutation(("users",), invalidate_user_index)